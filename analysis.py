@@ -0,0 +1,210 @@
+'''
+This is a file that contains the background analysis service.
+
+The service runs the move generator and the search engine on a worker process, so that the window keeps
+responding while the engine thinks. A position is sent to the worker as a snapshot (see
+'GameCondition.getSnapshot'), and the worker streams back its valid moves and the result of every completed
+search iteration. The endings of the tablebase in the default directory (see tablebase.py) are answered from
+the tables without a search. A new request cancels the one before it: the worker stops searching within a few
+thousand nodes, and results of cancelled requests are dropped.
+
+Usage:
+service = AnalysisService(callback=print)
+service.start()
+service.analyse(gc.getSnapshot(), timeLimit=5.0)
+...
+service.stop()
+'''
+import multiprocessing
+import queue
+import threading
+
+import rules
+from search import MAX_DEPTH, Search
+from tablebase import openTablebase
+
+
+class CancellableSearch(Search):
+    '''
+    This class represents a search engine that stops as soon as the request it works on is cancelled.
+    '''
+    def __init__(self, current, ttSize=1 << 18, tablebase=None):
+        '''
+        Initialize the CancellableSearch object.
+
+        Parameters:
+        current (multiprocessing.Value): The id of the request that should be worked on, shared with the service.
+        ttSize (int): The number of entries of the transposition table.
+        tablebase (Tablebase): The endgame tablebase, or None to search every position.
+
+        Returns:
+        None
+        '''
+        super().__init__(ttSize, tablebase)
+        self.current = current
+        self.requestId = 0
+
+    def checkLimits(self):
+        '''
+        Sets the 'stopped' flag when the request is cancelled or the time or node budget is used up.
+
+        Returns:
+        None
+        '''
+        if self.current.value != self.requestId:
+            self.stopped = True
+        else:
+            super().checkLimits()
+
+
+def _analysisWorker(requests, results, current):
+    '''
+    Handles the analysis requests on the worker process until the service is stopped.
+
+    Parameters:
+    requests (multiprocessing.Queue): The requests, (requestId, snapshot, maxDepth, timeLimit) tuples, or None to stop.
+    results (multiprocessing.Queue): The queue the results are put on (see 'AnalysisService.getResults').
+    current (multiprocessing.Value): The id of the latest request.
+
+    Returns:
+    None
+    '''
+    engine = CancellableSearch(current, tablebase=openTablebase())
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        requestId, snapshot, maxDepth, timeLimit = request
+        # A request replaced by a newer one while it waited in the queue is skipped.
+        if current.value != requestId:
+            continue
+
+        gc = rules.GameCondition.fromSnapshot(snapshot)
+        moves = gc.getValidMoves()
+        results.put(('moves', requestId, moves, gc.checkMate, gc.staleMate))
+        if not moves:
+            results.put(('done', requestId, None))
+            continue
+
+        engine.requestId = requestId
+        result = engine.findBestMove(gc, maxDepth, timeLimit, callback=lambda info: results.put(('info', requestId, info)))
+        if current.value == requestId:
+            results.put(('done', requestId, result))
+    results.put(None)
+
+
+class AnalysisService:
+    '''
+    This class represents the analysis service. It owns the worker process and the queues to talk to it.
+    '''
+    def __init__(self, callback=None):
+        '''
+        Initialize the AnalysisService object.
+
+        Parameters:
+        callback (function): Called with every result of the latest request on a listener thread, or None to
+        collect the results with 'getResults' instead.
+
+        Returns:
+        None
+        '''
+        self.callback = callback
+        self.requests = multiprocessing.Queue()
+        self.results = multiprocessing.Queue()
+        self.current = multiprocessing.Value('l', 0, lock=False)
+        self.requestId = 0
+        self.process = None
+        self.listener = None
+
+    def start(self):
+        '''
+        Starts the worker process, and the listener thread if there is a callback.
+
+        Returns:
+        None
+        '''
+        self.process = multiprocessing.Process(target=_analysisWorker, args=(self.requests, self.results, self.current), daemon=True)
+        self.process.start()
+        if self.callback is not None:
+            self.listener = threading.Thread(target=self._listen, daemon=True)
+            self.listener.start()
+
+    def analyse(self, snapshot, maxDepth=MAX_DEPTH, timeLimit=None):
+        '''
+        Asks the worker to analyse a position, cancelling the previous request.
+
+        Parameters:
+        snapshot (tuple): The snapshot of the position (see 'GameCondition.getSnapshot').
+        maxDepth (int): The deepest search iteration.
+        timeLimit (float): The time budget of the search in seconds, or None to search until 'maxDepth' or a new request.
+
+        Returns:
+        int: The id of the request.
+
+        Note:
+        - The results of the request are, in order: ('moves', requestId, moves, checkMate, staleMate), then
+          ('info', requestId, SearchResult) after every completed search iteration, then ('done', requestId, SearchResult)
+          with the final result, or None if there are no valid moves.
+        '''
+        self.cancel()
+        self.requests.put((self.requestId, snapshot, maxDepth, timeLimit))
+        return self.requestId
+
+    def cancel(self):
+        '''
+        Cancels the current request. Its results that are still on the way are dropped.
+
+        Returns:
+        None
+        '''
+        self.requestId += 1
+        self.current.value = self.requestId
+
+    def getResults(self):
+        '''
+        Returns the results of the latest request that arrived since the last call, without waiting.
+
+        Returns:
+        list: The results (see 'analyse').
+        '''
+        results = []
+        while True:
+            try:
+                result = self.results.get_nowait()
+            except queue.Empty:
+                return results
+            if result is not None and result[1] == self.requestId:
+                results.append(result)
+
+    def _listen(self):
+        '''
+        Passes the results of the latest request to the callback until the worker process ends.
+
+        Returns:
+        None
+        '''
+        while True:
+            result = self.results.get()
+            if result is None:
+                return
+            if result[1] == self.requestId:
+                self.callback(result)
+
+    def stop(self, timeout=1.0):
+        '''
+        Cancels the current request and stops the worker process.
+
+        Parameters:
+        timeout (float): The time in seconds to wait for the worker process before it is terminated.
+
+        Returns:
+        None
+        '''
+        if self.process is None:
+            return
+        self.cancel()
+        self.requests.put(None)
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process = None
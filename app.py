@@ -1,15 +1,27 @@
 import pygame as pg
 import sys
 import rules
+from analysis import AnalysisService
+from archive import ArchiveWriter
 
 # Constants
 WIDTH, HEIGHT = 512, 512
 BOARD_SIZE = 8
 SQUARE_SIZE = WIDTH // BOARD_SIZE
-FRAMES = 5
+# The longest time the main loop sleeps without an event, in milliseconds, or None to sleep until the next event.
+EVENT_TIMEOUT = None
+# Posted with the results of the analysis service, see analysis.py.
+ANALYSIS_EVENT = pg.USEREVENT + 1
+# The time the engine analyses every position for, in seconds.
+ANALYSIS_TIME = 5.0
+# The only events that wake the main loop up, mouse motion and the like are dropped from the queue.
+EVENT_TYPES = [pg.QUIT, pg.MOUSEBUTTONDOWN, pg.KEYDOWN, pg.VIDEOEXPOSE, ANALYSIS_EVENT]
 GRAY = 153, 153, 153
 WHITE = 255, 255, 255
+HIGHLIGHT = 246, 246, 105
 IMAGES = {}
+# The archive every game played is added to when the window is closed, see archive.py.
+ARCHIVE_PATH = 'games.cga'
 
 
 def loadImages():
@@ -24,65 +36,202 @@ def loadImages():
     """
     pieces = ['bp', 'br', 'bn', 'bb', 'bq', 'bk', 'wp', 'wr', 'wn', 'wb', 'wq', 'wk']
     for piece in pieces:
-        IMAGES[piece] = pg.transform.scale(pg.image.load("images/" + piece + ".png"), (SQUARE_SIZE, SQUARE_SIZE))
+        # Converted to the display format once, so that blitting does not convert the pixels every time.
+        IMAGES[piece] = pg.transform.scale(pg.image.load("images/" + piece + ".png"), (SQUARE_SIZE, SQUARE_SIZE)).convert_alpha()
 
 
-def GameCondition(screen, gc):
-    drawBoard(screen)
-    drawPieces(screen, gc.board)
-
-
-def drawBoard(screen: pg.Surface):
+def drawBoard():
     """
-    Draws a chessboard on the provided Pygame display screen.
+    Pre-renders the chessboard.
 
-    This function takes a Pygame display screen object and draws a standard 8x8 chessboard
-    with alternating black and white squares. The board is drawn to fit the dimensions of the screen.
+    This function draws a standard 8x8 chessboard with alternating white and gray squares on a surface
+    of the size of the screen. The squares are copied from this surface instead of being drawn again.
+    It must be called after the display mode is set.
 
-    :param screen: pg.Surface
-    :return: None
+    :return: pg.Surface
     """
     colors = [WHITE, GRAY]
+    background = pg.Surface((WIDTH, HEIGHT)).convert()
 
     for row in range(BOARD_SIZE):
         for col in range(BOARD_SIZE):
             color = colors[(row + col) % 2]
-            pg.draw.rect(screen, color, pg.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+            pg.draw.rect(background, color, pg.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+    return background
+
 
-    # Обновление экрана
-    pg.display.update()
+def drawSquare(screen, background, row, col, piece, selected):
+    """
+    Draws one square of the chessboard with its piece.
 
+    :param screen: pg.Surface
+    :param background: the pre-rendered chessboard, see drawBoard
+    :param row: the row index of the square
+    :param col: the column index of the square
+    :param piece: the piece on the square, '--' for an empty square
+    :param selected: True if the square is selected by the player
+    :return: the rectangle of the square
+    """
+    rect = pg.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
+    screen.blit(background, rect, rect)
+    if selected:
+        pg.draw.rect(screen, HIGHLIGHT, rect)
+    if piece != '--':
+        screen.blit(IMAGES[piece], rect)
+    return rect
 
-def drawPieces(screen, board):
+
+def drawChanges(screen, background, board, drawn, selectedSquare):
+    """
+    Draws the squares that changed since they were last drawn.
+
+    This function compares every square with what was last drawn on it, the piece and whether it was selected,
+    and draws only the squares that differ. Moves, captures, castling, promotions and undone moves are all
+    found the same way. A square is drawn again after its entry in 'drawn' is set to None.
+
+    :param screen: pg.Surface
+    :param background: the pre-rendered chessboard, see drawBoard
+    :param board: the chess board, as 'GameCondition.board'
+    :param drawn: 8 lists of 8 entries with what was last drawn on every square, updated in place
+    :param selectedSquare: the (row, col) of the selected square, or ()
+    :return: the list of rectangles that were drawn, empty if nothing changed
+    """
+    rects = []
     for row in range(BOARD_SIZE):
         for col in range(BOARD_SIZE):
-            piece = board[row][col]
-            if piece != '--':
-                pieceImage = IMAGES[piece]
-                screen.blit(pieceImage, pg.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
-    pg.display.update()
+            state = (board[row][col], selectedSquare == (row, col))
+            if drawn[row][col] != state:
+                drawn[row][col] = state
+                rects.append(drawSquare(screen, background, row, col, state[0], state[1]))
+    return rects
+
+
+def choosePromotion(screen, color, col):
+    """
+    Lets the player choose the piece a pawn is promoted to.
+
+    This function draws the queen, rook, bishop and knight of the player's color in a column starting at the
+    promotion square, and waits until one of them is clicked or the q, r, b or n key is pressed.
+
+    :param screen: pg.Surface
+    :param color: 'w' or 'b'
+    :param col: the column index of the promotion square
+    :return: 'q', 'r', 'b' or 'n', or None if the player clicked elsewhere, pressed Escape or closed the window
+    """
+    choices = ['q', 'r', 'b', 'n']
+    rects = []
+    for i, piece in enumerate(choices):
+        row = i if color == 'w' else BOARD_SIZE - 1 - i
+        rect = pg.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
+        pg.draw.rect(screen, WHITE, rect)
+        pg.draw.rect(screen, GRAY, rect, 2)
+        screen.blit(IMAGES[color + piece], rect)
+        rects.append(rect)
+    pg.display.update(rects)
+
+    while True:
+        event = pg.event.wait()
+        if event.type == pg.QUIT:
+            # The main loop stops the analysis service and keeps the game before closing the window.
+            pg.event.post(event)
+            return None
+        elif event.type == pg.KEYDOWN:
+            if event.unicode in choices:
+                return event.unicode
+            if event.key == pg.K_ESCAPE:
+                return None
+        elif event.type == pg.MOUSEBUTTONDOWN:
+            for rect, piece in zip(rects, choices):
+                if rect.collidepoint(event.pos):
+                    return piece
+            return None
+
+
+def waitEvents(timeout=None):
+    """
+    Waits for events.
+
+    This function sleeps until an event arrives or the timeout runs out, and then returns the event together
+    with every other event already in the queue, so that a burst of input is handled in one pass.
+
+    :param timeout: the longest wait in milliseconds, or None to wait until the next event
+    :return: the list of events, empty if the timeout ran out
+    """
+    event = pg.event.wait() if timeout is None else pg.event.wait(timeout)
+    if event.type == pg.NOEVENT:
+        return []
+    return [event] + pg.event.get()
+
+
+def showAnalysis(result, whiteToMove):
+    """
+    Shows the result of the analysis in the window caption.
+
+    :param result: SearchResult, or None if the player to move has no valid moves
+    :param whiteToMove: True if white is to move in the analysed position
+    :return: None
+    """
+    if result is None or result.bestMove is None:
+        pg.display.set_caption('Chess')
+        return
+    mate = result.getMateDistance()
+    # The score is shown from white's point of view.
+    sign = 1 if whiteToMove else -1
+    if mate is not None:
+        score = '#' + str(sign * mate)
+    else:
+        score = '%+.2f' % (sign * result.score / 100)
+    move = result.bestMove
+    # A depth of 0 is a move of the tablebase, see search.py.
+    source = 'depth %d' % result.depth if result.depth else 'tablebase'
+    pg.display.set_caption('Chess  %s  %s  %s' % (source, score, move.getNotation((move.startRow, move.startCol), (move.endRow, move.endCol)) + move.promotion))
 
 
 def main():
     '''
     Main function of the chess game.
     '''
+    # The worker process is started before pygame, so that it does not inherit the window.
+    service = AnalysisService(callback=lambda result: pg.event.post(pg.event.Event(ANALYSIS_EVENT, result=result)))
+    service.start()
     pg.init()
     gc = rules.GameCondition()
-    loadImages()
     screen = pg.display.set_mode((WIDTH, HEIGHT))
-    screen.fill(WHITE)
-    reset = pg.time.Clock()
+    loadImages()
+    background = drawBoard()
+    drawn = [[None] * BOARD_SIZE for row in range(BOARD_SIZE)]
+    pg.event.set_blocked(None)
+    pg.event.set_allowed(EVENT_TYPES)
     selectedSquare = ()
     playerMove = []
-    validMoves = gc.getValidMoves()
+    # The valid moves come from the analysis service, so that a long computation never blocks the window.
+    validMoves = []
     moveMade = False
+    service.analyse(gc.getSnapshot(), timeLimit=ANALYSIS_TIME)
+    analysedWhiteToMove = gc.whiteToMove
+    pg.display.update(drawChanges(screen, background, gc.board, drawn, selectedSquare))
 
     while True:
-        for event in pg.event.get():
+        for event in waitEvents(EVENT_TIMEOUT):
             if event.type == pg.QUIT:
+                service.stop()
+                if gc.moveHistory:
+                    with ArchiveWriter(ARCHIVE_PATH, append=True) as writer:
+                        writer.addGame(gc.moveHistory)
                 pg.quit()
                 sys.exit()
+            elif event.type == ANALYSIS_EVENT:
+                # A result may be posted after the next request was sent, it belongs to the previous position.
+                if event.result[1] != service.requestId:
+                    continue
+                if event.result[0] == 'moves':
+                    validMoves = event.result[2]
+                    if event.result[3]:
+                        print('Black win!!!' if analysedWhiteToMove else 'White win!!!')
+                    elif event.result[4]:
+                        print('Stalemate!!!')
+                else:
+                    showAnalysis(event.result[2], analysedWhiteToMove)
             elif event.type == pg.MOUSEBUTTONDOWN:
                 location = pg.mouse.get_pos()
                 row = location[1] // SQUARE_SIZE
@@ -95,6 +244,13 @@ def main():
                     playerMove.append(selectedSquare)
                 if len(playerMove) == 2:
                     move = rules.Move(playerMove[0], playerMove[1], gc.board)
+                    if move.pawnPromotion and any(move.isSameSquares(validMove) for validMove in validMoves):
+                        choice = choosePromotion(screen, move.startSquare[0], move.endCol)
+                        # The choice was drawn over the column of the promotion square.
+                        for drawnRow in drawn:
+                            drawnRow[move.endCol] = None
+                        if choice:
+                            move = rules.Move(playerMove[0], playerMove[1], gc.board, choice)
                     print(move.getNotation(playerMove[0], playerMove[1])) ########################
                     for i in range(len(validMoves)):
                         if move == validMoves[i]:
@@ -105,18 +261,23 @@ def main():
                     if not moveMade:
                         playerMove = [selectedSquare]
 
+            elif event.type == pg.VIDEOEXPOSE:
+                # The window was uncovered, the screen surface still holds the whole picture.
+                pg.display.update()
             elif event.type == pg.KEYDOWN:
                 if event.key == pg.K_BACKSPACE:
                     gc.undoMove()
                     moveMade = True
 
         if moveMade:
-            validMoves = gc.getValidMoves()
+            validMoves = []
+            service.analyse(gc.getSnapshot(), timeLimit=ANALYSIS_TIME)
+            analysedWhiteToMove = gc.whiteToMove
             moveMade = False
 
-        GameCondition(screen, gc)
-        reset.tick(FRAMES)
-        pg.display.flip()
+        rects = drawChanges(screen, background, gc.board, drawn, selectedSquare)
+        if rects:
+            pg.display.update(rects)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,475 @@
+'''
+This is a file that contains the binary game archive, which stores games compactly and reads any of them at once.
+
+Every move is stored as its index in the valid moves of its position sorted by 'Move.moveID', in as few bits as
+that number of moves needs: no bit when there is one move, 5 bits for 20 to 32 moves. The bits of a game are
+packed together, least significant first, after a header with the number of plies, the result and the FEN of the
+start position if it is not the initial position. An index of the offsets of the games follows them, so the
+archive is read through mmap and a game is found without reading the games before it.
+
+Layout (little-endian): the file header (see HEADER), the games (see GAME), the offsets of the games as 8 byte
+integers, the first at the offset given by the file header.
+
+Usage:
+python archive.py pack games.pgn --output games.cga             convert PGN games
+python archive.py info games.cga                                count the games, plies and results
+python archive.py show games.cga --game 0 --ply 20              print the moves and the position of a game
+python archive.py replay games.cga --limit 1000                 replay every game and report the throughput
+'''
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from operator import attrgetter
+
+import rules
+from notation import getSan
+from pgn import readGames, replayGame
+
+# The magic string, the version, 2 unused bytes, the number of games and the offset of the index.
+HEADER = struct.Struct('<4sHxxQQ')
+MAGIC = b'CGA\x00'
+VERSION = 1
+# The number of plies, the size of the packed moves in bytes, the result, 1 unused byte and the size of the FEN.
+GAME = struct.Struct('<IIBxH')
+OFFSET = struct.Struct('<Q')
+RESULTS = ('*', '1-0', '0-1', '1/2-1/2')
+RESULT_CODES = {result: code for code, result in enumerate(RESULTS)}
+# The valid moves are numbered in this order, which does not depend on the move generator.
+getMoveID = attrgetter('moveID')
+
+
+def getResult(gc):
+    '''
+    Returns the result of a game that ended on the board.
+
+    Parameters:
+    gc (GameCondition): The game condition in the last position of the game.
+
+    Returns:
+    str: '1-0' or '0-1' after a checkmate, '1/2-1/2' after a stalemate, '*' otherwise.
+    '''
+    gc.getValidMoves()
+    if gc.checkMate:
+        return '0-1' if gc.whiteToMove else '1-0'
+    return '1/2-1/2' if gc.staleMate else '*'
+
+
+class ArchiveWriter:
+    '''
+    This class represents an archive file being written. The index is written by 'close'.
+    '''
+    def __init__(self, path, append=False):
+        '''
+        Initialize the ArchiveWriter object.
+
+        Parameters:
+        path (str): The path of the archive file.
+        append (bool): If True, the games are added to the games of the file if it exists.
+
+        Returns:
+        None
+
+        Raises:
+        ValueError: If the file to append to is not an archive.
+        '''
+        self.path = path
+        self.offsets = []
+        if append and os.path.exists(path) and os.path.getsize(path):
+            self.file = open(path, 'r+b')
+            magic, version, count, indexOffset = HEADER.unpack(self.file.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                self.file.close()
+                raise ValueError('Invalid archive file: ' + path)
+            self.file.seek(indexOffset)
+            index = self.file.read(count * OFFSET.size)
+            self.offsets = list(struct.unpack('<%dQ' % count, index))
+            # The new games are written over the index.
+            self.file.seek(indexOffset)
+            self.file.truncate()
+        else:
+            self.file = open(path, 'wb')
+            self.file.write(HEADER.pack(MAGIC, VERSION, 0, HEADER.size))
+
+    def __enter__(self):
+        '''
+        Returns the writer, for use in a with statement.
+
+        Returns:
+        ArchiveWriter: The writer.
+        '''
+        return self
+
+    def __exit__(self, *exception):
+        '''
+        Closes the writer at the end of a with statement.
+
+        Returns:
+        None
+        '''
+        self.close()
+
+    def addGame(self, moves, result=None, fen=None):
+        '''
+        Adds a game to the archive.
+
+        Parameters:
+        moves (list): The moves of the game, Move objects or their 'Move.moveID', for example 'gc.moveHistory'.
+        result (str): The result of the game (see RESULTS), or None to take the result on the board (see 'getResult').
+        fen (str): The FEN string of the start position, or None for the initial position.
+
+        Returns:
+        int: The number of the game in the archive.
+
+        Raises:
+        ValueError: If the FEN string, the result or one of the moves is not valid.
+        '''
+        if fen is None or fen == rules.START_FEN:
+            gc = rules.GameCondition()
+            fenBytes = b''
+        else:
+            gc = rules.GameCondition.fromFen(fen)
+            fenBytes = fen.encode('ascii')
+        packed = 0
+        shift = 0
+        plies = 0
+        for move in moves:
+            moveID = move if isinstance(move, int) else move.moveID
+            validMoves = gc.getValidMoves()
+            validMoves.sort(key=getMoveID)
+            for index, validMove in enumerate(validMoves):
+                if validMove.moveID == moveID:
+                    break
+            else:
+                raise ValueError('Invalid move at ply %d' % (plies + 1))
+            packed |= index << shift
+            shift += (len(validMoves) - 1).bit_length()
+            plies += 1
+            gc.makeMove(validMove)
+        if result is None:
+            result = getResult(gc)
+        if result not in RESULT_CODES:
+            raise ValueError('Invalid result: ' + result)
+
+        moveBytes = packed.to_bytes((shift + 7) // 8, 'little')
+        self.offsets.append(self.file.tell())
+        self.file.write(GAME.pack(plies, len(moveBytes), RESULT_CODES[result], len(fenBytes)))
+        self.file.write(fenBytes)
+        self.file.write(moveBytes)
+        return len(self.offsets) - 1
+
+    def close(self):
+        '''
+        Writes the index and the file header, and closes the file.
+
+        Returns:
+        None
+        '''
+        if self.file.closed:
+            return
+        indexOffset = self.file.tell()
+        self.file.write(struct.pack('<%dQ' % len(self.offsets), *self.offsets))
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, len(self.offsets), indexOffset))
+        self.file.close()
+
+
+def writeArchive(path, games, append=False):
+    '''
+    Writes games to an archive file.
+
+    Parameters:
+    path (str): The path of the archive file.
+    games (iterable): The (moves, result, fen) tuples of the games (see 'ArchiveWriter.addGame').
+    append (bool): If True, the games are added to the games of the file if it exists.
+
+    Returns:
+    int: The number of games written.
+    '''
+    count = 0
+    with ArchiveWriter(path, append) as writer:
+        for moves, result, fen in games:
+            writer.addGame(moves, result, fen)
+            count += 1
+    return count
+
+
+class GameArchive:
+    '''
+    This class represents an archive file, read through mmap.
+    '''
+    def __init__(self, path):
+        '''
+        Initialize the GameArchive object.
+
+        Parameters:
+        path (str): The path of the archive file.
+
+        Returns:
+        None
+
+        Raises:
+        ValueError: If the file is not an archive.
+        '''
+        self.path = path
+        with open(path, 'rb') as file:
+            size = file.seek(0, 2)
+            if size < HEADER.size:
+                raise ValueError('Invalid archive file: ' + path)
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count, self.indexOffset = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC or version != VERSION or self.indexOffset + self.count * OFFSET.size > size:
+            self.buffer.close()
+            raise ValueError('Invalid archive file: ' + path)
+
+    def __len__(self):
+        '''
+        Returns the number of games of the archive.
+
+        Returns:
+        int: The number of games.
+        '''
+        return self.count
+
+    def __getstate__(self):
+        '''
+        Returns the state pickled when the archive is sent to another process: only its path.
+
+        Returns:
+        dict: The state of the archive.
+        '''
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        '''
+        Maps the archive file again in the process the archive was sent to.
+
+        Parameters:
+        state (dict): The state made by '__getstate__'.
+
+        Returns:
+        None
+        '''
+        self.__init__(state['path'])
+
+    def close(self):
+        '''
+        Unmaps the archive file.
+
+        Returns:
+        None
+        '''
+        self.buffer.close()
+
+    def getHeader(self, index):
+        '''
+        Reads the header of a game.
+
+        Parameters:
+        index (int): The number of the game.
+
+        Returns:
+        dict: The header with the keys 'plies', 'result', 'fen' (None for the initial position), 'offset' (of the
+        packed moves in the file) and 'size' (of the packed moves in bytes).
+
+        Raises:
+        IndexError: If there is no such game.
+        '''
+        if not 0 <= index < self.count:
+            raise IndexError('No game %d in %s' % (index, self.path))
+        offset = OFFSET.unpack_from(self.buffer, self.indexOffset + index * OFFSET.size)[0]
+        plies, size, result, fenSize = GAME.unpack_from(self.buffer, offset)
+        offset += GAME.size
+        fen = self.buffer[offset:offset + fenSize].decode('ascii') if fenSize else None
+        return {'plies': plies, 'result': RESULTS[result], 'fen': fen, 'offset': offset + fenSize, 'size': size}
+
+    def getStart(self, header, moveGenerator='legal'):
+        '''
+        Sets up a game condition in the start position of a game.
+
+        Parameters:
+        header (dict): The header of the game (see 'getHeader').
+        moveGenerator (str): The strategy used by 'getValidMoves'.
+
+        Returns:
+        GameCondition: The game condition.
+        '''
+        if header['fen'] is None:
+            return rules.GameCondition(moveGenerator)
+        return rules.GameCondition.fromFen(header['fen'], moveGenerator)
+
+    def iterHeaders(self):
+        '''
+        Reads the headers of every game, without replaying any move.
+
+        Yields:
+        dict: The header of every game (see 'getHeader').
+        '''
+        for index in range(self.count):
+            yield self.getHeader(index)
+
+    def replayGame(self, index, plies=None, moveGenerator='legal'):
+        '''
+        Plays the moves of a game through a game condition.
+
+        Parameters:
+        index (int): The number of the game.
+        plies (int): The number of plies to play, or None for the whole game.
+        moveGenerator (str): The strategy used by 'getValidMoves'.
+
+        Yields:
+        tuple: The game condition and the move of every ply. The game condition is in the position before the move,
+        the move is made once the generator is resumed.
+
+        Raises:
+        IndexError: If there is no such game.
+        ValueError: If the archive is damaged.
+        '''
+        header = self.getHeader(index)
+        gc = self.getStart(header, moveGenerator)
+        packed = int.from_bytes(self.buffer[header['offset']:header['offset'] + header['size']], 'little')
+        plies = header['plies'] if plies is None else min(plies, header['plies'])
+        for ply in range(plies):
+            validMoves = gc.getValidMoves()
+            validMoves.sort(key=getMoveID)
+            bits = (len(validMoves) - 1).bit_length()
+            choice = packed & ((1 << bits) - 1)
+            packed >>= bits
+            if choice >= len(validMoves):
+                raise ValueError('Invalid move at ply %d of game %d' % (ply + 1, index))
+            move = validMoves[choice]
+            yield gc, move
+            gc.makeMove(move)
+
+    def getPosition(self, index, ply=None, moveGenerator='legal'):
+        '''
+        Sets up a game condition in a position of a game.
+
+        Parameters:
+        index (int): The number of the game.
+        ply (int): The number of plies played before the position, or None for the last position.
+        moveGenerator (str): The strategy used by 'getValidMoves'.
+
+        Returns:
+        GameCondition: The game condition, with the moves of the game in its history, so they can be undone.
+
+        Raises:
+        IndexError: If there is no such game or ply.
+        ValueError: If the archive is damaged.
+
+        Note:
+        - The game is found at once through the index, but the moves before the position are replayed, since a
+          move is only known from the valid moves of its position.
+        '''
+        header = self.getHeader(index)
+        if ply is not None and not 0 <= ply <= header['plies']:
+            raise IndexError('No ply %d in game %d' % (ply, index))
+        gc = None
+        # The replay makes the last move when it is resumed after it.
+        for gc, move in self.replayGame(index, ply, moveGenerator):
+            pass
+        return gc if gc is not None else self.getStart(header, moveGenerator)
+
+
+def packPgn(sources, output, append=False):
+    '''
+    Converts PGN games to an archive file. The games with an invalid move are left out.
+
+    Parameters:
+    sources (list): The PGN sources (see 'pgn.readGames').
+    output (str): The path of the archive file to write.
+    append (bool): If True, the games are added to the games of the file if it exists.
+
+    Returns:
+    dict: The totals with the keys 'games', 'invalid', 'plies' and 'bytes'.
+    '''
+    totals = {'games': 0, 'invalid': 0, 'plies': 0}
+    with ArchiveWriter(output, append) as writer:
+        for source in sources:
+            for headers, sanMoves, result in readGames(source):
+                try:
+                    moves = [move.moveID for gc, move in replayGame(headers, sanMoves)]
+                except ValueError:
+                    totals['invalid'] += 1
+                    continue
+                writer.addGame(moves, result if result in RESULT_CODES else '*', headers.get('FEN'))
+                totals['games'] += 1
+                totals['plies'] += len(moves)
+    totals['bytes'] = os.path.getsize(output)
+    return totals
+
+
+def main():
+    '''
+    Main function of the game archive tool.
+    '''
+    parser = argparse.ArgumentParser(description='Binary game archive tool.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    pack = commands.add_parser('pack', help='convert PGN files to an archive')
+    pack.add_argument('games', nargs='+', help='PGN files')
+    pack.add_argument('--output', default='games.cga', help='archive file to write')
+    pack.add_argument('--append', action='store_true', help='add the games to the archive if it exists')
+    info = commands.add_parser('info', help='count the games, plies and results of an archive')
+    info.add_argument('archive', help='archive file')
+    show = commands.add_parser('show', help='print the moves and a position of a game')
+    show.add_argument('archive', help='archive file')
+    show.add_argument('--game', type=int, default=0, help='number of the game, from 0')
+    show.add_argument('--ply', type=int, default=None, help='number of plies to play, by default the whole game')
+    replay = commands.add_parser('replay', help='replay every game and report the throughput')
+    replay.add_argument('archive', help='archive file')
+    replay.add_argument('--limit', type=int, default=None, help='number of games to replay')
+    replay.add_argument('--generator', default='legal', choices=('legal', 'filter'), help='strategy of getValidMoves')
+    args = parser.parse_args()
+
+    if args.command == 'pack':
+        totals = packPgn(args.games, args.output, args.append)
+        print('%d games (%d invalid), %d plies, %d bytes written to %s (%.2f bytes per ply)' % (
+            totals['games'], totals['invalid'], totals['plies'], totals['bytes'], args.output,
+            totals['bytes'] / totals['plies'] if totals['plies'] else 0.0))
+        return 0
+
+    try:
+        archive = GameArchive(args.archive)
+    except (OSError, ValueError) as error:
+        print(error, file=sys.stderr)
+        return 1
+
+    if args.command == 'info':
+        plies = 0
+        moveBytes = 0
+        results = dict.fromkeys(RESULTS, 0)
+        for header in archive.iterHeaders():
+            plies += header['plies']
+            moveBytes += header['size']
+            results[header['result']] += 1
+        print('%d games, %d plies, %.2f bits per move' % (len(archive), plies, 8 * moveBytes / plies if plies else 0.0))
+        print(', '.join('%s: %d' % (result, count) for result, count in results.items()))
+    elif args.command == 'show':
+        try:
+            header = archive.getHeader(args.game)
+            sanMoves = []
+            gc = None
+            for ply, (gc, move) in enumerate(archive.replayGame(args.game, args.ply)):
+                sanMoves.append(('%d. ' % (ply // 2 + 1) if ply % 2 == 0 else '') + getSan(gc, move))
+            gc = archive.getPosition(args.game, args.ply)
+        except (IndexError, ValueError) as error:
+            print(error, file=sys.stderr)
+            return 1
+        print(' '.join(sanMoves), header['result'])
+        print(gc.getFen())
+    else:
+        start = time.perf_counter()
+        games = plies = 0
+        for index in range(len(archive) if args.limit is None else min(args.limit, len(archive))):
+            for gc, move in archive.replayGame(index, moveGenerator=args.generator):
+                plies += 1
+            games += 1
+        seconds = time.perf_counter() - start
+        print('%d games, %d plies in %.2f s (%.0f plies/s)' % (games, plies, seconds, plies / seconds if seconds else 0.0))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
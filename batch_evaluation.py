@@ -0,0 +1,350 @@
+'''
+This is a file that contains the batch evaluation of chess positions with NumPy.
+
+Many positions are stacked into one array and every evaluation term is computed for the whole batch at once.
+Positions come in as piece planes of shape (N, 12, 8, 8), and they are packed into one 64-bit bitboard per plane,
+shape (N, 12), to compute the terms. The material, piece-square table and king terms are the same as in
+'evaluation.evaluate'. The batch evaluation adds a mobility term and a pawn structure term.
+
+Usage:
+planes, whiteToMove = batch_evaluation.encodePositions(gameConditions)
+scores = batch_evaluation.evaluateBatch(planes, whiteToMove)
+'''
+import numpy as np
+
+from evaluation import PIECE_VALUES, PIECE_SQUARE_TABLES, KING_ENDGAME_TABLE, PHASE_WEIGHTS, MAX_PHASE
+
+# The order of the piece planes.
+PLANE_PIECES = ('wp', 'wn', 'wb', 'wr', 'wq', 'wk', 'bp', 'bn', 'bb', 'br', 'bq', 'bk')
+
+# Centipawns per square a piece can move to.
+MOBILITY_WEIGHTS = {'n': 4, 'b': 5, 'r': 2, 'q': 1}
+DOUBLED_PAWN_PENALTY = 15
+ISOLATED_PAWN_PENALTY = 12
+# Bonus for a passed pawn by the number of rows it has advanced, from 0 on its start row to 5 one step from promotion.
+PASSED_PAWN_BONUS = (0, 10, 20, 35, 60, 100)
+
+KNIGHT_DIRECTIONS = ((-2, -1), (-2, 1), (-1, 2), (1, 2), (2, -1), (2, 1), (-1, -2), (1, -2))
+ROOK_DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1))
+BISHOP_DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+
+FILES = [np.uint64(sum(1 << (row * 8 + col) for row in range(8))) for col in range(8)]
+ROWS = [np.uint64(0xFF << (row * 8)) for row in range(8)]
+
+BYTE_POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.int32)
+
+# Positions are evaluated in chunks of this size to bound the memory of the intermediate arrays.
+CHUNK_SIZE = 1 << 16
+
+
+def _popcount(bitboards):
+    '''
+    Counts the set bits of every element of a uint64 array.
+
+    Parameters:
+    bitboards (numpy.ndarray): The bitboards.
+
+    Returns:
+    numpy.ndarray: The int32 bit counts, same shape.
+    '''
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(bitboards).astype(np.int32)
+    # NumPy before 2.0 has no bit count, count the bytes through a table instead.
+    octets = np.ascontiguousarray(bitboards, dtype='<u8').view(np.uint8).reshape(bitboards.shape + (8,))
+    return BYTE_POPCOUNT[octets].sum(axis=-1, dtype=np.int32)
+
+
+def _byteTables():
+    '''
+    Builds the score of every byte value of every byte of every plane, so that a piece-square table can be
+    summed over a bitboard with 8 lookups instead of 64.
+
+    Returns:
+    tuple: The (12, 8, 256) middle game table and the (12, 8, 256) difference of the endgame king table.
+    '''
+    mirror = [(7 - (square >> 3)) * 8 + (square & 7) for square in range(64)]
+    endgame = [KING_ENDGAME_TABLE[square] - PIECE_SQUARE_TABLES['k'][square] for square in range(64)]
+    squareScores = np.zeros((12, 64), dtype=np.int32)
+    squareEndgame = np.zeros((12, 64), dtype=np.int32)
+    for plane, piece in enumerate(PLANE_PIECES):
+        table = PIECE_SQUARE_TABLES[piece[1]]
+        value = PIECE_VALUES[piece[1]]
+        for square in range(64):
+            if piece[0] == 'w':
+                squareScores[plane, square] = value + table[square]
+            else:
+                squareScores[plane, square] = -value - table[mirror[square]]
+        if piece == 'wk':
+            squareEndgame[plane] = endgame
+        elif piece == 'bk':
+            squareEndgame[plane] = [-endgame[mirror[square]] for square in range(64)]
+
+    bits = (np.arange(256)[:, None] >> np.arange(8)) & 1
+    byteScores = np.einsum('vb,pnb->pnv', bits, squareScores.reshape(12, 8, 8)).astype(np.int32)
+    byteEndgame = np.einsum('vb,pnb->pnv', bits, squareEndgame.reshape(12, 8, 8)).astype(np.int32)
+    return byteScores, byteEndgame
+
+
+BYTE_SCORES, BYTE_KING_ENDGAME = _byteTables()
+PLANE_PHASES = np.array([PHASE_WEIGHTS[piece[1]] for piece in PLANE_PIECES], dtype=np.int32)
+# Maps the letters of 'GameCondition.getSnapshot' to plane indices, 12 for an empty square.
+SNAPSHOT_PLANES = np.full(256, 12, dtype=np.uint8)
+for _plane, _letter in enumerate('PNBRQKpnbrqk'):
+    SNAPSHOT_PLANES[ord(_letter)] = _plane
+
+
+def encodeBitboards(positions):
+    '''
+    Stacks the bitboards of many positions.
+
+    Parameters:
+    positions (iterable): GameCondition objects.
+
+    Returns:
+    tuple: The (N, 12) uint64 array of bitboards in PLANE_PIECES order and the (N,) bool array of 'whiteToMove'.
+    '''
+    bitboards = []
+    whiteToMove = []
+    for gc in positions:
+        pieces = gc.bitboards
+        bitboards.append([pieces[piece] for piece in PLANE_PIECES])
+        whiteToMove.append(gc.whiteToMove)
+    return np.array(bitboards, dtype=np.uint64).reshape(-1, 12), np.array(whiteToMove, dtype=bool)
+
+
+def encodePositions(positions):
+    '''
+    Stacks many positions into piece planes.
+
+    Parameters:
+    positions (iterable): GameCondition objects.
+
+    Returns:
+    tuple: The (N, 12, 8, 8) uint8 array of piece planes in PLANE_PIECES order and the (N,) bool array of 'whiteToMove'.
+    '''
+    bitboards, whiteToMove = encodeBitboards(positions)
+    return unpackPlanes(bitboards), whiteToMove
+
+
+def encodeSnapshots(snapshots):
+    '''
+    Stacks the boards of many position snapshots into piece planes.
+
+    Parameters:
+    snapshots (iterable): Snapshots made by 'GameCondition.getSnapshot'.
+
+    Returns:
+    tuple: The (N, 12, 8, 8) uint8 array of piece planes and the (N,) bool array of 'whiteToMove'.
+    '''
+    boards = []
+    whiteToMove = []
+    for snapshot in snapshots:
+        boards.append(snapshot[0])
+        whiteToMove.append(snapshot[1])
+    letters = np.frombuffer(''.join(boards).encode('ascii'), dtype=np.uint8).reshape(-1, 64)
+    planes = SNAPSHOT_PLANES[letters][:, None, :] == np.arange(12, dtype=np.uint8)[None, :, None]
+    return planes.view(np.uint8).reshape(-1, 12, 8, 8), np.array(whiteToMove, dtype=bool)
+
+
+def packPlanes(planes):
+    '''
+    Packs piece planes into bitboards.
+
+    Parameters:
+    planes (numpy.ndarray): The (N, 12, 8, 8) or (N, 12, 64) piece planes.
+
+    Returns:
+    numpy.ndarray: The (N, 12) uint64 bitboards. Bit k is row k // 8 and column k % 8.
+    '''
+    packed = np.packbits(planes.reshape(-1, 12, 64), axis=2, bitorder='little')
+    return np.ascontiguousarray(packed).view('<u8').reshape(-1, 12).astype(np.uint64)
+
+
+def unpackPlanes(bitboards):
+    '''
+    Unpacks bitboards into piece planes.
+
+    Parameters:
+    bitboards (numpy.ndarray): The (N, 12) uint64 bitboards.
+
+    Returns:
+    numpy.ndarray: The (N, 12, 8, 8) uint8 piece planes.
+    '''
+    octets = np.ascontiguousarray(bitboards, dtype='<u8').view(np.uint8)
+    return np.unpackbits(octets, axis=1, bitorder='little').reshape(-1, 12, 8, 8)
+
+
+def _shift(bitboards, dRow, dCol):
+    '''
+    Moves every piece of uint64 bitboards by a row and column offset, dropping what leaves the board.
+
+    Parameters:
+    bitboards (numpy.ndarray): The bitboards.
+    dRow (int): The row offset.
+    dCol (int): The column offset.
+
+    Returns:
+    numpy.ndarray: The shifted bitboards.
+    '''
+    offset = dRow * 8 + dCol
+    if offset > 0:
+        shifted = bitboards << np.uint64(offset)
+    else:
+        shifted = bitboards >> np.uint64(-offset)
+    # Pieces that wrapped around to the other side of the board land on the files they cannot reach.
+    if dCol > 0:
+        for col in range(dCol):
+            shifted &= ~FILES[col]
+    elif dCol < 0:
+        for col in range(8 + dCol, 8):
+            shifted &= ~FILES[col]
+    return shifted
+
+
+def _mobility(bitboards, offset, own, empty):
+    '''
+    Computes the mobility term of one color: the squares its knights and sliding pieces can move to.
+
+    Parameters:
+    bitboards (numpy.ndarray): The (N, 12) bitboards.
+    offset (int): 0 for white and 6 for black, the index of the color's first plane.
+    own (numpy.ndarray): The (N,) bitboards of the color's pieces.
+    empty (numpy.ndarray): The (N,) bitboards of the empty squares.
+
+    Returns:
+    numpy.ndarray: The (N,) mobility scores in centipawns.
+    '''
+    score = np.zeros(bitboards.shape[0], dtype=np.int32)
+    notOwn = ~own
+
+    knights = bitboards[:, offset + 1]
+    if knights.any():
+        for dRow, dCol in KNIGHT_DIRECTIONS:
+            score += MOBILITY_WEIGHTS['n'] * _popcount(_shift(knights, dRow, dCol) & notOwn)
+
+    for piece, directions in (('b', BISHOP_DIRECTIONS), ('r', ROOK_DIRECTIONS), ('q', BISHOP_DIRECTIONS + ROOK_DIRECTIONS)):
+        sliders = bitboards[:, offset + 'pnbrqk'.index(piece)]
+        if not sliders.any():
+            continue
+        for dRow, dCol in directions:
+            # Walk every ray one step at a time, the front stops on the first occupied square.
+            front = sliders
+            for step in range(7):
+                front = _shift(front, dRow, dCol)
+                if not front.any():
+                    break
+                score += MOBILITY_WEIGHTS[piece] * _popcount(front & notOwn)
+                front &= empty
+    return score
+
+
+def _fill(bitboards, down):
+    '''
+    Fills every bitboard along the columns, towards row 7 or towards row 0.
+
+    Parameters:
+    bitboards (numpy.ndarray): The bitboards.
+    down (bool): True to fill towards row 7, False to fill towards row 0.
+
+    Returns:
+    numpy.ndarray: The filled bitboards, the start squares included.
+    '''
+    for shift in (8, 16, 32):
+        if down:
+            bitboards = bitboards | (bitboards << np.uint64(shift))
+        else:
+            bitboards = bitboards | (bitboards >> np.uint64(shift))
+    return bitboards
+
+
+def _pawnStructure(whitePawns, blackPawns):
+    '''
+    Computes the pawn structure term: doubled, isolated and passed pawns.
+
+    Parameters:
+    whitePawns (numpy.ndarray): The (N,) bitboards of the white pawns.
+    blackPawns (numpy.ndarray): The (N,) bitboards of the black pawns.
+
+    Returns:
+    numpy.ndarray: The (N,) pawn structure scores in centipawns, from white's point of view.
+    '''
+    score = np.zeros(whitePawns.shape[0], dtype=np.int32)
+    for pawns, sign in ((whitePawns, 1), (blackPawns, -1)):
+        files = np.stack([_popcount(pawns & FILES[col]) for col in range(8)], axis=1)
+        doubled = np.maximum(files - 1, 0).sum(axis=1)
+        padded = np.pad(files, ((0, 0), (1, 1)))
+        isolated = (files * ((padded[:, :-2] == 0) & (padded[:, 2:] == 0))).sum(axis=1)
+        score -= sign * (DOUBLED_PAWN_PENALTY * doubled + ISOLATED_PAWN_PENALTY * isolated)
+
+    # A white pawn is passed if no black pawn stands on a lower row of its file or the neighbouring files,
+    # and a black pawn if no white pawn stands on a higher row.
+    blockedWhite = _fill(blackPawns << np.uint64(8), True)
+    blockedWhite |= _shift(blockedWhite, 0, 1) | _shift(blockedWhite, 0, -1)
+    passedWhite = whitePawns & ~blockedWhite
+    blockedBlack = _fill(whitePawns >> np.uint64(8), False)
+    blockedBlack |= _shift(blockedBlack, 0, 1) | _shift(blockedBlack, 0, -1)
+    passedBlack = blackPawns & ~blockedBlack
+    for advanced in range(1, 6):
+        score += PASSED_PAWN_BONUS[advanced] * _popcount(passedWhite & ROWS[6 - advanced])
+        score -= PASSED_PAWN_BONUS[advanced] * _popcount(passedBlack & ROWS[1 + advanced])
+    return score
+
+
+def evaluateBitboards(bitboards, whiteToMove=None, terms=False):
+    '''
+    Evaluates a batch of positions given as bitboards.
+
+    Parameters:
+    bitboards (numpy.ndarray): The (N, 12) uint64 bitboards of 'encodeBitboards' or 'packPlanes'.
+    whiteToMove (numpy.ndarray): The (N,) bool array of the player to move. If it is given the scores are from
+    the point of view of the player to move, otherwise from white's point of view.
+    terms (bool): True to also return the separate terms.
+
+    Returns:
+    numpy.ndarray: The (N,) int32 scores in centipawns, or a tuple of the scores and a dictionary of the
+    'material', 'mobility' and 'pawns' terms if 'terms' is True. 'material' includes the piece-square tables.
+    '''
+    bitboards = np.asarray(bitboards, dtype=np.uint64).reshape(-1, 12)
+    count = bitboards.shape[0]
+    material = np.empty(count, dtype=np.int32)
+    mobility = np.empty(count, dtype=np.int32)
+    pawns = np.empty(count, dtype=np.int32)
+    planeIndex = np.arange(12)[:, None]
+    byteIndex = np.arange(8)[None, :]
+
+    for start in range(0, count, CHUNK_SIZE):
+        chunk = bitboards[start:start + CHUNK_SIZE]
+        octets = np.ascontiguousarray(chunk, dtype='<u8').view(np.uint8).reshape(-1, 12, 8)
+        score = BYTE_SCORES[planeIndex, byteIndex, octets].sum(axis=(1, 2), dtype=np.int32)
+        kingEndgame = BYTE_KING_ENDGAME[planeIndex, byteIndex, octets].sum(axis=(1, 2), dtype=np.int32)
+        phase = np.minimum(_popcount(chunk) @ PLANE_PHASES, MAX_PHASE)
+        # Floor division matches the scalar evaluation, which divides the summed king terms.
+        material[start:start + CHUNK_SIZE] = score + kingEndgame * (MAX_PHASE - phase) // MAX_PHASE
+
+        white = np.bitwise_or.reduce(chunk[:, :6], axis=1)
+        black = np.bitwise_or.reduce(chunk[:, 6:], axis=1)
+        empty = ~(white | black)
+        mobility[start:start + CHUNK_SIZE] = _mobility(chunk, 0, white, empty) - _mobility(chunk, 6, black, empty)
+        pawns[start:start + CHUNK_SIZE] = _pawnStructure(chunk[:, 0], chunk[:, 6])
+
+    scores = material + mobility + pawns
+    if whiteToMove is not None:
+        scores = np.where(whiteToMove, scores, -scores).astype(np.int32)
+    if terms:
+        return scores, {'material': material, 'mobility': mobility, 'pawns': pawns}
+    return scores
+
+
+def evaluateBatch(planes, whiteToMove=None, terms=False):
+    '''
+    Evaluates a batch of positions given as piece planes.
+
+    Parameters:
+    planes (numpy.ndarray): The (N, 12, 8, 8) or (N, 12, 64) piece planes of 'encodePositions' or 'encodeSnapshots'.
+    whiteToMove (numpy.ndarray): The (N,) bool array of the player to move, or None (see 'evaluateBitboards').
+    terms (bool): True to also return the separate terms.
+
+    Returns:
+    numpy.ndarray: The (N,) int32 scores in centipawns (see 'evaluateBitboards').
+    '''
+    return evaluateBitboards(packPlanes(planes), whiteToMove, terms)
@@ -0,0 +1,194 @@
+'''
+This is a file that contains the bitboard tables used by the rules of chess.
+
+A bitboard is a 64-bit integer in which every bit stands for one square of the chess board.
+Square indices follow the row and column indices of 'GameCondition.board': square = row * 8 + col,
+so bit 0 is a8 (row 0, column 0) and bit 63 is h1 (row 7, column 7).
+'''
+
+ALL_SQUARES = (1 << 64) - 1
+
+KNIGHT_DIRECTIONS = ((-2, -1), (-2, 1), (-1, 2), (1, 2), (2, -1), (2, 1), (-1, -2), (1, -2))
+KING_DIRECTIONS = ((-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1))
+ROOK_DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1))
+BISHOP_DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+
+
+def squares(bitboard):
+    '''
+    Yields the square indices of all set bits of a bitboard, from the lowest to the highest.
+
+    Parameters:
+    bitboard (int): The bitboard to be iterated.
+
+    Returns:
+    generator: The square indices of the set bits.
+    '''
+    while bitboard:
+        lowest = bitboard & -bitboard
+        yield lowest.bit_length() - 1
+        bitboard ^= lowest
+
+
+def _stepAttacks(directions):
+    '''
+    Builds an attack table for a piece that moves one step in each of the specified directions.
+
+    Parameters:
+    directions (tuple): The (row, col) offsets of the piece.
+
+    Returns:
+    list: A list of 64 bitboards, one per square.
+    '''
+    table = []
+    for square in range(64):
+        row, col = divmod(square, 8)
+        attacks = 0
+        for direction in directions:
+            endRow = row + direction[0]
+            endCol = col + direction[1]
+            if 0 <= endRow < 8 and 0 <= endCol < 8:
+                attacks |= 1 << (endRow * 8 + endCol)
+        table.append(attacks)
+    return table
+
+
+def _slide(square, occupied, directions):
+    '''
+    Computes the attacks of a sliding piece by walking along each direction until a blocker is hit.
+
+    Parameters:
+    square (int): The square index of the sliding piece.
+    occupied (int): The bitboard of occupied squares.
+    directions (tuple): The (row, col) directions of the sliding piece.
+
+    Returns:
+    int: The bitboard of attacked squares, blockers included.
+    '''
+    row, col = divmod(square, 8)
+    attacks = 0
+    for direction in directions:
+        endRow = row + direction[0]
+        endCol = col + direction[1]
+        while 0 <= endRow < 8 and 0 <= endCol < 8:
+            bit = 1 << (endRow * 8 + endCol)
+            attacks |= bit
+            if occupied & bit:
+                break
+            endRow += direction[0]
+            endCol += direction[1]
+    return attacks
+
+
+def _relevantMask(square, directions):
+    '''
+    Builds the mask of squares whose occupancy can change the attacks of a sliding piece.
+    The last square of every ray is left out, because a piece there never blocks anything behind it.
+
+    Parameters:
+    square (int): The square index of the sliding piece.
+    directions (tuple): The (row, col) directions of the sliding piece.
+
+    Returns:
+    int: The relevant occupancy mask.
+    '''
+    row, col = divmod(square, 8)
+    mask = 0
+    for direction in directions:
+        endRow = row + direction[0]
+        endCol = col + direction[1]
+        while 0 <= endRow + direction[0] < 8 and 0 <= endCol + direction[1] < 8:
+            mask |= 1 << (endRow * 8 + endCol)
+            endRow += direction[0]
+            endCol += direction[1]
+    return mask
+
+
+KNIGHT_ATTACKS = _stepAttacks(KNIGHT_DIRECTIONS)
+KING_ATTACKS = _stepAttacks(KING_DIRECTIONS)
+# PAWN_ATTACKS[color][square] holds the squares a pawn of that color attacks from the square.
+PAWN_ATTACKS = {'w': _stepAttacks(((-1, -1), (-1, 1))), 'b': _stepAttacks(((1, -1), (1, 1)))}
+
+ROOK_MASKS = [_relevantMask(square, ROOK_DIRECTIONS) for square in range(64)]
+BISHOP_MASKS = [_relevantMask(square, BISHOP_DIRECTIONS) for square in range(64)]
+# Sliding attacks are looked up by the relevant occupancy and filled in on first use.
+ROOK_TABLES = [{} for square in range(64)]
+BISHOP_TABLES = [{} for square in range(64)]
+
+
+def rookAttacks(square, occupied):
+    '''
+    Returns the squares attacked by a rook on the specified square.
+
+    Parameters:
+    square (int): The square index of the rook.
+    occupied (int): The bitboard of occupied squares.
+
+    Returns:
+    int: The bitboard of attacked squares, blockers included.
+    '''
+    key = occupied & ROOK_MASKS[square]
+    table = ROOK_TABLES[square]
+    attacks = table.get(key)
+    if attacks is None:
+        attacks = table[key] = _slide(square, key, ROOK_DIRECTIONS)
+    return attacks
+
+
+def bishopAttacks(square, occupied):
+    '''
+    Returns the squares attacked by a bishop on the specified square.
+
+    Parameters:
+    square (int): The square index of the bishop.
+    occupied (int): The bitboard of occupied squares.
+
+    Returns:
+    int: The bitboard of attacked squares, blockers included.
+    '''
+    key = occupied & BISHOP_MASKS[square]
+    table = BISHOP_TABLES[square]
+    attacks = table.get(key)
+    if attacks is None:
+        attacks = table[key] = _slide(square, key, BISHOP_DIRECTIONS)
+    return attacks
+
+
+def queenAttacks(square, occupied):
+    '''
+    Returns the squares attacked by a queen on the specified square.
+
+    Parameters:
+    square (int): The square index of the queen.
+    occupied (int): The bitboard of occupied squares.
+
+    Returns:
+    int: The bitboard of attacked squares, blockers included.
+    '''
+    return rookAttacks(square, occupied) | bishopAttacks(square, occupied)
+
+
+def _betweenTable():
+    '''
+    Builds the table of squares lying strictly between two squares on the same row, column or diagonal.
+
+    Returns:
+    list: A 64 x 64 list of bitboards, 0 for squares that are not aligned.
+    '''
+    table = [[0] * 64 for square in range(64)]
+    for square in range(64):
+        row, col = divmod(square, 8)
+        for direction in KING_DIRECTIONS:
+            between = 0
+            endRow = row + direction[0]
+            endCol = col + direction[1]
+            while 0 <= endRow < 8 and 0 <= endCol < 8:
+                end = endRow * 8 + endCol
+                table[square][end] = between
+                between |= 1 << end
+                endRow += direction[0]
+                endCol += direction[1]
+    return table
+
+
+BETWEEN = _betweenTable()
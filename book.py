@@ -0,0 +1,262 @@
+'''
+This is a file that contains the opening book.
+
+The book is a binary file in the layout of a Polyglot book: a sorted array of 16 byte big-endian entries,
+each holding the Zobrist key of a position (see zobrist.py), a move packed as 'Move.moveID', a weight and
+4 unused bytes. The keys are the keys of this program and not the Polyglot ones, so books are built with
+this file. The book is read through mmap and a position is found by binary search, so opening a book costs
+nothing and every process that opens it shares the same pages of the operating system cache.
+
+Usage:
+python book.py build games.pgn --output book.bin --plies 20
+python book.py probe book.bin --fen 'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1'
+'''
+import argparse
+import mmap
+import random
+import struct
+import sys
+
+import rules
+from notation import getMovesTo, getSan
+from pgn import readGames, replayGame
+
+ENTRY = struct.Struct('>QHHI')
+KEY = struct.Struct('>Q')
+# The weight of a move by the result of the game for the player who made it: a win, a draw and a loss.
+RESULT_WEIGHTS = {'1-0': (2, 0), '0-1': (0, 2), '1/2-1/2': (1, 1)}
+MAX_WEIGHT = 0xFFFF
+# The books opened by this process, keyed by their path.
+_openBooks = {}
+
+
+class OpeningBook:
+    '''
+    This class represents an opening book file, read through mmap.
+    '''
+    def __init__(self, path):
+        '''
+        Initialize the OpeningBook object.
+
+        Parameters:
+        path (str): The path of the book file.
+
+        Returns:
+        None
+
+        Raises:
+        ValueError: If the size of the file is not a multiple of the entry size.
+        '''
+        self.path = path
+        with open(path, 'rb') as file:
+            size = file.seek(0, 2)
+            if size % ENTRY.size:
+                raise ValueError('Invalid book file: ' + path)
+            # An empty file cannot be memory-mapped.
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self.count = size // ENTRY.size
+
+    def __getstate__(self):
+        '''
+        Returns the state pickled when the book is sent to another process: only its path.
+
+        Returns:
+        dict: The state of the book.
+        '''
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        '''
+        Maps the book file again in the process the book was sent to.
+
+        Parameters:
+        state (dict): The state made by '__getstate__'.
+
+        Returns:
+        None
+        '''
+        self.__init__(state['path'])
+
+    def close(self):
+        '''
+        Unmaps the book file.
+
+        Returns:
+        None
+        '''
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+    def findFirst(self, key):
+        '''
+        Finds the first entry of a position by binary search.
+
+        Parameters:
+        key (int): The Zobrist key of the position.
+
+        Returns:
+        int: The index of the first entry with a key not less than 'key', 'count' if there is none.
+        '''
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if KEY.unpack_from(self.buffer, middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def getEntries(self, key):
+        '''
+        Returns the entries of a position.
+
+        Parameters:
+        key (int): The Zobrist key of the position.
+
+        Returns:
+        list: The (moveID, weight) tuples of the position, the heaviest first.
+        '''
+        entries = []
+        index = self.findFirst(key)
+        while index < self.count:
+            entryKey, moveID, weight, learn = ENTRY.unpack_from(self.buffer, index * ENTRY.size)
+            if entryKey != key:
+                break
+            entries.append((moveID, weight))
+            index += 1
+        return entries
+
+    def getMoves(self, gc):
+        '''
+        Returns the book moves of the current position.
+
+        Parameters:
+        gc (GameCondition): The game condition.
+
+        Returns:
+        list: The (Move, weight) tuples of the position, the heaviest first. The moves are the valid moves of the
+        position, so a move stored for another position with the same key is never returned.
+        '''
+        moves = []
+        for moveID, weight in self.getEntries(gc.zobristKey):
+            for move in getMovesTo(gc, moveID >> 6 & 63):
+                if move.moveID == moveID:
+                    moves.append((move, weight))
+                    break
+        return moves
+
+    def chooseMove(self, gc, generator=random):
+        '''
+        Chooses a book move of the current position at random, in proportion to the weights.
+
+        Parameters:
+        gc (GameCondition): The game condition.
+        generator (random.Random): The random number generator.
+
+        Returns:
+        Move: The book move, or None if the position is not in the book.
+        '''
+        moves = self.getMoves(gc)
+        total = sum(weight for move, weight in moves)
+        if not total:
+            return moves[0][0] if moves else None
+        choice = generator.randrange(total)
+        for move, weight in moves:
+            choice -= weight
+            if choice < 0:
+                return move
+
+
+def openBook(path):
+    '''
+    Opens a book file once per process.
+
+    Parameters:
+    path (str): The path of the book file.
+
+    Returns:
+    OpeningBook: The book.
+    '''
+    if path not in _openBooks:
+        _openBooks[path] = OpeningBook(path)
+    return _openBooks[path]
+
+
+def buildBook(sources, output, plies=20, minCount=1):
+    '''
+    Builds a book from PGN games.
+
+    Parameters:
+    sources (list): The PGN sources (see 'pgn.readGames').
+    output (str): The path of the book file to write.
+    plies (int): The number of plies of every game that go into the book.
+    minCount (int): The number of games a move must be played in to go into the book.
+
+    Returns:
+    dict: The totals with the keys 'games', 'invalid', 'positions' and 'entries'.
+
+    Note:
+    - The weight of a move is twice the number of games it won plus the number of games it drew, scaled down
+      to fit in 16 bits. Moves that only lost get no weight, but stay in the book.
+    '''
+    counts = {}
+    totals = {'games': 0, 'invalid': 0}
+    for source in sources:
+        for headers, moves, result in readGames(source):
+            totals['games'] += 1
+            whiteWeight, blackWeight = RESULT_WEIGHTS.get(result, (0, 0))
+            try:
+                for gc, move in replayGame(headers, moves[:plies]):
+                    entry = counts.setdefault((gc.zobristKey, move.moveID & 0xFFFF), [0, 0])
+                    entry[0] += 1
+                    entry[1] += whiteWeight if gc.whiteToMove else blackWeight
+            except ValueError:
+                totals['invalid'] += 1
+
+    entries = [(key, moveID, weight) for (key, moveID), (count, weight) in counts.items() if count >= minCount]
+    heaviest = max((weight for key, moveID, weight in entries), default=0)
+    scale = MAX_WEIGHT / heaviest if heaviest > MAX_WEIGHT else 1
+    entries.sort(key=lambda entry: (entry[0], -entry[2]))
+    with open(output, 'wb') as file:
+        for key, moveID, weight in entries:
+            file.write(ENTRY.pack(key, moveID, int(weight * scale), 0))
+    totals['positions'] = len({key for key, moveID, weight in entries})
+    totals['entries'] = len(entries)
+    return totals
+
+
+def main():
+    '''
+    Main function of the opening book tool.
+    '''
+    parser = argparse.ArgumentParser(description='Opening book builder and prober.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='build a book from PGN files')
+    build.add_argument('games', nargs='+', help='PGN files')
+    build.add_argument('--output', default='book.bin', help='book file to write')
+    build.add_argument('--plies', type=int, default=20, help='number of plies of every game that go into the book')
+    build.add_argument('--min-count', type=int, default=1, help='number of games a move must be played in')
+    probe = commands.add_parser('probe', help='list the book moves of a position')
+    probe.add_argument('book', help='book file')
+    probe.add_argument('--fen', default=rules.START_FEN, help='FEN string of the position, by default the initial position')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        totals = buildBook(args.games, args.output, args.plies, args.min_count)
+        print('%d games (%d invalid), %d positions, %d entries written to %s' % (
+            totals['games'], totals['invalid'], totals['positions'], totals['entries'], args.output))
+        return 0
+
+    book = OpeningBook(args.book)
+    gc = rules.GameCondition.fromFen(args.fen)
+    moves = book.getMoves(gc)
+    total = sum(weight for move, weight in moves)
+    for move, weight in moves:
+        print('%-8s %5d %5.1f%%' % (getSan(gc, move), weight, 100 * weight / total if total else 0.0))
+    if not moves:
+        print('Not in the book')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
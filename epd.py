@@ -0,0 +1,211 @@
+'''
+This is a file that contains the EPD test suite runner.
+
+An EPD record is the first four fields of a FEN string followed by operations, each an opcode and its operands
+ended by a semicolon, for example:
+r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - bm Qxf7#; id "scholar";
+rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1 ;D1 20 ;D2 400 ;D3 8902
+
+The runner checks the best move ('bm') and avoid move ('am') operations with the search engine and the
+perft operations ('D1', 'D2', ...) with 'perft.perft'. The suite file is read one line at a time and only
+the totals are kept, so a suite of any size runs in constant memory.
+
+Usage:
+python epd.py suite.epd --depth 4 --time 1.0
+python epd.py perftsuite.epd --perft-depth 4
+cat suite.epd | python epd.py -
+'''
+import argparse
+import sys
+import time
+
+import rules
+from notation import getMoveNotation, parseMove
+from perft import perft
+from search import Search
+
+
+def parseEpd(line):
+    '''
+    Parses an EPD record.
+
+    Parameters:
+    line (str): The EPD record. The halfmove clock and fullmove number may follow the four position fields.
+
+    Returns:
+    tuple: The FEN string of the position and a dictionary of the operands of every operation, keyed by the opcode.
+
+    Raises:
+    ValueError: If the record is not a valid EPD record.
+    '''
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise ValueError('Invalid EPD record: ' + line)
+    fen = ' '.join(fields[:4])
+    rest = fields[4] if len(fields) > 4 else ''
+
+    # The move clocks are written as bare numbers after the position in FEN style records.
+    clocks = rest.split(None, 2)
+    if len(clocks) >= 2 and clocks[0].isdigit() and clocks[1].isdigit():
+        fen += ' ' + clocks[0] + ' ' + clocks[1]
+        rest = clocks[2] if len(clocks) > 2 else ''
+
+    operations = {}
+    operands = []
+    operand = ''
+    quoted = False
+    for character in rest + ';':
+        if character == '"':
+            quoted = not quoted
+        elif quoted:
+            operand += character
+        elif character.isspace() or character == ';':
+            if operand:
+                operands.append(operand)
+                operand = ''
+            if character == ';' and operands:
+                operations[operands[0]] = operands[1:]
+                operands = []
+        else:
+            operand += character
+    if quoted:
+        raise ValueError('Invalid EPD record, unterminated string: ' + line)
+
+    if 'hmvc' in operations and 'fmvn' in operations and len(fen.split()) == 4:
+        fen += ' ' + operations['hmvc'][0] + ' ' + operations['fmvn'][0]
+    return fen, operations
+
+
+def checkPosition(gc, operations, engine, depth, timeLimit, perftDepth):
+    '''
+    Checks the operations of an EPD record against the engine.
+
+    Parameters:
+    gc (GameCondition): The game condition of the record. It is left unchanged.
+    operations (dict): The operations of the record (see 'parseEpd').
+    engine (Search): The search engine used for the 'bm' and 'am' operations.
+    depth (int): The deepest iteration of the search.
+    timeLimit (float): The time budget of the search in seconds, or None for no limit.
+    perftDepth (int): The deepest perft operation to check, or None for every one.
+
+    Returns:
+    dict: The keys 'checked' (False if the record has no operation to check), 'passed', 'nodes' and 'errors',
+    a list of the failed operations.
+
+    Raises:
+    ValueError: If a move of a 'bm' or 'am' operation is not valid in the position.
+    '''
+    result = {'checked': False, 'passed': True, 'nodes': 0, 'errors': []}
+
+    if 'bm' in operations or 'am' in operations:
+        moves = gc.validMoveFunctions[gc.moveGenerator]()
+        bestMoves = [parseMove(text, moves) for text in operations.get('bm', [])]
+        avoidMoves = [parseMove(text, moves) for text in operations.get('am', [])]
+        # A new search must not reuse what the table learnt about the previous record.
+        engine.transpositionTable.clear()
+        engine.history = {}
+        search = engine.findBestMove(gc, depth, timeLimit)
+        result['checked'] = True
+        result['nodes'] += search.nodes
+        move = search.bestMove
+        if (bestMoves and move not in bestMoves) or move in avoidMoves:
+            result['passed'] = False
+            result['errors'].append('played %s, bm %s am %s' % (getMoveNotation(move) if move else '(none)',
+                                                                 ' '.join(operations.get('bm', [])) or '-',
+                                                                 ' '.join(operations.get('am', [])) or '-'))
+
+    for opcode in sorted(operations):
+        if len(opcode) < 2 or opcode[0] != 'D' or not opcode[1:].isdigit():
+            continue
+        currentDepth = int(opcode[1:])
+        if currentDepth < 1 or (perftDepth is not None and currentDepth > perftDepth):
+            continue
+        expected = int(operations[opcode][0])
+        nodes = perft(gc, currentDepth)
+        result['checked'] = True
+        result['nodes'] += nodes
+        if nodes != expected:
+            result['passed'] = False
+            result['errors'].append('%s %d, expected %d' % (opcode, nodes, expected))
+    return result
+
+
+def runSuite(file, depth=4, timeLimit=None, perftDepth=None, moveGenerator='legal', limit=None, output=sys.stdout):
+    '''
+    Runs an EPD test suite and prints the failed records as they are found.
+
+    Parameters:
+    file (file): The open EPD file.
+    depth (int): The deepest iteration of the search for the 'bm' and 'am' operations.
+    timeLimit (float): The time budget of the search per record in seconds, or None for no limit.
+    perftDepth (int): The deepest perft operation to check, or None for every one.
+    moveGenerator (str): The strategy used by 'getValidMoves'.
+    limit (int): The number of records to run, or None for every record.
+    output (file): The file the failed records are printed to, or None to print nothing.
+
+    Returns:
+    dict: The totals with the keys 'positions', 'checked', 'passed', 'invalid', 'nodes', 'seconds',
+    'positionsPerSecond' and 'passRate'.
+    '''
+    engine = Search()
+    gc = rules.GameCondition(moveGenerator)
+    totals = {'positions': 0, 'checked': 0, 'passed': 0, 'invalid': 0, 'nodes': 0}
+    start = time.perf_counter()
+
+    for number, line in enumerate(file, 1):
+        if limit is not None and totals['positions'] >= limit:
+            break
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        totals['positions'] += 1
+        try:
+            fen, operations = parseEpd(line)
+            gc.loadFen(fen)
+            result = checkPosition(gc, operations, engine, depth, timeLimit, perftDepth)
+        except ValueError as error:
+            totals['invalid'] += 1
+            if output is not None:
+                print('line %d: %s' % (number, error), file=output)
+            continue
+        totals['nodes'] += result['nodes']
+        if result['checked']:
+            totals['checked'] += 1
+            totals['passed'] += result['passed']
+        if not result['passed'] and output is not None:
+            label = ' '.join(operations['id']) if operations.get('id') else fen
+            print('line %d: %s: %s' % (number, label, '; '.join(result['errors'])), file=output)
+
+    totals['seconds'] = time.perf_counter() - start
+    totals['positionsPerSecond'] = totals['positions'] / totals['seconds'] if totals['seconds'] else 0.0
+    totals['passRate'] = totals['passed'] / totals['checked'] if totals['checked'] else 0.0
+    return totals
+
+
+def main():
+    '''
+    Main function of the EPD test suite runner.
+    '''
+    parser = argparse.ArgumentParser(description='EPD test suite runner.')
+    parser.add_argument('suite', help="EPD file, or '-' to read standard input")
+    parser.add_argument('--depth', type=int, default=4, help='deepest search iteration for bm and am')
+    parser.add_argument('--time', type=float, help='search time per position in seconds')
+    parser.add_argument('--perft-depth', type=int, help='deepest perft operation to check, by default every one')
+    parser.add_argument('--generator', default='legal', choices=('legal', 'filter'), help='strategy of getValidMoves')
+    parser.add_argument('--limit', type=int, help='number of positions to run')
+    args = parser.parse_args()
+
+    if args.suite == '-':
+        totals = runSuite(sys.stdin, args.depth, args.time, args.perft_depth, args.generator, args.limit)
+    else:
+        with open(args.suite, encoding='utf-8', errors='replace') as file:
+            totals = runSuite(file, args.depth, args.time, args.perft_depth, args.generator, args.limit)
+
+    print('%d positions, %d checked, %d passed (%.1f%%), %d invalid' % (
+        totals['positions'], totals['checked'], totals['passed'], 100 * totals['passRate'], totals['invalid']))
+    print('%.3f s, %.1f positions/s, %d nodes' % (totals['seconds'], totals['positionsPerSecond'], totals['nodes']))
+    return 0 if totals['passed'] == totals['checked'] and not totals['invalid'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
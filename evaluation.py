@@ -0,0 +1,138 @@
+'''
+This is a file that contains the static evaluation of chess positions.
+
+The evaluation counts material and adds a piece-square table bonus for every piece. Scores are in centipawns.
+The tables are written from white's point of view with row 0 being the 8th rank, the same orientation as
+'GameCondition.board'. Black pieces read them mirrored.
+'''
+PIECE_VALUES = {'p': 100, 'n': 320, 'b': 330, 'r': 500, 'q': 900, 'k': 0}
+
+PIECE_SQUARE_TABLES = {
+    'p': [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        5, 5, 10, 25, 25, 10, 5, 5,
+        0, 0, 0, 20, 20, 0, 0, 0,
+        5, -5, -10, 0, 0, -10, -5, 5,
+        5, 10, 10, -20, -20, 10, 10, 5,
+        0, 0, 0, 0, 0, 0, 0, 0],
+    'n': [
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20, 0, 0, 0, 0, -20, -40,
+        -30, 0, 10, 15, 15, 10, 0, -30,
+        -30, 5, 15, 20, 20, 15, 5, -30,
+        -30, 0, 15, 20, 20, 15, 0, -30,
+        -30, 5, 10, 15, 15, 10, 5, -30,
+        -40, -20, 0, 5, 5, 0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50],
+    'b': [
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 10, 10, 5, 0, -10,
+        -10, 5, 5, 10, 10, 5, 5, -10,
+        -10, 0, 10, 10, 10, 10, 0, -10,
+        -10, 10, 10, 10, 10, 10, 10, -10,
+        -10, 5, 0, 0, 0, 0, 5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20],
+    'r': [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        5, 10, 10, 10, 10, 10, 10, 5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        0, 0, 0, 5, 5, 0, 0, 0],
+    'q': [
+        -20, -10, -10, -5, -5, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 5, 5, 5, 0, -10,
+        -5, 0, 5, 5, 5, 5, 0, -5,
+        0, 0, 5, 5, 5, 5, 0, -5,
+        -10, 5, 5, 5, 5, 5, 0, -10,
+        -10, 0, 5, 0, 0, 0, 0, -10,
+        -20, -10, -10, -5, -5, -10, -10, -20],
+    'k': [
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+        20, 20, 0, 0, 0, 0, 20, 20,
+        20, 30, 10, 0, 0, 10, 30, 20],
+}
+# The king leaves its shelter and heads for the center once the heavy material is gone.
+KING_ENDGAME_TABLE = [
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10, 0, 0, -10, -20, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -30, 0, 0, 0, 0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50]
+
+# The game phase goes from 24 with all minor and major pieces on the board down to 0 with none of them.
+PHASE_WEIGHTS = {'p': 0, 'n': 1, 'b': 1, 'r': 2, 'q': 4, 'k': 0}
+MAX_PHASE = 24
+
+
+def _squareScores():
+    '''
+    Combines the piece values and piece-square tables into one score per piece and square.
+
+    Returns:
+    dict: A list of 64 scores for every piece ('wp', 'bk', ...), positive for white and negative for black.
+    '''
+    scores = {}
+    for piece, table in PIECE_SQUARE_TABLES.items():
+        value = PIECE_VALUES[piece]
+        scores['w' + piece] = [value + table[square] for square in range(64)]
+        # Row 7 - row of a black piece reads the same table entry as the row of the mirrored white piece.
+        scores['b' + piece] = [-value - table[(7 - (square >> 3)) * 8 + (square & 7)] for square in range(64)]
+    return scores
+
+
+SQUARE_SCORES = _squareScores()
+KING_ENDGAME_SCORES = {
+    'wk': [KING_ENDGAME_TABLE[square] - PIECE_SQUARE_TABLES['k'][square] for square in range(64)],
+    'bk': [PIECE_SQUARE_TABLES['k'][(7 - (square >> 3)) * 8 + (square & 7)] - KING_ENDGAME_TABLE[(7 - (square >> 3)) * 8 + (square & 7)]
+           for square in range(64)],
+}
+
+
+def evaluate(gc):
+    '''
+    Evaluates the current position from the point of view of the player to move.
+
+    Parameters:
+    gc (GameCondition): The game condition.
+
+    Returns:
+    int: The score in centipawns, positive if the player to move is better.
+    '''
+    score = 0
+    phase = 0
+    for piece, pieces in gc.bitboards.items():
+        if pieces:
+            scores = SQUARE_SCORES[piece]
+            count = 0
+            while pieces:
+                lowest = pieces & -pieces
+                score += scores[lowest.bit_length() - 1]
+                pieces ^= lowest
+                count += 1
+            phase += PHASE_WEIGHTS[piece[1]] * count
+
+    # Blend the middle game and endgame king tables by the game phase.
+    if phase < MAX_PHASE:
+        endgame = 0
+        for piece in ('wk', 'bk'):
+            pieces = gc.bitboards[piece]
+            if pieces:
+                endgame += KING_ENDGAME_SCORES[piece][pieces.bit_length() - 1]
+        score += endgame * (MAX_PHASE - phase) // MAX_PHASE
+
+    return score if gc.whiteToMove else -score
@@ -0,0 +1,379 @@
+'''
+This is a file that contains the self-play match runner.
+
+Two players, each a search engine class with its own limits, play games against each other on a pool of
+worker processes. Every opening position is played twice with the colors swapped. Every worker drives its
+own GameCondition, the finished games are written to a PGN file as they come in, and the score of the first
+player is turned into an Elo difference with a 95% confidence interval.
+
+Usage:
+python match.py --games 200 --player1 depth=3 --player2 nodes=5000 --output match.pgn
+python match.py --games 100 --player1 engine=search.Search,time=0.05 --player2 engine=mysearch.Search,time=0.05
+python match.py --games 100 --openings openings.epd --player1 depth=3,book=book.bin
+'''
+import argparse
+import importlib
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import rules
+from book import openBook
+from epd import parseEpd
+from notation import getSan
+from search import MAX_DEPTH
+
+# The game is adjudicated as a draw after this many plies.
+MAX_PLIES = 300
+# The number of random plies of the generated opening positions.
+OPENING_PLIES = 8
+# The z value of a 95% confidence interval.
+CONFIDENCE_Z = 1.96
+# The engine classes already imported by a worker, keyed by their 'module.Class' path.
+_ENGINE_CLASSES = {}
+
+
+def parsePlayer(text, name):
+    '''
+    Parses the description of a player, for example 'engine=search.Search,depth=3,nodes=20000,time=0.1,book=book.bin'.
+
+    Parameters:
+    text (str): The comma separated settings: the engine class, the depth, node and time limits per move and the opening book.
+    name (str): The name of the player in the PGN file.
+
+    Returns:
+    dict: The player with the keys 'name', 'engine', 'depth', 'nodes', 'time' and 'book'.
+
+    Raises:
+    ValueError: If a setting is not known or its value is not valid.
+    '''
+    player = {'name': name, 'engine': 'search.Search', 'depth': None, 'nodes': None, 'time': None, 'book': None}
+    for setting in filter(None, text.split(',')):
+        key, separator, value = setting.partition('=')
+        if key in ('engine', 'name', 'book'):
+            player[key] = value
+        elif key in ('depth', 'nodes'):
+            player[key] = int(value)
+        elif key == 'time':
+            player[key] = float(value)
+        else:
+            raise ValueError('Unknown player setting: ' + setting)
+    if player['depth'] is None and player['nodes'] is None and player['time'] is None:
+        player['depth'] = 3
+    return player
+
+
+def _getEngine(path):
+    '''
+    Creates a search engine from its class path.
+
+    Parameters:
+    path (str): The class path, 'module.Class'.
+
+    Returns:
+    Search: A new engine.
+    '''
+    if path not in _ENGINE_CLASSES:
+        module, separator, name = path.rpartition('.')
+        _ENGINE_CLASSES[path] = getattr(importlib.import_module(module), name)
+    return _ENGINE_CLASSES[path]()
+
+
+def isInsufficientMaterial(gc):
+    '''
+    Checks if neither player has the material to checkmate.
+
+    Parameters:
+    gc (GameCondition): The game condition.
+
+    Returns:
+    bool: True if there are only the kings and at most one knight or bishop left.
+    '''
+    bitboards = gc.bitboards
+    if bitboards['wp'] or bitboards['bp'] or bitboards['wr'] or bitboards['br'] or bitboards['wq'] or bitboards['bq']:
+        return False
+    minors = bitboards['wn'] | bitboards['bn'] | bitboards['wb'] | bitboards['bb']
+    return not minors & (minors - 1)
+
+
+def playGame(task):
+    '''
+    Plays one game on a worker process.
+
+    Parameters:
+    task (dict): The game, with the keys 'round', 'fen', 'white' and 'black' (see 'parsePlayer') and 'maxPlies'.
+
+    Returns:
+    dict: The task with the keys 'result' ('1-0', '0-1' or '1/2-1/2'), 'termination', 'moves' (in SAN),
+    'nodes' and 'seconds' added.
+    '''
+    start = time.perf_counter()
+    gc = rules.GameCondition.fromFen(task['fen'])
+    players = {True: task['white'], False: task['black']}
+    engines = {True: _getEngine(task['white']['engine']), False: _getEngine(task['black']['engine'])}
+    moves = []
+    nodes = 0
+    result = '1/2-1/2'
+    termination = 'max plies'
+
+    while len(moves) < task['maxPlies']:
+        # The checkmate and stalemate flags are set by getValidMoves.
+        validMoves = gc.getValidMoves()
+        if gc.checkMate:
+            result = '0-1' if gc.whiteToMove else '1-0'
+            termination = 'checkmate'
+            break
+        if gc.staleMate:
+            termination = 'stalemate'
+            break
+        if gc.isRepetition(3):
+            termination = 'repetition'
+            break
+        if gc.halfmoveClock >= 100:
+            termination = 'fifty moves'
+            break
+        if isInsufficientMaterial(gc):
+            termination = 'insufficient material'
+            break
+
+        player = players[gc.whiteToMove]
+        # The book is mapped once per worker process, not copied.
+        move = openBook(player['book']).chooseMove(gc) if player['book'] else None
+        if move is None:
+            search = engines[gc.whiteToMove].findBestMove(gc, player['depth'] or MAX_DEPTH, player['time'], player['nodes'])
+            nodes += search.nodes
+            move = search.bestMove if search.bestMove is not None else validMoves[0]
+        moves.append(getSan(gc, move, validMoves))
+        gc.makeMove(move)
+
+    game = dict(task)
+    game.update({'result': result, 'termination': termination, 'moves': moves, 'nodes': nodes,
+                 'seconds': time.perf_counter() - start})
+    return game
+
+
+def getOpenings(count, plies=OPENING_PLIES, seed=0, path=None):
+    '''
+    Returns the opening positions of a match.
+
+    Parameters:
+    count (int): The number of openings.
+    plies (int): The number of random plies played from the initial position to make an opening.
+    seed (int): The seed of the random openings.
+    path (str): An EPD or FEN file to take the openings from, in turn, instead of making random ones.
+
+    Returns:
+    list: The FEN strings of the openings.
+
+    Raises:
+    ValueError: If a line of the file is not a valid EPD record or FEN string.
+    '''
+    if path is not None:
+        openings = []
+        with open(path, encoding='utf-8', errors='replace') as file:
+            for line in file:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    openings.append(parseEpd(line)[0])
+                    if len(openings) == count:
+                        break
+        if not openings:
+            raise ValueError('No openings in ' + path)
+        return [openings[index % len(openings)] for index in range(count)]
+
+    generator = random.Random(seed)
+    openings = []
+    while len(openings) < count:
+        gc = rules.GameCondition()
+        for ply in range(plies):
+            moves = gc.getValidMoves()
+            if not moves:
+                break
+            gc.makeMove(generator.choice(moves))
+        # An opening that is already lost or over is thrown away.
+        if gc.hasLegalMove() and not gc.threatOfCheck():
+            openings.append(gc.getFen())
+    return openings
+
+
+def getElo(score):
+    '''
+    Converts a score into an Elo difference.
+
+    Parameters:
+    score (float): The share of the points, between 0 and 1.
+
+    Returns:
+    float: The Elo difference, infinite for a score of 0 or 1.
+    '''
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return -400 * math.log10(1 / score - 1)
+
+
+def getEloInterval(wins, draws, losses):
+    '''
+    Estimates the Elo difference of a player and its 95% confidence interval.
+
+    Parameters:
+    wins (int): The number of games won.
+    draws (int): The number of games drawn.
+    losses (int): The number of games lost.
+
+    Returns:
+    tuple: The score, the Elo difference and the half width of the confidence interval in Elo.
+
+    Note:
+    - The bounds of the Wilson interval of the score are converted into Elo. A score of 0 or 1 has an infinite
+      Elo difference and bound, so its margin is infinite too.
+    '''
+    games = wins + draws + losses
+    if not games:
+        return 0.5, 0.0, math.inf
+    score = (wins + draws / 2) / games
+    z2 = CONFIDENCE_Z ** 2
+    center = (score + z2 / (2 * games)) / (1 + z2 / games)
+    width = CONFIDENCE_Z / (1 + z2 / games) * math.sqrt(score * (1 - score) / games + z2 / (4 * games ** 2))
+    low, high = getElo(max(center - width, 0.0)), getElo(min(center + width, 1.0))
+    return score, getElo(score), (high - low) / 2
+
+
+def formatPgn(game):
+    '''
+    Writes a finished game in PGN.
+
+    Parameters:
+    game (dict): The game (see 'playGame').
+
+    Returns:
+    str: The PGN text of the game, ending with a blank line.
+    '''
+    headers = [('Event', 'Self-play match'), ('Round', str(game['round'])), ('White', game['white']['name']),
+               ('Black', game['black']['name']), ('Result', game['result'])]
+    if game['fen'] != rules.START_FEN:
+        headers += [('SetUp', '1'), ('FEN', game['fen'])]
+    headers.append(('Termination', game['termination']))
+    lines = ['[%s "%s"]' % header for header in headers]
+
+    fields = game['fen'].split()
+    number = int(fields[5])
+    whiteToMove = fields[1] == 'w'
+    tokens = []
+    for index, san in enumerate(game['moves']):
+        if whiteToMove:
+            tokens.append('%d.' % number)
+        elif index == 0:
+            tokens.append('%d...' % number)
+        tokens.append(san)
+        if not whiteToMove:
+            number += 1
+        whiteToMove = not whiteToMove
+    tokens.append(game['result'])
+
+    # The movetext is wrapped at 80 characters.
+    movetext = []
+    line = ''
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > 80:
+            movetext.append(line)
+            line = token
+        else:
+            line = line + ' ' + token if line else token
+    movetext.append(line)
+    return '\n'.join(lines) + '\n\n' + '\n'.join(movetext) + '\n\n'
+
+
+def runMatch(player1, player2, games, workers=None, openings=None, maxPlies=MAX_PLIES, output=None, progress=None):
+    '''
+    Plays a match between two players on a pool of worker processes.
+
+    Parameters:
+    player1 (dict): The first player (see 'parsePlayer'), the one the score and Elo difference are given for.
+    player2 (dict): The second player.
+    games (int): The number of games, rounded up to an even number so that every opening is played with both colors.
+    workers (int): The number of worker processes, by default the number of CPUs.
+    openings (list): The FEN strings of the openings, at least one per two games, or None for random openings.
+    maxPlies (int): The number of plies after which a game is adjudicated as a draw.
+    output (file): The file the games are written to in PGN as they finish, or None.
+    progress (function): Called with the totals after every finished game, or None.
+
+    Returns:
+    dict: The totals with the keys 'games', 'wins', 'draws', 'losses' (of the first player), 'score', 'elo',
+    'eloMargin', 'nodes', 'seconds' and 'gamesPerSecond'.
+    '''
+    pairs = (games + 1) // 2
+    if openings is None:
+        openings = getOpenings(pairs)
+    tasks = []
+    for index in range(pairs):
+        fen = openings[index % len(openings)]
+        tasks.append({'round': 2 * index + 1, 'fen': fen, 'white': player1, 'black': player2, 'maxPlies': maxPlies})
+        tasks.append({'round': 2 * index + 2, 'fen': fen, 'white': player2, 'black': player1, 'maxPlies': maxPlies})
+
+    totals = {'games': 0, 'wins': 0, 'draws': 0, 'losses': 0, 'nodes': 0}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for future in as_completed([pool.submit(playGame, task) for task in tasks]):
+            game = future.result()
+            totals['games'] += 1
+            totals['nodes'] += game['nodes']
+            if game['result'] == '1/2-1/2':
+                totals['draws'] += 1
+            elif (game['result'] == '1-0') == (game['white'] == player1):
+                totals['wins'] += 1
+            else:
+                totals['losses'] += 1
+            if output is not None:
+                output.write(formatPgn(game))
+                output.flush()
+            totals['seconds'] = time.perf_counter() - start
+            if progress is not None:
+                progress(totals)
+
+    totals['seconds'] = time.perf_counter() - start
+    totals['score'], totals['elo'], totals['eloMargin'] = getEloInterval(totals['wins'], totals['draws'], totals['losses'])
+    totals['gamesPerSecond'] = totals['games'] / totals['seconds'] if totals['seconds'] else 0.0
+    return totals
+
+
+def main():
+    '''
+    Main function of the match runner.
+    '''
+    parser = argparse.ArgumentParser(description='Parallel self-play match runner.')
+    parser.add_argument('--games', type=int, default=100, help='number of games, rounded up to an even number')
+    parser.add_argument('--player1', default='', help="settings of the first player, for example 'engine=search.Search,depth=3'")
+    parser.add_argument('--player2', default='', help='settings of the second player')
+    parser.add_argument('--workers', type=int, help='number of worker processes, by default the number of CPUs')
+    parser.add_argument('--openings', help='EPD or FEN file of opening positions, by default random openings')
+    parser.add_argument('--opening-plies', type=int, default=OPENING_PLIES, help='number of random plies of the random openings')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random openings')
+    parser.add_argument('--max-plies', type=int, default=MAX_PLIES, help='number of plies after which a game is drawn')
+    parser.add_argument('--output', default='match.pgn', help='PGN file the games are written to')
+    args = parser.parse_args()
+
+    player1 = parsePlayer(args.player1, 'player1')
+    player2 = parsePlayer(args.player2, 'player2')
+    openings = getOpenings((args.games + 1) // 2, args.opening_plies, args.seed, args.openings)
+
+    def progress(totals):
+        print('\r%d games  +%d =%d -%d  %.2f games/s' % (totals['games'], totals['wins'], totals['draws'], totals['losses'],
+                                                          totals['games'] / totals['seconds'] if totals['seconds'] else 0.0),
+              end='', file=sys.stderr, flush=True)
+
+    with open(args.output, 'w') as output:
+        totals = runMatch(player1, player2, args.games, args.workers, openings, args.max_plies, output, progress)
+    print(file=sys.stderr)
+    print('%s vs %s: %d games, +%d =%d -%d' % (player1['name'], player2['name'], totals['games'], totals['wins'], totals['draws'], totals['losses']))
+    print('score %.1f%%, Elo %+.1f +/- %.1f' % (100 * totals['score'], totals['elo'], totals['eloMargin']))
+    print('%.1f s, %.2f games/s, %d nodes' % (totals['seconds'], totals['gamesPerSecond'], totals['nodes']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,170 @@
+'''
+This is a file that contains the writing and parsing of moves in standard algebraic notation (SAN), for example
+'Nf3', 'exd5', 'O-O' or 'e8=Q+', and the parsing of moves in coordinate notation, for example 'g1f3' or 'e7e8q'.
+'''
+import re
+
+from rules import Move
+
+SAN_PATTERN = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$')
+COORDINATE_PATTERN = re.compile(r'^[a-h][1-8][a-h][1-8][qrbn]?$')
+# The end square of the king for every castling notation, by the player to move.
+CASTLE_SQUARES = {True: {'O-O': 62, '0-0': 62, 'O-O-O': 58, '0-0-0': 58}, False: {'O-O': 6, '0-0': 6, 'O-O-O': 2, '0-0-0': 2}}
+
+
+def getMoveNotation(move):
+    '''
+    Returns the coordinate notation of a move, for example 'e2e4', or 'e7e8q' for a promotion.
+
+    Parameters:
+    move (Move): The move.
+
+    Returns:
+    str: The coordinate notation of the move.
+    '''
+    return move.getNotation((move.startRow, move.startCol), (move.endRow, move.endCol)) + move.promotion
+
+
+def getMovesTo(gc, end):
+    '''
+    Returns the valid moves of the current position that end on a square.
+
+    Parameters:
+    gc (GameCondition): The game condition.
+    end (int): The end square, as row * 8 + col.
+
+    Returns:
+    list: The valid moves to the square.
+
+    Note:
+    - With the 'legal' strategy only the moves to the square are generated, which is several times faster than
+      generating every move. SAN only needs to tell apart the moves to the same square.
+    '''
+    if gc.moveGenerator == 'legal':
+        return gc.getLegalMoves(1 << end)
+    return [move for move in gc.validMoveFunctions[gc.moveGenerator]() if move.moveID >> 6 & 63 == end]
+
+
+def findMove(gc, text):
+    '''
+    Finds the valid move of the current position written in standard algebraic or coordinate notation.
+
+    Parameters:
+    gc (GameCondition): The game condition.
+    text (str): The move (see 'parseMove').
+
+    Returns:
+    Move: The move.
+
+    Raises:
+    ValueError: If the text matches no valid move, or more than one.
+    '''
+    san = text.rstrip('+#!?')
+    if san.endswith('e.p.'):
+        san = san[:-4]
+    if san in CASTLE_SQUARES[True]:
+        end = CASTLE_SQUARES[gc.whiteToMove][san]
+    else:
+        if COORDINATE_PATTERN.match(san):
+            square = san[2:4]
+        else:
+            match = SAN_PATTERN.match(san)
+            if not match:
+                raise ValueError('Invalid move: ' + text)
+            square = match.group(4)
+        end = Move.boardToRow[square[1]] * 8 + Move.boardToCol[square[0]]
+    return parseMove(text, getMovesTo(gc, end))
+
+
+def parseMove(text, moves):
+    '''
+    Finds the move written in standard algebraic or coordinate notation among the valid moves of a position.
+
+    Parameters:
+    text (str): The move, for example 'Nbd2', 'exd6', 'O-O-O', 'b8=Q#' or 'e2e4'. Check and annotation marks are ignored.
+    moves (list): The valid moves of the position (see 'GameCondition.getValidMoves').
+
+    Returns:
+    Move: The move.
+
+    Raises:
+    ValueError: If the text matches no valid move, or more than one.
+    '''
+    san = text.rstrip('+#!?')
+    if san.endswith('e.p.'):
+        san = san[:-4]
+    if COORDINATE_PATTERN.match(san):
+        for move in moves:
+            if getMoveNotation(move) == san:
+                return move
+        raise ValueError('Invalid move: ' + text)
+
+    if san in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        col = 6 if len(san) == 3 else 2
+        candidates = [move for move in moves if move.isCastleMove and move.endCol == col]
+    else:
+        match = SAN_PATTERN.match(san)
+        if not match:
+            raise ValueError('Invalid move: ' + text)
+        piece, fromCol, fromRow, square, promotion = match.groups()
+        piece = (piece or 'P').lower()
+        endRow, endCol = Move.boardToRow[square[1]], Move.boardToCol[square[0]]
+        candidates = [move for move in moves
+                      if move.startSquare[1] == piece and move.endRow == endRow and move.endCol == endCol
+                      and (fromCol is None or move.startCol == Move.boardToCol[fromCol])
+                      and (fromRow is None or move.startRow == Move.boardToRow[fromRow])
+                      and move.promotion == (promotion or '').lower()]
+    if len(candidates) != 1:
+        raise ValueError(('Ambiguous move: ' if candidates else 'Invalid move: ') + text)
+    return candidates[0]
+
+
+def getSan(gc, move, moves=None):
+    '''
+    Returns the standard algebraic notation of a move, for example 'Nbd2', 'exd6', 'O-O-O' or 'b8=Q#'.
+
+    Parameters:
+    gc (GameCondition): The game condition of the position before the move. It is left unchanged.
+    move (Move): A valid move of the position.
+    moves (list): The valid moves of the position, or at least the ones to the end square of the move,
+    or None to generate them.
+
+    Returns:
+    str: The notation of the move, with '+' for check and '#' for checkmate.
+    '''
+    if moves is None:
+        moves = getMovesTo(gc, move.moveID >> 6 & 63)
+    piece = move.startSquare[1]
+    square = Move.colToBoard[move.endCol] + Move.rowToBoard[move.endRow]
+
+    if move.isCastleMove:
+        san = 'O-O' if move.endCol == 6 else 'O-O-O'
+    elif piece == 'p':
+        if move.startCol != move.endCol:
+            san = Move.colToBoard[move.startCol] + 'x' + square
+        else:
+            san = square
+        if move.promotion:
+            san += '=' + move.promotion.upper()
+    else:
+        # The start file, rank or both are added when another piece of the same kind can move to the same square.
+        others = [other for other in moves
+                  if other.startSquare == move.startSquare and other.moveID & 0xFC0 == move.moveID & 0xFC0
+                  and other.moveID & 63 != move.moveID & 63]
+        san = piece.upper()
+        if others:
+            if all(other.startCol != move.startCol for other in others):
+                san += Move.colToBoard[move.startCol]
+            elif all(other.startRow != move.startRow for other in others):
+                san += Move.rowToBoard[move.startRow]
+            else:
+                san += Move.colToBoard[move.startCol] + Move.rowToBoard[move.startRow]
+        if move.endSquare != '--':
+            san += 'x'
+        san += square
+
+    gc.makeMove(move)
+    if gc.threatOfCheck():
+        san += '+' if gc.hasLegalMove() else '#'
+    gc.undoMove()
+    return san
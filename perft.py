@@ -0,0 +1,254 @@
+'''
+This is a file that contains the perft driver and benchmark suite for the rules of chess.
+
+Perft counts the leaf nodes of the move tree of a position down to a fixed depth. The counts check the move
+generator against known values, and the time it takes measures the throughput of
+'getValidMoves', 'makeMove' and 'undoMove'.
+
+Usage:
+python perft.py                              check every position up to its deepest known depth
+python perft.py --position initial --depth 4 --divide
+python perft.py --bench --output bench.jsonl append a benchmark record to a JSON lines file
+python perft.py --profile perft.prof         print the profiling counters of the rules and write them for pstats
+'''
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+
+import profiling
+import rules
+from notation import getMoveNotation
+
+# Name, FEN and the expected leaf count per depth. These are the published perft positions, which cover
+# castling, en passant, promotions and discovered checks. The deeper known counts are left out to keep the suite short.
+POSITIONS = [
+    ('initial', rules.START_FEN, {1: 20, 2: 400, 3: 8902, 4: 197281}),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1', {1: 48, 2: 2039, 3: 97862}),
+    ('position3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1', {1: 14, 2: 191, 3: 2812, 4: 43238}),
+    ('position4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1', {1: 6, 2: 264, 3: 9467}),
+    ('position5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8', {1: 44, 2: 1486, 3: 62379}),
+    ('position6', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10', {1: 46, 2: 2079, 3: 89890}),
+]
+
+
+def setupPosition(moves, moveGenerator='legal', fen=rules.START_FEN):
+    '''
+    Creates a game condition and plays the specified moves from a position.
+
+    Parameters:
+    moves (list): The moves to be played, in coordinate notation.
+    moveGenerator (str): The strategy used by 'getValidMoves'.
+    fen (str): The FEN string of the position to start from, by default the initial position.
+
+    Returns:
+    GameCondition: The game condition after the moves.
+
+    Raises:
+    ValueError: If the FEN string or one of the moves is not valid.
+    '''
+    gc = rules.GameCondition.fromFen(fen, moveGenerator)
+    for notation in moves:
+        for move in gc.getValidMoves():
+            if getMoveNotation(move) == notation:
+                gc.makeMove(move)
+                break
+        else:
+            raise ValueError('Invalid move: ' + notation)
+    return gc
+
+
+def perft(gc, depth):
+    '''
+    Counts the leaf nodes of the move tree of the current position.
+
+    Parameters:
+    gc (GameCondition): The game condition. It is left unchanged.
+    depth (int): The depth of the move tree, at least 1.
+
+    Returns:
+    int: The number of leaf nodes.
+
+    Note:
+    - The last ply is counted from the length of the move list without making the moves.
+    '''
+    moves = gc.getValidMoves()
+    if depth == 1:
+        return len(moves)
+
+    nodes = 0
+    for move in moves:
+        gc.makeMove(move)
+        nodes += perft(gc, depth - 1)
+        gc.undoMove()
+    return nodes
+
+
+def divide(gc, depth):
+    '''
+    Counts the leaf nodes below every valid move of the current position.
+
+    Parameters:
+    gc (GameCondition): The game condition. It is left unchanged.
+    depth (int): The depth of the move tree, at least 1.
+
+    Returns:
+    dict: The number of leaf nodes for every move, keyed by the coordinate notation of the move.
+    '''
+    counts = {}
+    for move in gc.getValidMoves():
+        if depth == 1:
+            counts[getMoveNotation(move)] = 1
+        else:
+            gc.makeMove(move)
+            counts[getMoveNotation(move)] = perft(gc, depth - 1)
+            gc.undoMove()
+    return counts
+
+
+def runPerft(gc, depth):
+    '''
+    Runs perft for every depth from 1 to the specified depth and times it.
+
+    Parameters:
+    gc (GameCondition): The game condition. It is left unchanged.
+    depth (int): The deepest depth to run.
+
+    Returns:
+    list: One dictionary per depth with the keys 'depth', 'nodes', 'seconds' and 'nps'.
+    '''
+    results = []
+    for currentDepth in range(1, depth + 1):
+        start = time.perf_counter()
+        nodes = perft(gc, currentDepth)
+        seconds = time.perf_counter() - start
+        results.append({'depth': currentDepth, 'nodes': nodes, 'seconds': seconds, 'nps': nodes / seconds if seconds else 0.0})
+    return results
+
+
+def runSuite(depth=None, moveGenerator='legal', names=None):
+    '''
+    Runs perft on the standard positions and checks the leaf counts.
+
+    Parameters:
+    depth (int): The deepest depth to run. None runs every position up to its deepest known depth.
+    moveGenerator (str): The strategy used by 'getValidMoves'.
+    names (list): The names of the positions to run. None runs every position.
+
+    Returns:
+    list: One dictionary per position with the keys 'name', 'depths' (see 'runPerft') and 'passed'.
+    '''
+    suite = []
+    for name, fen, expected in POSITIONS:
+        if names and name not in names:
+            continue
+        gc = rules.GameCondition.fromFen(fen, moveGenerator)
+        depths = runPerft(gc, depth or max(expected))
+        passed = True
+        for result in depths:
+            result['expected'] = expected.get(result['depth'])
+            if result['expected'] is not None and result['expected'] != result['nodes']:
+                passed = False
+        suite.append({'name': name, 'depths': depths, 'passed': passed})
+    return suite
+
+
+def getCommit():
+    '''
+    Returns the current git commit of the repository, if there is one.
+
+    Returns:
+    str: The abbreviated commit hash, or None if it cannot be found.
+    '''
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def writeBenchmark(suite, moveGenerator, output):
+    '''
+    Appends a benchmark record to a JSON lines file.
+
+    Parameters:
+    suite (list): The results of 'runSuite'.
+    moveGenerator (str): The strategy used by 'getValidMoves'.
+    output (str): The path of the JSON lines file.
+
+    Returns:
+    dict: The record that was written.
+    '''
+    nodes = sum(result['nodes'] for position in suite for result in position['depths'])
+    seconds = sum(result['seconds'] for position in suite for result in position['depths'])
+    record = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': getCommit(),
+        'python': platform.python_version(),
+        'moveGenerator': moveGenerator,
+        'nodes': nodes,
+        'seconds': seconds,
+        'nps': nodes / seconds if seconds else 0.0,
+        'passed': all(position['passed'] for position in suite),
+        'positions': suite,
+    }
+    with open(output, 'a') as file:
+        file.write(json.dumps(record) + '\n')
+    return record
+
+
+def main():
+    '''
+    Main function of the perft driver.
+    '''
+    parser = argparse.ArgumentParser(description='Perft driver and benchmark suite.')
+    parser.add_argument('--depth', type=int, help='deepest depth, by default the deepest known depth of each position')
+    parser.add_argument('--position', action='append', help='name of a position to run, may be repeated')
+    parser.add_argument('--generator', default='legal', choices=('legal', 'filter'), help='strategy of getValidMoves')
+    parser.add_argument('--divide', action='store_true', help='print the leaf count below every move at the deepest depth')
+    parser.add_argument('--bench', action='store_true', help='append a benchmark record to the output file')
+    parser.add_argument('--output', default='bench.jsonl', help='JSON lines file for --bench')
+    parser.add_argument('--profile', help='write the profiling counters of the rules to this file, as JSON if it ends with .json and for pstats otherwise')
+    args = parser.parse_args()
+
+    if args.profile:
+        # The counters make the rules slower, so the times of a profiled run are not comparable.
+        profiling.enable()
+
+    try:
+        if args.divide:
+            for name, fen, expected in POSITIONS:
+                if args.position and name not in args.position:
+                    continue
+                gc = rules.GameCondition.fromFen(fen, args.generator)
+                counts = divide(gc, args.depth or max(expected))
+                print(name)
+                for notation in sorted(counts):
+                    print('  ' + notation + ': ' + str(counts[notation]))
+                print('  total: ' + str(sum(counts.values())))
+            return 0
+
+        suite = runSuite(args.depth, args.generator, args.position)
+        for position in suite:
+            print(position['name'] + (' ok' if position['passed'] else ' FAILED'))
+            for result in position['depths']:
+                line = '  depth %d: %d nodes, %.3f s, %.0f nps' % (result['depth'], result['nodes'], result['seconds'], result['nps'])
+                if result['expected'] is not None and result['expected'] != result['nodes']:
+                    line += ' (expected %d)' % result['expected']
+                print(line)
+    finally:
+        # Also reached by --divide, so that its counters are written too.
+        if args.profile:
+            profiling.disable()
+            profiling.printSnapshot()
+            profiling.dump(args.profile)
+
+    if args.bench:
+        record = writeBenchmark(suite, args.generator, args.output)
+        print('%d nodes, %.3f s, %.0f nps written to %s' % (record['nodes'], record['seconds'], record['nps'], args.output))
+    return 0 if all(position['passed'] for position in suite) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,227 @@
+'''
+This is a file that contains the streaming reader and replayer of PGN (Portable Game Notation) archives.
+
+'readGames' parses one game at a time from a file, an open file object or a memory-mapped buffer, so an
+archive of any size is read in constant memory. 'replayGame' plays the moves of a game through a
+GameCondition, resolving every SAN move against the valid moves of its position.
+
+Usage:
+python pgn.py games.pgn                 replay every game and report the throughput
+python pgn.py games.pgn --limit 1000 --fen    print the FEN of every position
+python pgn.py games.pgn --verify-san    check that every move is written back with the same SAN
+python pgn.py games.pgn --profile replay.json    print the profiling counters of the rules and write them as JSON
+'''
+import argparse
+import mmap
+import re
+import sys
+import time
+
+import profiling
+import rules
+from notation import findMove, getSan
+
+HEADER_PATTERN = re.compile(r'^\[(\w+)\s+"(.*)"\]\s*$')
+# Comments, NAGs, variation brackets, results and everything else up to the next separator.
+TOKEN_PATTERN = re.compile(r'\{[^}]*\}?|;[^\n]*|\$\d+|[()]|1-0|0-1|1/2-1/2|\*|[^\s(){};$]+')
+MOVE_NUMBER_PATTERN = re.compile(r'^\d+\.*')
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+
+
+def _readLines(source):
+    '''
+    Reads the lines of a PGN source one at a time.
+
+    Parameters:
+    source (str, bytes, mmap or file): The path of a PGN file, which is memory-mapped, a buffer holding PGN text,
+    or an open file object in text or binary mode.
+
+    Yields:
+    str: The lines of the source, without the line ending.
+    '''
+    if isinstance(source, str):
+        with open(source, 'rb') as file:
+            # An empty file cannot be memory-mapped.
+            if file.seek(0, 2) == 0:
+                return
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                yield from _readLines(buffer)
+        return
+
+    if isinstance(source, mmap.mmap):
+        lines = iter(source.readline, b'')
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        lines = iter(bytes(source).splitlines())
+    else:
+        lines = source
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', 'replace')
+        yield line.rstrip('\r\n')
+
+
+def _parseMovetext(movetext):
+    '''
+    Extracts the main line of the movetext of a game.
+
+    Parameters:
+    movetext (str): The movetext, with the comments, NAGs and variations it may contain.
+
+    Returns:
+    tuple: The list of SAN moves of the main line and the result token, or '*' if there is none.
+    '''
+    moves = []
+    result = '*'
+    depth = 0
+    for token in TOKEN_PATTERN.findall(movetext):
+        first = token[0]
+        if first == '{' or first == ';' or first == '$':
+            continue
+        if first == '(':
+            depth += 1
+        elif first == ')':
+            depth -= 1
+        elif depth == 0:
+            if token in RESULTS:
+                result = token
+                continue
+            # A move number may be written without a space before the move, as in '12.e4'.
+            if first.isdigit():
+                token = MOVE_NUMBER_PATTERN.sub('', token)
+                if not token:
+                    continue
+            moves.append(token)
+    return moves, result
+
+
+def readGames(source):
+    '''
+    Reads the games of a PGN source one at a time.
+
+    Parameters:
+    source (str, bytes, mmap or file): The PGN source (see '_readLines').
+
+    Yields:
+    tuple: The headers of every game as a dictionary, the SAN moves of its main line and its result.
+    '''
+    headers = {}
+    movetext = []
+    for line in _readLines(source):
+        if line.startswith('['):
+            match = HEADER_PATTERN.match(line)
+            if match:
+                # A header after the movetext starts the next game.
+                if movetext:
+                    moves, result = _parseMovetext('\n'.join(movetext))
+                    yield headers, moves, result
+                    headers = {}
+                    movetext = []
+                headers[match.group(1)] = match.group(2).replace('\\"', '"').replace('\\\\', '\\')
+                continue
+        if line.startswith('%'):
+            continue
+        if line.strip():
+            movetext.append(line)
+    if headers or movetext:
+        moves, result = _parseMovetext('\n'.join(movetext))
+        yield headers, moves, result
+
+
+def replayGame(headers, moves, moveGenerator='legal'):
+    '''
+    Plays the moves of a game through a game condition.
+
+    Parameters:
+    headers (dict): The headers of the game. The 'FEN' header, if there is one, sets up the start position.
+    moves (list): The SAN moves of the game.
+    moveGenerator (str): The strategy used by 'getValidMoves'. Only the moves to the end square of every SAN
+    move are generated (see 'notation.getMovesTo').
+
+    Yields:
+    tuple: The game condition and the move of every ply. The game condition is in the position before the move,
+    the move is made once the generator is resumed.
+
+    Raises:
+    ValueError: If the FEN header or one of the moves is not valid.
+    '''
+    if 'FEN' in headers:
+        gc = rules.GameCondition.fromFen(headers['FEN'], moveGenerator)
+    else:
+        gc = rules.GameCondition(moveGenerator)
+    for ply, san in enumerate(moves):
+        try:
+            move = findMove(gc, san)
+        except ValueError as error:
+            raise ValueError('%s at ply %d' % (error, ply + 1))
+        yield gc, move
+        gc.makeMove(move)
+
+
+def replayArchive(source, moveGenerator='legal', limit=None, fen=False, verifySan=False, output=sys.stdout):
+    '''
+    Replays every game of a PGN source and prints the invalid games as they are found.
+
+    Parameters:
+    source (str, bytes, mmap or file): The PGN source (see '_readLines').
+    moveGenerator (str): The strategy used by 'getValidMoves'.
+    limit (int): The number of games to replay, or None for every game.
+    fen (bool): If True, the FEN of every position before a move is printed.
+    verifySan (bool): If True, every move is written back in SAN and compared with the move of the game.
+    output (file): The file the FEN strings and invalid games are printed to.
+
+    Returns:
+    dict: The totals with the keys 'games', 'plies', 'invalid', 'sanMismatches', 'seconds', 'gamesPerSecond'
+    and 'pliesPerSecond'.
+    '''
+    totals = {'games': 0, 'plies': 0, 'invalid': 0, 'sanMismatches': 0}
+    start = time.perf_counter()
+    for headers, moves, result in readGames(source):
+        if limit is not None and totals['games'] >= limit:
+            break
+        totals['games'] += 1
+        try:
+            for ply, (gc, move) in enumerate(replayGame(headers, moves, moveGenerator)):
+                if fen:
+                    print(gc.getFen(), file=output)
+                if verifySan and getSan(gc, move).rstrip('+#') != moves[ply].rstrip('+#!?'):
+                    totals['sanMismatches'] += 1
+                totals['plies'] += 1
+        except ValueError as error:
+            totals['invalid'] += 1
+            print('game %d (%s - %s): %s' % (totals['games'], headers.get('White', '?'), headers.get('Black', '?'), error), file=output)
+    totals['seconds'] = time.perf_counter() - start
+    totals['gamesPerSecond'] = totals['games'] / totals['seconds'] if totals['seconds'] else 0.0
+    totals['pliesPerSecond'] = totals['plies'] / totals['seconds'] if totals['seconds'] else 0.0
+    return totals
+
+
+def main():
+    '''
+    Main function of the PGN replayer.
+    '''
+    parser = argparse.ArgumentParser(description='Streaming PGN reader and game replayer.')
+    parser.add_argument('archive', help="PGN file, or '-' to read standard input")
+    parser.add_argument('--generator', default='legal', choices=('legal', 'filter'), help='strategy of getValidMoves')
+    parser.add_argument('--limit', type=int, help='number of games to replay')
+    parser.add_argument('--fen', action='store_true', help='print the FEN of every position')
+    parser.add_argument('--verify-san', action='store_true', help='check that every move is written back with the same SAN')
+    parser.add_argument('--profile', help='write the profiling counters of the rules to this file, as JSON if it ends with .json and for pstats otherwise')
+    args = parser.parse_args()
+
+    source = sys.stdin.buffer if args.archive == '-' else args.archive
+    if args.profile:
+        profiling.enable()
+    totals = replayArchive(source, args.generator, args.limit, args.fen, args.verify_san)
+    if args.profile:
+        profiling.disable()
+        profiling.printSnapshot(sys.stderr)
+        profiling.dump(args.profile)
+    print('%d games, %d plies, %d invalid' % (totals['games'], totals['plies'], totals['invalid']), file=sys.stderr)
+    if args.verify_san:
+        print('%d SAN mismatches' % totals['sanMismatches'], file=sys.stderr)
+    print('%.3f s, %.1f games/s, %.0f plies/s' % (totals['seconds'], totals['gamesPerSecond'], totals['pliesPerSecond']), file=sys.stderr)
+    return 0 if not totals['invalid'] and not totals['sanMismatches'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
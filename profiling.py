@@ -0,0 +1,271 @@
+'''
+This is a file that contains the profiling counters of the rules: the number of calls and the time spent in the
+move generators, the attack and pin tests, making and undoing moves, and the construction of moves.
+
+Profiling is off by default and then costs nothing: 'enable' replaces the profiled methods of GameCondition and
+Move with wrappers that count, and 'disable' puts the original methods back. Only some of the functions may be
+profiled, to keep the cost low where it matters. The counters can be read as a dictionary, written as JSON,
+or written in the format of cProfile, to be read with pstats or any tool that reads cProfile output.
+
+Usage:
+profiling.enable()                          or profiling.enable(['makeMove', 'undoMove'])
+...
+profiling.printSnapshot()
+profiling.dumpJson('profile.json')
+profiling.dumpStats('profile.prof')         then python -m pstats profile.prof
+profiling.disable()
+'''
+import json
+import marshal
+import sys
+import time
+
+from rules import GameCondition, Move
+
+# The profiled functions: the name of the counter, the class and the name of the method.
+PROFILED_FUNCTIONS = (
+    ('getValidMoves', GameCondition, 'getValidMoves'),
+    ('getLegalMoves', GameCondition, 'getLegalMoves'),
+    ('getFilteredMoves', GameCondition, 'getFilteredMoves'),
+    ('getAllPossibleMoves', GameCondition, 'getAllPossibleMoves'),
+    ('getPawnMoves', GameCondition, 'getPawnMoves'),
+    ('getKnightMoves', GameCondition, 'getKnightMoves'),
+    ('getBishopMoves', GameCondition, 'getBishopMoves'),
+    ('getRookMoves', GameCondition, 'getRookMoves'),
+    ('getQueenMoves', GameCondition, 'getQueenMoves'),
+    ('getKingMoves', GameCondition, 'getKingMoves'),
+    ('getCastleMoves', GameCondition, 'getCastleMoves'),
+    ('getEnPassantMoves', GameCondition, 'getEnPassantMoves'),
+    ('squareUnderAttack', GameCondition, 'squareUnderAttack'),
+    # The attack and pin tests of the 'legal' generator, 'squareUnderAttack' is only used by castling and 'filter'.
+    ('getAttackers', GameCondition, 'getAttackers'),
+    ('getPins', GameCondition, 'getPins'),
+    ('hasLegalMove', GameCondition, 'hasLegalMove'),
+    ('getValidMove', GameCondition, 'getValidMove'),
+    ('makeMove', GameCondition, 'makeMove'),
+    ('undoMove', GameCondition, 'undoMove'),
+    # Moves are constructed by Move.__init__, and by 'addMoves' without it, which counts one call per move.
+    ('Move', Move, '__init__'),
+    ('Move', GameCondition, 'addMoves'),
+)
+PROFILED_NAMES = tuple(dict.fromkeys(name for name, owner, attribute in PROFILED_FUNCTIONS))
+
+# The counters by name: [calls, total nanoseconds, own nanoseconds, {caller name: calls}].
+_counters = {}
+# The original methods replaced by wrappers, keyed by (class, method name).
+_originals = {}
+# The profiled calls in progress, innermost last: [name, nanoseconds spent in profiled calls made by it].
+_stack = []
+
+
+def _wrap(name, function, countMoves=False):
+    '''
+    Makes the wrapper of a profiled method.
+
+    Parameters:
+    name (str): The name of the counter.
+    function (function): The original method.
+    countMoves (bool): If True, a call counts one call per bit of its 'targets' argument (see 'GameCondition.addMoves').
+
+    Returns:
+    function: The wrapper.
+    '''
+    counter = _counters.setdefault(name, [0, 0, 0, {}])
+    clock = time.perf_counter_ns
+    stack = _stack
+
+    def wrapper(*args, **kwargs):
+        caller = stack[-1][0] if stack else None
+        frame = [name, 0]
+        stack.append(frame)
+        start = clock()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = clock() - start
+            stack.pop()
+            if stack:
+                stack[-1][1] += elapsed
+            calls = args[3].bit_count() if countMoves else 1
+            counter[0] += calls
+            counter[1] += elapsed
+            counter[2] += elapsed - frame[1]
+            callers = counter[3]
+            callers[caller] = callers.get(caller, 0) + calls
+
+    wrapper.__name__ = function.__name__
+    wrapper.__doc__ = function.__doc__
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+def enable(names=None, games=()):
+    '''
+    Starts counting calls of the profiled functions.
+
+    Parameters:
+    names (list): The names of the counters to enable (see PROFILED_NAMES), or None for all of them.
+    games (list): Game conditions created before this call, whose move function tables are built again
+    (see 'GameCondition.bindMoveFunctions'). Game conditions created later use the wrappers anyway.
+
+    Returns:
+    None
+
+    Raises:
+    ValueError: If a name is not a profiled function.
+    '''
+    names = PROFILED_NAMES if names is None else names
+    for name in names:
+        if name not in PROFILED_NAMES:
+            raise ValueError('Not a profiled function: ' + name)
+    for name, owner, attribute in PROFILED_FUNCTIONS:
+        if name in names and (owner, attribute) not in _originals:
+            _originals[(owner, attribute)] = owner.__dict__[attribute]
+            setattr(owner, attribute, _wrap(name, owner.__dict__[attribute], attribute == 'addMoves'))
+    for gc in games:
+        gc.bindMoveFunctions()
+
+
+def disable(games=()):
+    '''
+    Stops counting and puts the original methods back. The counters are kept.
+
+    Parameters:
+    games (list): Game conditions whose move function tables are built again, so that they stop calling the wrappers.
+
+    Returns:
+    None
+    '''
+    for (owner, attribute), function in _originals.items():
+        setattr(owner, attribute, function)
+    _originals.clear()
+    for gc in games:
+        gc.bindMoveFunctions()
+
+
+def isEnabled():
+    '''
+    Checks if any function is profiled.
+
+    Returns:
+    bool: True if profiling is enabled.
+    '''
+    return bool(_originals)
+
+
+def reset():
+    '''
+    Sets all counters to zero.
+
+    Returns:
+    None
+    '''
+    for counter in _counters.values():
+        counter[0] = counter[1] = counter[2] = 0
+        counter[3].clear()
+
+
+def getSnapshot():
+    '''
+    Returns the counters of the functions that were called.
+
+    Returns:
+    dict: For every name, a dictionary with the keys 'calls', 'seconds' (including the profiled functions it
+    called), 'ownSeconds' (excluding them) and 'callers' (the calls by the name of the calling profiled function,
+    None for the other callers).
+    '''
+    return {name: {'calls': calls, 'seconds': total / 1e9, 'ownSeconds': own / 1e9, 'callers': dict(callers)}
+            for name, (calls, total, own, callers) in _counters.items() if calls}
+
+
+def printSnapshot(output=sys.stdout):
+    '''
+    Prints the counters as a table, the most expensive function first.
+
+    Parameters:
+    output (file): The file the table is printed to.
+
+    Returns:
+    None
+    '''
+    snapshot = getSnapshot()
+    print('%-20s %12s %10s %10s %10s' % ('function', 'calls', 'seconds', 'own', 'own us'), file=output)
+    for name, counter in sorted(snapshot.items(), key=lambda item: -item[1]['ownSeconds']):
+        print('%-20s %12d %10.3f %10.3f %10.3f' % (name, counter['calls'], counter['seconds'], counter['ownSeconds'],
+                                                   1e6 * counter['ownSeconds'] / counter['calls']), file=output)
+
+
+def dumpJson(path):
+    '''
+    Writes the counters as JSON.
+
+    Parameters:
+    path (str): The path of the file to write.
+
+    Returns:
+    None
+    '''
+    snapshot = getSnapshot()
+    for counter in snapshot.values():
+        # JSON keys are strings.
+        counter['callers'] = {str(caller) if caller is not None else '<other>': calls for caller, calls in counter['callers'].items()}
+    with open(path, 'w') as file:
+        json.dump(snapshot, file, indent=2)
+
+
+def _getFunctionKey(name):
+    '''
+    Returns the key of a counter in cProfile output: the file, line and name of the first method it counts.
+
+    Parameters:
+    name (str): The name of the counter.
+
+    Returns:
+    tuple: The (filename, line number, function name) key.
+    '''
+    for counterName, owner, attribute in PROFILED_FUNCTIONS:
+        if counterName == name:
+            function = getattr(owner.__dict__[attribute], '__wrapped__', owner.__dict__[attribute])
+            code = function.__code__
+            return (code.co_filename, code.co_firstlineno, name)
+
+
+def dumpStats(path):
+    '''
+    Writes the counters in the format of cProfile ('cProfile.Profile.dump_stats').
+
+    Parameters:
+    path (str): The path of the file to write.
+
+    Returns:
+    None
+
+    Note:
+    - The callers that are not profiled functions are left out of the callers of a function.
+    '''
+    stats = {}
+    for name, counter in getSnapshot().items():
+        callers = {}
+        for caller, calls in counter['callers'].items():
+            if caller is not None:
+                # The time of the calls from one caller is not kept, only their number.
+                callers[_getFunctionKey(caller)] = (calls, calls, 0.0, 0.0)
+        stats[_getFunctionKey(name)] = (counter['calls'], counter['calls'], counter['ownSeconds'], counter['seconds'], callers)
+    with open(path, 'wb') as file:
+        marshal.dump(stats, file)
+
+
+def dump(path):
+    '''
+    Writes the counters as JSON if the path ends with '.json', and in the format of cProfile otherwise.
+
+    Parameters:
+    path (str): The path of the file to write.
+
+    Returns:
+    None
+    '''
+    if path.endswith('.json'):
+        dumpJson(path)
+    else:
+        dumpStats(path)
@@ -1,15 +1,136 @@
 '''
 This is a file that contains the rules for playing chess.
 '''
+from bitboard import ALL_SQUARES, BETWEEN, KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, rookAttacks, bishopAttacks
+from zobrist import PIECE_KEYS, SIDE_KEY, CASTLE_KEYS, EN_PASSANT_KEYS, computeKey
+
+PIECE_TYPES = ('p', 'n', 'b', 'r', 'q', 'k')
+# The promotion piece is stored in bits 12-14 of 'Move.moveID' as its index in this tuple, 0 for no promotion.
+PROMOTION_PIECES = ('', 'n', 'b', 'r', 'q')
+PROMOTION_CODES = {piece: code for code, piece in enumerate(PROMOTION_PIECES)}
+# The rows a pawn promotes on: row 0 for white and row 7 for black.
+PROMOTION_ROWS = 0xFF | 0xFF << 56
+
+# Castling rights are kept as a bitmask of these flags.
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+ALL_CASTLE_RIGHTS = WHITE_KINGSIDE | WHITE_QUEENSIDE | BLACK_KINGSIDE | BLACK_QUEENSIDE
+# The castling rights lost when a piece moves from or to a square: the king and rook home squares.
+CASTLE_RIGHTS_LOST = [0] * 64
+CASTLE_RIGHTS_LOST[0] = BLACK_QUEENSIDE
+CASTLE_RIGHTS_LOST[4] = BLACK_KINGSIDE | BLACK_QUEENSIDE
+CASTLE_RIGHTS_LOST[7] = BLACK_KINGSIDE
+CASTLE_RIGHTS_LOST[56] = WHITE_QUEENSIDE
+CASTLE_RIGHTS_LOST[60] = WHITE_KINGSIDE | WHITE_QUEENSIDE
+CASTLE_RIGHTS_LOST[63] = WHITE_KINGSIDE
+# The end square of the king and the squares that must be empty and must not be attacked for every castling move.
+CASTLE_MOVES = {
+    'w': ((WHITE_KINGSIDE, 62, 1 << 61 | 1 << 62, (61, 62)), (WHITE_QUEENSIDE, 58, 1 << 57 | 1 << 58 | 1 << 59, (59, 58))),
+    'b': ((BLACK_KINGSIDE, 6, 1 << 5 | 1 << 6, (5, 6)), (BLACK_QUEENSIDE, 2, 1 << 1 | 1 << 2 | 1 << 3, (3, 2))),
+}
+# The start and end square of the rook of every castling move, keyed by the end square of the king.
+CASTLE_ROOK_MOVES = {62: (63, 61), 58: (56, 59), 6: (7, 5), 2: (0, 3)}
+# Bit 15 of 'Move.moveID' marks castling and en passant, the moves that also move or capture a piece on a third square.
+SPECIAL_MOVE = 1 << 15
+# The letters used for the pieces in position snapshots, white in upper case.
+SNAPSHOT_LETTERS = {'--': '.', 'wp': 'P', 'wn': 'N', 'wb': 'B', 'wr': 'R', 'wq': 'Q', 'wk': 'K', 'bp': 'p', 'bn': 'n', 'bb': 'b', 'br': 'r', 'bq': 'q', 'bk': 'k'}
+SNAPSHOT_PIECES = {letter: piece for piece, letter in SNAPSHOT_LETTERS.items()}
+# The castling rights of FEN strings, with the king and rook that must stand on their home squares.
+FEN_CASTLE_RIGHTS = (('K', WHITE_KINGSIDE, 60, 63), ('Q', WHITE_QUEENSIDE, 60, 56), ('k', BLACK_KINGSIDE, 4, 7), ('q', BLACK_QUEENSIDE, 4, 0))
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+
+def parseFen(fen):
+    '''
+    Parses a position in Forsyth-Edwards Notation.
+
+    Parameters:
+    fen (str): The FEN string. The halfmove clock and fullmove number may be left out, as in EPD records.
+
+    Returns:
+    tuple: The board (see 'GameCondition.board'), whiteToMove, castleRights, enPassantPossible, halfmoveClock and fullmoveNumber.
+
+    Raises:
+    ValueError: If the string is not a valid FEN string.
+
+    Note:
+    - A castling right is dropped if the king or rook is not on its home square.
+    - The en passant square is dropped unless a pawn of the player to move can capture on it,
+      the same way 'GameCondition.makeMove' sets it.
+    '''
+    fields = fen.split()
+    if len(fields) not in (4, 5, 6):
+        raise ValueError('Invalid FEN: ' + fen)
+    ranks = fields[0].split('/')
+    if len(ranks) != 8:
+        raise ValueError('Invalid FEN piece placement: ' + fields[0])
+    board = []
+    for rank in ranks:
+        row = []
+        for letter in rank:
+            if letter in '12345678':
+                row.extend(['--'] * int(letter))
+            elif letter in SNAPSHOT_PIECES and letter != '.':
+                row.append(SNAPSHOT_PIECES[letter])
+            else:
+                raise ValueError('Invalid FEN piece placement: ' + fields[0])
+        if len(row) != 8:
+            raise ValueError('Invalid FEN piece placement: ' + fields[0])
+        board.append(row)
+    pieces = [piece for row in board for piece in row]
+    if pieces.count('wk') != 1 or pieces.count('bk') != 1:
+        raise ValueError('Invalid FEN, there must be one king of each color: ' + fields[0])
+
+    if fields[1] not in ('w', 'b'):
+        raise ValueError('Invalid FEN side to move: ' + fields[1])
+    whiteToMove = fields[1] == 'w'
+
+    castleRights = 0
+    if fields[2] != '-':
+        for letter in fields[2]:
+            if letter not in 'KQkq':
+                raise ValueError('Invalid FEN castling rights: ' + fields[2])
+        for letter, right, kingSquare, rookSquare in FEN_CASTLE_RIGHTS:
+            color = 'w' if letter.isupper() else 'b'
+            if (letter in fields[2] and board[kingSquare >> 3][kingSquare & 7] == color + 'k'
+                    and board[rookSquare >> 3][rookSquare & 7] == color + 'r'):
+                castleRights |= right
+
+    enPassantPossible = ()
+    if fields[3] != '-':
+        if len(fields[3]) != 2 or fields[3][0] not in Move.boardToCol or fields[3][1] not in ('6' if whiteToMove else '3'):
+            raise ValueError('Invalid FEN en passant square: ' + fields[3])
+        row, col = Move.boardToRow[fields[3][1]], Move.boardToCol[fields[3][0]]
+        # The pawn that moved two squares stands one row past the en passant square, seen from the player to move.
+        pawnRow = row + 1 if whiteToMove else row - 1
+        ally, enemy = ('wp', 'bp') if whiteToMove else ('bp', 'wp')
+        if board[pawnRow][col] == enemy and ((col > 0 and board[pawnRow][col - 1] == ally) or (col < 7 and board[pawnRow][col + 1] == ally)):
+            enPassantPossible = (row, col)
+
+    try:
+        halfmoveClock = int(fields[4]) if len(fields) > 4 else 0
+        fullmoveNumber = int(fields[5]) if len(fields) > 5 else 1
+    except ValueError:
+        raise ValueError('Invalid FEN move clocks: ' + fen)
+    if halfmoveClock < 0 or fullmoveNumber < 1:
+        raise ValueError('Invalid FEN move clocks: ' + fen)
+    return board, whiteToMove, castleRights, enPassantPossible, halfmoveClock, fullmoveNumber
+
 
 class GameCondition:
     '''
     This class represents the game condition of a chess game. It contains the chess board, move functions, and other game-related information.
     '''
-    def __init__(self):
+    def __init__(self, moveGenerator='legal'):
         '''
         Initialize the GameCondition object with the initial chess board setup.
 
+        Parameters:
+        moveGenerator (str): The strategy used by 'getValidMoves': 'legal' generates legal moves only,
+        'filter' makes every possible move and filters out the ones that leave the king in check.
+
         Returns:
         None
         '''
@@ -23,14 +144,193 @@ class GameCondition:
             ['wp', 'wp', 'wp', 'wp', 'wp', 'wp', 'wp', 'wp'],
             ['wr', 'wn', 'wb', 'wq', 'wk', 'wb', 'wn', 'wr']]
         
-        self.moveFunctions = {'p': self.getPawnMoves, 'r': self.getRookMoves, 'n': self.getKnightMoves, 'b': self.getBishopMoves, 'q': self.getQueenMoves, 'k': self.getKingMoves}
+        self.bindMoveFunctions()
+        self.moveGenerator = moveGenerator
         self.whiteToMove = True
         self.moveHistory = []
         self.whiteKingPosition = (7, 4)
         self.blackKingPosition = (0, 4)
         self.checkMate = False
         self.staleMate = False
-       
+        self.castleRights = ALL_CASTLE_RIGHTS
+        self.enPassantPossible = ()
+        self.halfmoveClock = 0
+        self.fullmoveNumber = 1
+        self.stateHistory = []
+        self.bitboards = {}
+        self.occupancy = {}
+        self.initBitboards()
+        self.zobristKey = computeKey(self.board, self.whiteToMove, self.castleRights, self.enPassantPossible)
+        self.keyHistory = []
+        self.repetitionCounts = {self.zobristKey: 1}
+
+    def bindMoveFunctions(self):
+        '''
+        Method to build the tables of move functions: 'moveFunctions' by piece type and 'validMoveFunctions' by strategy.
+
+        Returns:
+        None
+
+        Note:
+        - The tables hold bound methods, so they keep calling the methods the class had when they were built.
+          They are built again after the methods are replaced, for example by profiling.py.
+        '''
+        self.moveFunctions = {'p': self.getPawnMoves, 'r': self.getRookMoves, 'n': self.getKnightMoves, 'b': self.getBishopMoves, 'q': self.getQueenMoves, 'k': self.getKingMoves}
+        self.validMoveFunctions = {'legal': self.getLegalMoves, 'filter': self.getFilteredMoves}
+
+    def initBitboards(self):
+        '''
+        Method to build the bitboards from the current 'board'.
+
+        Returns:
+        None. 'bitboards' holds one bitboard per piece ('wp', 'bk', ...) and 'occupancy' holds one bitboard per color ('w', 'b').
+
+        Note:
+        - It must be called again whenever 'board' is changed without 'makeMove' or 'undoMove'.
+        '''
+        self.bitboards = {color + piece: 0 for color in 'wb' for piece in PIECE_TYPES}
+        self.occupancy = {'w': 0, 'b': 0}
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece != '--':
+                    bit = 1 << (row * 8 + col)
+                    self.bitboards[piece] |= bit
+                    self.occupancy[piece[0]] |= bit
+                    if piece == 'wk':
+                        self.whiteKingPosition = (row, col)
+                    elif piece == 'bk':
+                        self.blackKingPosition = (row, col)
+
+    def loadPosition(self, board, whiteToMove, castleRights, enPassantPossible, halfmoveClock=0, fullmoveNumber=1):
+        '''
+        Method to set up an arbitrary position.
+
+        Parameters:
+        board (list): A list of 8 lists of 8 pieces ('wp', 'bk', ..., '--' for an empty square). It is copied.
+        whiteToMove (bool): True if white is to move.
+        castleRights (int): The castling rights, a combination of WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE and BLACK_QUEENSIDE.
+        enPassantPossible (tuple): The (row, col) square a pawn may capture en passant on, or () if there is none.
+        halfmoveClock (int): The number of moves since the last capture or pawn move.
+        fullmoveNumber (int): The number of the current move, starting at 1 and incremented after every move of black.
+
+        Returns:
+        None. The move history, key history and the checkmate and stalemate flags are cleared.
+        '''
+        self.board = [list(row) for row in board]
+        self.whiteToMove = whiteToMove
+        self.castleRights = castleRights
+        self.enPassantPossible = tuple(enPassantPossible)
+        self.halfmoveClock = halfmoveClock
+        self.fullmoveNumber = fullmoveNumber
+        self.moveHistory = []
+        self.stateHistory = []
+        self.checkMate = False
+        self.staleMate = False
+        self.initBitboards()
+        self.zobristKey = computeKey(self.board, self.whiteToMove, self.castleRights, self.enPassantPossible)
+        self.keyHistory = []
+        self.repetitionCounts = {self.zobristKey: 1}
+
+    def loadFen(self, fen):
+        '''
+        Method to set up the position of a FEN string.
+
+        Parameters:
+        fen (str): The FEN string (see 'parseFen').
+
+        Returns:
+        None. The position is set up with 'loadPosition'.
+
+        Raises:
+        ValueError: If the string is not a valid FEN string.
+        '''
+        self.loadPosition(*parseFen(fen))
+
+    def getFen(self):
+        '''
+        Method to get the current position in Forsyth-Edwards Notation.
+
+        Returns:
+        str: The FEN string of the current position.
+
+        Note:
+        - The en passant square is only written when a pawn can capture on it (see 'makeMove').
+        '''
+        ranks = []
+        for row in self.board:
+            rank = ''
+            empty = 0
+            for piece in row:
+                if piece == '--':
+                    empty += 1
+                else:
+                    if empty:
+                        rank += str(empty)
+                        empty = 0
+                    rank += SNAPSHOT_LETTERS[piece]
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+        castling = ''.join(letter for letter, right, kingSquare, rookSquare in FEN_CASTLE_RIGHTS if self.castleRights & right) or '-'
+        if self.enPassantPossible:
+            enPassant = Move.colToBoard[self.enPassantPossible[1]] + Move.rowToBoard[self.enPassantPossible[0]]
+        else:
+            enPassant = '-'
+        return '%s %s %s %s %d %d' % ('/'.join(ranks), 'w' if self.whiteToMove else 'b', castling, enPassant,
+                                      self.halfmoveClock, self.fullmoveNumber)
+
+    @classmethod
+    def fromFen(cls, fen, moveGenerator='legal'):
+        '''
+        Creates a GameCondition object from a FEN string.
+
+        Parameters:
+        fen (str): The FEN string (see 'parseFen').
+        moveGenerator (str): The strategy used by 'getValidMoves'.
+
+        Returns:
+        GameCondition: The game condition of the FEN position.
+
+        Raises:
+        ValueError: If the string is not a valid FEN string.
+        '''
+        gc = cls(moveGenerator)
+        gc.loadFen(fen)
+        return gc
+
+    def getSnapshot(self):
+        '''
+        Method to get a compact, picklable copy of the current position, for example to send it to another process.
+
+        Returns:
+        tuple: The board as a string of 64 letters ('.' for an empty square, white pieces in upper case),
+        'whiteToMove', 'castleRights' and 'enPassantPossible'.
+
+        Note:
+        - The move history is not part of the snapshot.
+        '''
+        board = ''.join(SNAPSHOT_LETTERS[piece] for row in self.board for piece in row)
+        return (board, self.whiteToMove, self.castleRights, self.enPassantPossible)
+
+    @classmethod
+    def fromSnapshot(cls, snapshot, moveGenerator='legal'):
+        '''
+        Creates a GameCondition object from a snapshot made by 'getSnapshot'.
+
+        Parameters:
+        snapshot (tuple): The snapshot.
+        moveGenerator (str): The strategy used by 'getValidMoves'.
+
+        Returns:
+        GameCondition: The game condition of the snapshot position.
+        '''
+        gc = cls(moveGenerator)
+        letters = snapshot[0]
+        board = [[SNAPSHOT_PIECES[letter] for letter in letters[row * 8:row * 8 + 8]] for row in range(8)]
+        gc.loadPosition(board, snapshot[1], snapshot[2], snapshot[3])
+        return gc
+
     def makeMove(self, move):
         '''
         Method to make a move on the chess board.
@@ -41,29 +341,95 @@ class GameCondition:
         Returns:
         None. The chess board is updated with the new move.
 
-        Raises:
-        IndexError: If when moving a pawn a new piece is not selected or the new piece is indicated incorrectly.
-
         Postconditions:
         - The piece at the start position of the move is removed from the board.
         - The piece at the end position of the move is placed on the board.
         - The move is added to the move history.
         - The 'whiteToMove' flag is updated based on whose turn it is.
-        - If the move is a pawn promotion, the user is prompted to choose a new piece for the pawn.
+        - If the move is a pawn promotion, the pawn is replaced by the promotion piece of the move.
+        - If the move is castling, the rook is moved too. If the move is an en passant capture, the captured pawn is removed.
+        - The castling rights, the en passant square, the move clocks and the Zobrist key are updated, and the previous key is added to the key history.
         '''
-        self.board[move.startRow][move.startCol] = '--'
-        self.board[move.endRow][move.endCol] = move.startSquare
+        start = move.moveID & 63
+        end = (move.moveID >> 6) & 63
+        startRow, startCol = start >> 3, start & 7
+        endRow, endCol = end >> 3, end & 7
+        piece = move.startSquare
+        captured = move.endSquare
+
+        self.board[startRow][startCol] = '--'
+        self.board[endRow][endCol] = piece
         self.moveHistory.append(move)
+        self.keyHistory.append(self.zobristKey)
+        self.stateHistory.append((self.castleRights, self.enPassantPossible, self.halfmoveClock))
+
+        startBit = 1 << start
+        endBit = 1 << end
+        self.bitboards[piece] ^= startBit | endBit
+        self.occupancy[piece[0]] ^= startBit | endBit
+        pieceKeys = PIECE_KEYS[piece]
+        key = self.zobristKey ^ pieceKeys[start] ^ pieceKeys[end] ^ SIDE_KEY
+        if captured != '--':
+            self.bitboards[captured] ^= endBit
+            self.occupancy[captured[0]] ^= endBit
+            key ^= PIECE_KEYS[captured][end]
+
+        if move.moveID & SPECIAL_MOVE:
+            if piece[1] == 'k':
+                rookStart, rookEnd = CASTLE_ROOK_MOVES[end]
+                rook = piece[0] + 'r'
+                self.board[rookStart >> 3][rookStart & 7] = '--'
+                self.board[rookEnd >> 3][rookEnd & 7] = rook
+                self.bitboards[rook] ^= 1 << rookStart | 1 << rookEnd
+                self.occupancy[piece[0]] ^= 1 << rookStart | 1 << rookEnd
+                key ^= PIECE_KEYS[rook][rookStart] ^ PIECE_KEYS[rook][rookEnd]
+            else:
+                # The pawn captured en passant stands next to the start square, on the end column.
+                square = startRow * 8 + endCol
+                pawn = self.board[startRow][endCol]
+                self.board[startRow][endCol] = '--'
+                self.bitboards[pawn] ^= 1 << square
+                self.occupancy[pawn[0]] ^= 1 << square
+                key ^= PIECE_KEYS[pawn][square]
+
+        if piece[1] == 'p' or captured != '--':
+            self.halfmoveClock = 0
+        else:
+            self.halfmoveClock += 1
+        if piece[0] == 'b':
+            self.fullmoveNumber += 1
+
+        castleRights = self.castleRights & ~(CASTLE_RIGHTS_LOST[start] | CASTLE_RIGHTS_LOST[end])
+        if castleRights != self.castleRights:
+            key ^= CASTLE_KEYS[self.castleRights] ^ CASTLE_KEYS[castleRights]
+            self.castleRights = castleRights
+
+        if self.enPassantPossible:
+            key ^= EN_PASSANT_KEYS[self.enPassantPossible[1]]
+            self.enPassantPossible = ()
+        # The en passant square is only kept when an enemy pawn stands next to the pawn that moved two squares.
+        if piece[1] == 'p' and (start - end == 16 or end - start == 16):
+            enemyPawns = self.bitboards['bp' if piece[0] == 'w' else 'wp']
+            if ((endCol > 0 and enemyPawns & (endBit >> 1)) or (endCol < 7 and enemyPawns & (endBit << 1))):
+                self.enPassantPossible = ((startRow + endRow) // 2, endCol)
+                key ^= EN_PASSANT_KEYS[endCol]
+        self.zobristKey = key
         self.whiteToMove = not self.whiteToMove
 
-        if move.startSquare == 'wk':
-            self.whiteKingPosition = (move.endRow, move.endCol)
-        elif move.startSquare == 'bk':
-            self.blackKingPosition = (move.endRow, move.endCol)
+        if piece == 'wk':
+            self.whiteKingPosition = (endRow, endCol)
+        elif piece == 'bk':
+            self.blackKingPosition = (endRow, endCol)
 
-        if move.pawnPromotion:
-            choice = input('Pawn promotion: q, r, b or n: ')
-            self.board[move.endRow][move.endCol] = move.startSquare[0] + choice   
+        promotion = move.moveID >> 12 & 7
+        if promotion:
+            newPiece = piece[0] + PROMOTION_PIECES[promotion]
+            self.board[endRow][endCol] = newPiece
+            self.bitboards[piece] ^= endBit
+            self.bitboards[newPiece] ^= endBit
+            self.zobristKey ^= pieceKeys[end] ^ PIECE_KEYS[newPiece][end]
+
+        self.repetitionCounts[self.zobristKey] = self.repetitionCounts.get(self.zobristKey, 0) + 1
 
     def undoMove(self):
         """
@@ -82,64 +448,368 @@ class GameCondition:
         - The piece at the start position of the last move is restored on the board.
         - The piece at the end position of the last move is removed from the board.
         - The 'whiteToMove' flag is updated based on whose turn it was before the last move.
-        - If the last move was a pawn promotion, the user is prompted to choose a new piece for the pawn.
+        - If the last move was a pawn promotion, the pawn is restored in place of the promotion piece.
+        - If the last move was castling or an en passant capture, the rook or the captured pawn is restored.
+        - The castling rights, the en passant square, the move clocks and the Zobrist key of the previous position are restored.
         """
         if len(self.moveHistory)!= 0:
             move = self.moveHistory.pop()
-            self.board[move.startRow][move.startCol] = move.startSquare
-            self.board[move.endRow][move.endCol] = move.endSquare
+            count = self.repetitionCounts[self.zobristKey] - 1
+            if count:
+                self.repetitionCounts[self.zobristKey] = count
+            else:
+                del self.repetitionCounts[self.zobristKey]
+            self.zobristKey = self.keyHistory.pop()
+            self.castleRights, self.enPassantPossible, self.halfmoveClock = self.stateHistory.pop()
+            if move.startSquare[0] == 'b':
+                self.fullmoveNumber -= 1
+
+            start = move.moveID & 63
+            end = (move.moveID >> 6) & 63
+            startRow, startCol = start >> 3, start & 7
+            endRow, endCol = end >> 3, end & 7
+            startBit = 1 << start
+            endBit = 1 << end
+            self.bitboards[self.board[endRow][endCol]] ^= endBit
+            self.bitboards[move.startSquare] ^= startBit
+            self.occupancy[move.startSquare[0]] ^= startBit | endBit
+            if move.endSquare != '--':
+                self.bitboards[move.endSquare] ^= endBit
+                self.occupancy[move.endSquare[0]] ^= endBit
+
+            self.board[startRow][startCol] = move.startSquare
+            self.board[endRow][endCol] = move.endSquare
             self.whiteToMove = not self.whiteToMove
 
+            if move.moveID & SPECIAL_MOVE:
+                color = move.startSquare[0]
+                if move.startSquare[1] == 'k':
+                    rookStart, rookEnd = CASTLE_ROOK_MOVES[end]
+                    self.board[rookStart >> 3][rookStart & 7] = color + 'r'
+                    self.board[rookEnd >> 3][rookEnd & 7] = '--'
+                    self.bitboards[color + 'r'] ^= 1 << rookStart | 1 << rookEnd
+                    self.occupancy[color] ^= 1 << rookStart | 1 << rookEnd
+                else:
+                    pawn = 'bp' if color == 'w' else 'wp'
+                    square = startRow * 8 + endCol
+                    self.board[startRow][endCol] = pawn
+                    self.bitboards[pawn] ^= 1 << square
+                    self.occupancy[pawn[0]] ^= 1 << square
+
         if move.startSquare == 'wk':
-            self.whiteKingPosition = (move.startRow, move.startCol)
+            self.whiteKingPosition = (startRow, startCol)
         elif move.startSquare == 'bk':
-            self.blackKingPosition = (move.startRow, move.startCol)
+            self.blackKingPosition = (startRow, startCol)
+
+    def isRepetition(self, count=3):
+        """
+        Method to check if the current position has occurred the specified number of times.
+
+        Parameters:
+        count (int): The number of occurrences, 3 for a threefold repetition.
+
+        Returns:
+        bool: True if the position, with the same player to move, castling rights and en passant square, has occurred at least 'count' times.
+        """
+        return self.repetitionCounts.get(self.zobristKey, 0) >= count
 
     def getValidMoves(self):
         """
-        Method to get a list of all possible moves for the current player.
+        Method to get a list of all valid moves for the current player.
 
         Returns:
-        list: A list of all possible moves for the current player.
+        list: A list of all valid moves for the current player.
 
-        This method first gets all possible moves for the current player using the 'getAllPossibleMoves' method.
-        Then it iterates through the list of moves in reverse order. For each move, it makes the move on the chess board,
-        checks if the current player is in check, and if so, removes the move from the list. Finally, it undoes the move,
-        and continues with the next move in the list.
+        This method gets the valid moves with the strategy selected by 'moveGenerator' (see 'getLegalMoves' and 'getFilteredMoves').
 
         If no valid moves are found, it checks if the current player is in checkmate or stalemate. If the current player is in checkmate,
         the 'checkMate' attribute is set to True. If the current player is in stalemate, the 'staleMate' attribute is set to True.
+        Nothing is printed, announcing the end of the game is left to the caller.
 
         If a valid move is found, the 'checkMate' and 'staleMate' attributes are set to False.
 
         The method returns the list of valid moves.
         """
-        moves = self.getAllPossibleMoves()
-
-        for i in range(len(moves) - 1, -1, -1):
-            self.makeMove(moves[i])
-            self.whiteToMove = not self.whiteToMove
-            if self.threatOfCheck():
-                moves.remove(moves[i])
-            self.whiteToMove = not self.whiteToMove
-            self.undoMove()
+        moves = self.validMoveFunctions[self.moveGenerator]()
 
         if (len(moves) == 0):
             if self.threatOfCheck():
                 self.checkMate = True
-                if self.whiteToMove:
-                    print('Black win!!!')
-                else:
-                    print('White win!!!')
             else:
                 self.staleMate = True
-                print('Stalemate!!!')
         else:
             self.checkMate = False
             self.staleMate = False
 
         return moves
 
+    def getFilteredMoves(self, targets=ALL_SQUARES):
+        """
+        Method to get the valid moves by filtering all possible moves.
+
+        Parameters:
+        targets (int): The bitboard of end squares to generate moves to (see 'getLegalMoves').
+
+        Returns:
+        list: A list of all valid moves for the current player.
+
+        This method first gets all possible moves for the current player using the 'getAllPossibleMoves' method.
+        For each move, it makes the move on the chess board, keeps the move if the current player is not in check,
+        and undoes the move.
+        """
+        moves = []
+
+        for move in self.getAllPossibleMoves(targets):
+            self.makeMove(move)
+            self.whiteToMove = not self.whiteToMove
+            if not self.threatOfCheck():
+                moves.append(move)
+            self.whiteToMove = not self.whiteToMove
+            self.undoMove()
+
+        return moves
+
+    def getLegalMoves(self, targets=ALL_SQUARES):
+        """
+        Method to get the valid moves without making them on the chess board.
+
+        Parameters:
+        targets (int): The bitboard of end squares to generate moves to, for example the enemy pieces to get the captures only.
+
+        Returns:
+        list: A list of all valid moves for the current player.
+
+        The pieces giving check and the pieces pinned to the king are found once. In double check only the king may move.
+        In single check the other pieces may only capture the checking piece or block its ray, and a pinned piece may
+        only move along the ray between the king and the pinning piece. The king may move to any square that is not
+        attacked once the king has left its square, and may castle when it is not in check.
+        """
+        if self.whiteToMove:
+            allyColor, enemyColor = 'w', 'b'
+            kingSquare = self.whiteKingPosition[0] * 8 + self.whiteKingPosition[1]
+        else:
+            allyColor, enemyColor = 'b', 'w'
+            kingSquare = self.blackKingPosition[0] * 8 + self.blackKingPosition[1]
+        bitboards = self.bitboards
+        allyPieces = self.occupancy[allyColor]
+        occupied = allyPieces | self.occupancy[enemyColor]
+        moves = []
+
+        withoutKing = occupied ^ (1 << kingSquare)
+        kingTargets = KING_ATTACKS[kingSquare] & ~allyPieces & targets
+        safeTargets = 0
+        while kingTargets:
+            lowest = kingTargets & -kingTargets
+            if not self.getAttackers(lowest.bit_length() - 1, enemyColor, withoutKing):
+                safeTargets |= lowest
+            kingTargets ^= lowest
+        self.addMoves(kingSquare >> 3, kingSquare & 7, safeTargets, moves)
+
+        checkers = self.getAttackers(kingSquare, enemyColor, occupied)
+        if checkers & (checkers - 1):
+            return moves
+        if checkers:
+            checkMask = (BETWEEN[kingSquare][checkers.bit_length() - 1] | checkers) & targets
+        else:
+            checkMask = targets
+            if self.castleRights:
+                self.getCastleMoves(kingSquare >> 3, kingSquare & 7, moves, targets)
+
+        pins = self.getPins(kingSquare, enemyColor, allyPieces, occupied)
+        for piece in PIECE_TYPES[:-1]:
+            pieces = bitboards[allyColor + piece]
+            moveFunction = self.moveFunctions[piece]
+            while pieces:
+                lowest = pieces & -pieces
+                square = lowest.bit_length() - 1
+                if square in pins:
+                    moveFunction(square >> 3, square & 7, moves, checkMask & pins[square])
+                else:
+                    moveFunction(square >> 3, square & 7, moves, checkMask)
+                pieces ^= lowest
+
+        # An en passant capture removes two pawns from a row, which the pins above do not see, so it is checked by making it.
+        if self.enPassantPossible:
+            captures = []
+            self.getEnPassantMoves(captures, targets)
+            for move in captures:
+                self.makeMove(move)
+                self.whiteToMove = not self.whiteToMove
+                if not self.threatOfCheck():
+                    moves.append(move)
+                self.whiteToMove = not self.whiteToMove
+                self.undoMove()
+        return moves
+
+    def getPins(self, kingSquare, enemyColor, allyPieces, occupied):
+        """
+        Method to find the pieces pinned to the king of the current player.
+
+        Parameters:
+        kingSquare (int): The bitboard square index of the king.
+        enemyColor (str): The color of the opponent, 'w' or 'b'.
+        allyPieces (int): The bitboard of the pieces of the current player.
+        occupied (int): The bitboard of all pieces.
+
+        Returns:
+        dict: The bitboard of the squares every pinned piece may move to, the ray between the king and the pinning
+        piece and the pinning piece itself, keyed by the square of the pinned piece.
+        """
+        bitboards = self.bitboards
+        pins = {}
+        queens = bitboards[enemyColor + 'q']
+        snipers = ((rookAttacks(kingSquare, 0) & (bitboards[enemyColor + 'r'] | queens))
+                   | (bishopAttacks(kingSquare, 0) & (bitboards[enemyColor + 'b'] | queens)))
+        while snipers:
+            lowest = snipers & -snipers
+            ray = BETWEEN[kingSquare][lowest.bit_length() - 1]
+            blockers = ray & occupied
+            if blockers & allyPieces and not blockers & (blockers - 1):
+                pins[blockers.bit_length() - 1] = ray | lowest
+            snipers ^= lowest
+        return pins
+
+    def hasLegalMove(self):
+        """
+        Method to check if the current player has a valid move, without generating all of them.
+
+        Returns:
+        bool: True if the current player has a valid move, False in checkmate and stalemate.
+
+        The king moves are tried first, they are the cheapest to check and usually the only moves in check. The other
+        pieces are then tried one at a time until one of them has a move, with the same check and pin masks as
+        'getLegalMoves'. Castling is never needed: a king that may castle may also step to the square it passes.
+        """
+        if self.whiteToMove:
+            enemyColor = 'b'
+            allyPieces = self.occupancy['w']
+            kingSquare = self.whiteKingPosition[0] * 8 + self.whiteKingPosition[1]
+        else:
+            enemyColor = 'w'
+            allyPieces = self.occupancy['b']
+            kingSquare = self.blackKingPosition[0] * 8 + self.blackKingPosition[1]
+        occupied = allyPieces | self.occupancy[enemyColor]
+
+        withoutKing = occupied ^ (1 << kingSquare)
+        kingTargets = KING_ATTACKS[kingSquare] & ~allyPieces
+        while kingTargets:
+            lowest = kingTargets & -kingTargets
+            if not self.getAttackers(lowest.bit_length() - 1, enemyColor, withoutKing):
+                return True
+            kingTargets ^= lowest
+
+        checkers = self.getAttackers(kingSquare, enemyColor, occupied)
+        if checkers & (checkers - 1):
+            return False
+        checkMask = BETWEEN[kingSquare][checkers.bit_length() - 1] | checkers if checkers else ALL_SQUARES
+        pins = self.getPins(kingSquare, enemyColor, allyPieces, occupied)
+        allyColor = 'b' if enemyColor == 'w' else 'w'
+        moves = []
+        for piece in PIECE_TYPES[:-1]:
+            pieces = self.bitboards[allyColor + piece]
+            moveFunction = self.moveFunctions[piece]
+            while pieces:
+                lowest = pieces & -pieces
+                square = lowest.bit_length() - 1
+                moveFunction(square >> 3, square & 7, moves, checkMask & pins.get(square, ALL_SQUARES))
+                if moves:
+                    return True
+                pieces ^= lowest
+
+        if self.enPassantPossible:
+            self.getEnPassantMoves(moves)
+            for move in moves:
+                self.makeMove(move)
+                self.whiteToMove = not self.whiteToMove
+                legal = not self.threatOfCheck()
+                self.whiteToMove = not self.whiteToMove
+                self.undoMove()
+                if legal:
+                    return True
+        return False
+
+    def getValidMove(self, moveID):
+        """
+        Method to get the valid move with a packed 'moveID', generating only the moves of the piece on its start square.
+
+        Parameters:
+        moveID (int): The packed move (see 'Move.moveID'), for example of a move remembered from another position.
+
+        Returns:
+        Move: The valid move, or None if the move is not valid in the current position.
+
+        The move is checked for leaving the king in check by looking up the attackers of the king once the move is
+        made on the bitboards, only an en passant capture is made on the board to check it.
+        """
+        start, end = moveID & 63, moveID >> 6 & 63
+        piece = self.board[start >> 3][start & 7]
+        if piece == '--' or (piece[0] == 'w') != self.whiteToMove:
+            return None
+        moves = []
+        self.moveFunctions[piece[1]](start >> 3, start & 7, moves, 1 << end)
+        if piece[1] == 'p' and self.enPassantPossible:
+            self.getEnPassantMoves(moves, 1 << end)
+        for move in moves:
+            if move.moveID != moveID:
+                continue
+            enemyColor = 'b' if self.whiteToMove else 'w'
+            occupied = self.occupancy['w'] | self.occupancy['b']
+            if piece[1] == 'k':
+                # Castling moves are only generated when the king does not pass through an attacked square.
+                if move.moveID & SPECIAL_MOVE or not self.getAttackers(end, enemyColor, occupied ^ 1 << start):
+                    return move
+                return None
+            if move.moveID & SPECIAL_MOVE:
+                self.makeMove(move)
+                self.whiteToMove = not self.whiteToMove
+                legal = not self.threatOfCheck()
+                self.whiteToMove = not self.whiteToMove
+                self.undoMove()
+                return move if legal else None
+            kingPosition = self.whiteKingPosition if self.whiteToMove else self.blackKingPosition
+            # A captured piece is still on the bitboards, but no longer attacks.
+            attackers = self.getAttackers(kingPosition[0] * 8 + kingPosition[1], enemyColor, occupied & ~(1 << start) | 1 << end)
+            return move if not attackers & ~(1 << end) else None
+        return None
+
+    def iterMoveStages(self):
+        """
+        Method to generate the valid moves of the current player in stages, each stage only when it is asked for.
+
+        Yields:
+        list: The captures, en passant captures and promotions first, then the quiet moves.
+
+        The first stage is generated to the enemy pieces, the empty squares of the last rows and the en passant
+        square. The quiet moves it finds on the way, such as castling, are kept for the second stage, which is
+        generated to the other squares. A caller that finds a cutoff among the captures never pays for the quiet
+        moves. The position must be the same every time the generator is resumed.
+        """
+        enemyPieces = self.occupancy['b' if self.whiteToMove else 'w']
+        occupied = self.occupancy['w'] | self.occupancy['b']
+        tacticalTargets = enemyPieces | PROMOTION_ROWS & ~occupied
+        if self.enPassantPossible:
+            tacticalTargets |= 1 << (self.enPassantPossible[0] * 8 + self.enPassantPossible[1])
+        generate = self.validMoveFunctions[self.moveGenerator]
+        tactical = []
+        quiet = []
+        for move in generate(tacticalTargets):
+            if move.endSquare != '--' or move.moveID >> 12 & 7 or move.moveID & SPECIAL_MOVE and move.startSquare[1] == 'p':
+                tactical.append(move)
+            else:
+                quiet.append(move)
+        yield tactical
+        yield quiet + generate(ALL_SQUARES & ~tacticalTargets)
+
+    def iterMoves(self):
+        """
+        Method to generate the valid moves of the current player one at a time, in the stages of 'iterMoveStages'.
+
+        Yields:
+        Move: The valid moves, the captures and promotions first.
+        """
+        for moves in self.iterMoveStages():
+            yield from moves
+
     def threatOfCheck(self):
         """
         Method to check if the current player's king is under attack.
@@ -163,50 +833,142 @@ class GameCondition:
 
     def squareUnderAttack(self, row, col):
         """
-        Method to check if the current player's king is under attack.
+        Method to check if the specified square is attacked by the opponent of the current player.
 
         Parameters:
         row (int): The row index of the square to check for attack.
         col (int): The column index of the square to check for attack.
 
         Returns:
-        bool: True if the current player's king is under attack, False otherwise.
+        bool: True if the square is under attack, False otherwise.
 
         Note:
-        - This method iterates through all the pieces on the board and checks if any of them are attacking the specified square.
-        - It does not check for pawn captures or en passant moves.
+        - The attacks are looked up outward from the square: knight, pawn and king attack tables and sliding rays
+          stopped by the first blocker. No moves are generated.
+        - Pawns attack diagonally only, a pawn push never attacks a square.
         """
-        self.whiteToMove = not self.whiteToMove
-        opponentMoves = self.getAllPossibleMoves()
-        self.whiteToMove = not self.whiteToMove
-
-        for move in opponentMoves:
-            if move.endRow == row and move.endCol == col:
-                return True
+        square = row * 8 + col
+        if self.whiteToMove:
+            allyColor, enemyColor = 'w', 'b'
+        else:
+            allyColor, enemyColor = 'b', 'w'
+        bitboards = self.bitboards
+
+        if KNIGHT_ATTACKS[square] & bitboards[enemyColor + 'n']:
+            return True
+        # An enemy pawn attacks the square if a pawn of ours standing there would attack the enemy pawn.
+        if PAWN_ATTACKS[allyColor][square] & bitboards[enemyColor + 'p']:
+            return True
+        if KING_ATTACKS[square] & bitboards[enemyColor + 'k']:
+            return True
+        occupied = self.occupancy['w'] | self.occupancy['b']
+        queens = bitboards[enemyColor + 'q']
+        if bishopAttacks(square, occupied) & (bitboards[enemyColor + 'b'] | queens):
+            return True
+        if rookAttacks(square, occupied) & (bitboards[enemyColor + 'r'] | queens):
+            return True
         return False
 
-    def getAllPossibleMoves(self):
+    def getAttackers(self, square, color, occupied):
+        """
+        Method to get all pieces of the specified color that attack a square.
+
+        Parameters:
+        square (int): The bitboard square index of the attacked square.
+        color (str): The color of the attacking pieces, 'w' or 'b'.
+        occupied (int): The bitboard of occupied squares used to stop the sliding pieces.
+
+        Returns:
+        int: The bitboard of the attacking pieces.
+        """
+        bitboards = self.bitboards
+        allyColor = 'b' if color == 'w' else 'w'
+        queens = bitboards[color + 'q']
+        return ((KNIGHT_ATTACKS[square] & bitboards[color + 'n'])
+                | (PAWN_ATTACKS[allyColor][square] & bitboards[color + 'p'])
+                | (KING_ATTACKS[square] & bitboards[color + 'k'])
+                | (bishopAttacks(square, occupied) & (bitboards[color + 'b'] | queens))
+                | (rookAttacks(square, occupied) & (bitboards[color + 'r'] | queens)))
+
+    def getAllPossibleMoves(self, targets=ALL_SQUARES):
         '''
         Method to get a list of all possible moves for the current player.
 
+        Parameters:
+        targets (int): The bitboard of end squares to generate moves to. En passant captures are also generated when
+        the captured pawn is in it.
+
         Returns:
         list: A list of all possible moves for the current player.
 
         Note:
-        - This method don't check for en passant moves.
-        - This method don't check for castling moves.
+        - The pieces are found by walking the set bits of the player's bitboards, empty squares are never visited.
+        - Castling moves are only added when the king does not pass through an attacked square (see 'getCastleMoves').
         '''
         moves = []
-
-        for row in range(len(self.board)):
-            for col in range(len(self.board[row])):
-                color = self.board[row][col][0]
-                if (color == 'w' and self.whiteToMove) or (color == 'b' and not self.whiteToMove):
-                    piece = self.board[row][col][1]
-                    self.moveFunctions[piece](row, col, moves)
+        allyColor = 'w' if self.whiteToMove else 'b'
+
+        for piece in PIECE_TYPES:
+            pieces = self.bitboards[allyColor + piece]
+            moveFunction = self.moveFunctions[piece]
+            while pieces:
+                lowest = pieces & -pieces
+                square = lowest.bit_length() - 1
+                moveFunction(square >> 3, square & 7, moves, targets)
+                pieces ^= lowest
+        if self.enPassantPossible:
+            self.getEnPassantMoves(moves, targets)
         return moves
-    
-    def getPawnMoves(self, row, col, moves):
+
+    def addMoves(self, row, col, targets, moves):
+        '''
+        Method to add a move from the specified square to every square of a target bitboard.
+
+        Parameters:
+        row (int): The row index of the moving piece.
+        col (int): The column index of the moving piece.
+        targets (int): The bitboard of the end squares of the moves.
+        moves (list): A list to store the moves.
+
+        Returns:
+        None. The moves are appended to the 'moves' list.
+        '''
+        board = self.board
+        piece = board[row][col]
+        start = row * 8 + col
+        newMove = object.__new__
+        while targets:
+            lowest = targets & -targets
+            end = lowest.bit_length() - 1
+            # Filled in directly instead of through Move.__init__, this is the hottest allocation of the generator.
+            move = newMove(Move)
+            move.moveID = start | end << 6
+            move.startSquare = piece
+            move.endSquare = board[end >> 3][end & 7]
+            moves.append(move)
+            targets ^= lowest
+
+    def addPromotions(self, row, col, targets, moves):
+        '''
+        Method to add the four promotion moves of a pawn to every square of a target bitboard.
+
+        Parameters:
+        row (int): The row index of the pawn.
+        col (int): The column index of the pawn.
+        targets (int): The bitboard of the end squares of the moves, all on the last row.
+        moves (list): A list to store the moves.
+
+        Returns:
+        None. The moves are appended to the 'moves' list, the queen promotion first.
+        '''
+        while targets:
+            lowest = targets & -targets
+            end = lowest.bit_length() - 1
+            for piece in ('q', 'r', 'b', 'n'):
+                moves.append(Move((row, col), (end >> 3, end & 7), self.board, piece))
+            targets ^= lowest
+
+    def getPawnMoves(self, row, col, moves, mask=ALL_SQUARES):
         """
         Method to get all valid pawn moves for the current player.
 
@@ -214,38 +976,38 @@ class GameCondition:
         row (int): The row index of the pawn on the chess board.
         col (int): The column index of the pawn on the chess board.
         moves (list): A list to store the valid pawn moves.
+        mask (int): The bitboard of end squares the pawn may move to.
 
         Returns:
         None. The valid pawn moves are appended to the 'moves' list.
 
         Note:
         - This method checks for single and double pawn moves for white and black players.
-        - It does not check for en passant moves.
+        - A pawn reaching the last row gets one move for each promotion piece.
+        - En passant captures are added by 'getEnPassantMoves'.
         """
+        square = row * 8 + col
+        occupied = self.occupancy['w'] | self.occupancy['b']
+
         if self.whiteToMove:
-            if self.board[row - 1][col] == '--':
-                moves.append(Move((row, col), (row - 1, col), self.board))
-                if row == 6 and self.board[row - 2][col] == '--':
-                    moves.append(Move((row, col), (row - 2, col), self.board))
-            if col - 1 >= 0:
-                if self.board[row - 1][col - 1][0] == 'b':
-                    moves.append(Move((row, col), (row - 1, col - 1), self.board))
-            if col + 1 <= 7:
-                if self.board[row - 1][col + 1][0] == 'b':
-                    moves.append(Move((row, col), (row - 1, col + 1), self.board))
+            targets = PAWN_ATTACKS['w'][square] & self.occupancy['b']
+            if not occupied & (1 << (square - 8)):
+                targets |= 1 << (square - 8)
+                if row == 6 and not occupied & (1 << (square - 16)):
+                    targets |= 1 << (square - 16)
         else:
-            if self.board[row + 1][col] == '--':
-                moves.append(Move((row, col), (row + 1, col), self.board))
-                if row == 1 and self.board[row + 2][col] == '--':
-                    moves.append(Move((row, col), (row + 2, col), self.board))
-            if col - 1 >= 0:
-                if self.board[row + 1][col - 1][0] == 'w':
-                    moves.append(Move((row, col), (row + 1, col - 1), self.board))
-            if col + 1 <= 7:
-                if self.board[row + 1][col + 1][0] == 'w':
-                    moves.append(Move((row, col), (row + 1, col + 1), self.board))
-
-    def getRookMoves(self, row, col, moves):
+            targets = PAWN_ATTACKS['b'][square] & self.occupancy['w']
+            if not occupied & (1 << (square + 8)):
+                targets |= 1 << (square + 8)
+                if row == 1 and not occupied & (1 << (square + 16)):
+                    targets |= 1 << (square + 16)
+        targets &= mask
+        if targets & PROMOTION_ROWS:
+            self.addPromotions(row, col, targets, moves)
+        else:
+            self.addMoves(row, col, targets, moves)
+
+    def getRookMoves(self, row, col, moves, mask=ALL_SQUARES):
         """
         Method to get all valid rook moves for the current player.
 
@@ -253,34 +1015,17 @@ class GameCondition:
         row (int): The row index of the rook on the chess board.
         col (int): The column index of the rook on the chess board.
         moves (list): A list to store the valid rook moves.
+        mask (int): The bitboard of end squares the rook may move to.
 
         Returns:
         None. The valid rook moves are appended to the 'moves' list.
         """
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1))
-        if self.whiteToMove:
-            enemyColor = 'b'
-        else:
-            enemyColor = 'w'
+        allyColor = 'w' if self.whiteToMove else 'b'
+        occupied = self.occupancy['w'] | self.occupancy['b']
+        targets = rookAttacks(row * 8 + col, occupied) & ~self.occupancy[allyColor]
+        self.addMoves(row, col, targets & mask, moves)
 
-        for direction in directions:
-            for i in range(1, 8):
-                endRow = row + i * direction[0]
-                endCol = col + i * direction[1]
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    endSquare = self.board[endRow][endCol]
-                    if endSquare == '--':
-                        moves.append(Move((row, col), (endRow, endCol), self.board))
-                    elif endSquare[0] == enemyColor:
-                        moves.append(Move((row, col), (endRow, endCol), self.board))
-                        break
-                    else:
-                        break
-                else:
-                    break
-
-
-    def getKnightMoves(self, row, col, moves):
+    def getKnightMoves(self, row, col, moves, mask=ALL_SQUARES):
         """
         Method to get all valid knight moves for the current player.
 
@@ -288,26 +1033,16 @@ class GameCondition:
         row (int): The row index of the knight on the chess board.
         col (int): The column index of the knight on the chess board.
         moves (list): A list to store the valid knight moves.
+        mask (int): The bitboard of end squares the knight may move to.
 
         Returns:
         None. The valid knight moves are appended to the 'moves' list.
         """
-        directions = ((-2, -1), (-2, 1), (-1, 2), (1, 2), (2, -1), (2, 1), (-1, -2), (1, -2))
+        allyColor = 'w' if self.whiteToMove else 'b'
+        targets = KNIGHT_ATTACKS[row * 8 + col] & ~self.occupancy[allyColor]
+        self.addMoves(row, col, targets & mask, moves)
 
-        if self.whiteToMove:
-            enemyColor = 'b'
-        else:
-            enemyColor = 'w'
-
-        for direction in directions:
-            endRow = row + direction[0]
-            endCol = col + direction[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endSquare = self.board[endRow][endCol]
-                if endSquare == '--' or endSquare[0] == enemyColor:
-                    moves.append(Move((row, col), (endRow, endCol), self.board))
-
-    def getBishopMoves(self, row, col, moves):
+    def getBishopMoves(self, row, col, moves, mask=ALL_SQUARES):
         '''
         Method to get all valid bishop moves for the current player.
 
@@ -315,33 +1050,17 @@ class GameCondition:
         row (int): The row index of the bishop on the chess board.
         col (int): The column index of the bishop on the chess board.
         moves (list): A list to store the valid bishop moves.
+        mask (int): The bitboard of end squares the bishop may move to.
 
         Returns:
         None. The valid bishop moves are appended to the 'moves' list.
         '''
-        directions = ((-1, -1), (-1, 1), (1, -1), (1, 1))
-        if self.whiteToMove:
-            enemyColor = 'b'
-        else:
-            enemyColor = 'w'
+        allyColor = 'w' if self.whiteToMove else 'b'
+        occupied = self.occupancy['w'] | self.occupancy['b']
+        targets = bishopAttacks(row * 8 + col, occupied) & ~self.occupancy[allyColor]
+        self.addMoves(row, col, targets & mask, moves)
 
-        for direction in directions:
-            for i in range(1, 8):
-                endRow = row + i * direction[0]
-                endCol = col + i * direction[1]
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    endSquare = self.board[endRow][endCol]
-                    if endSquare == '--':
-                        moves.append(Move((row, col), (endRow, endCol), self.board))
-                    elif endSquare[0] == enemyColor:
-                        moves.append(Move((row, col), (endRow, endCol), self.board))
-                        break
-                    else:
-                        break
-                else:
-                    break
-
-    def getQueenMoves(self, row, col, moves):
+    def getQueenMoves(self, row, col, moves, mask=ALL_SQUARES):
         '''
         Method to get all valid queen moves for the current player.
 
@@ -349,14 +1068,15 @@ class GameCondition:
         row (int): The row index of the queen on the chess board.
         col (int): The column index of the queen on the chess board.
         moves (list): A list to store the valid bishop moves.
+        mask (int): The bitboard of end squares the piece may move to.
 
         Returns:
         None. The valid queen moves are appended to the 'moves' list.
         '''
-        self.getBishopMoves(row, col, moves)
-        self.getRookMoves(row, col, moves)
+        self.getBishopMoves(row, col, moves, mask)
+        self.getRookMoves(row, col, moves, mask)
 
-    def getKingMoves(self, row, col, moves):
+    def getKingMoves(self, row, col, moves, mask=ALL_SQUARES):
         '''
         Method to get all valid king moves for the current player.
 
@@ -364,36 +1084,95 @@ class GameCondition:
         row (int): The row index of the king on the chess board.
         col (int): The column index of the king on the chess board.
         moves (list): A list to store the valid bishop moves.
+        mask (int): The bitboard of end squares the piece may move to.
 
         Returns:
         None. The valid king moves are appended to the 'moves' list.
 
         Note:
-        - This method don't check for castling moves.
+        - The castling moves are added by 'getCastleMoves'.
         '''
-        directions = ((-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1))
+        allyColor = 'w' if self.whiteToMove else 'b'
+        targets = KING_ATTACKS[row * 8 + col] & ~self.occupancy[allyColor]
+        self.addMoves(row, col, targets & mask, moves)
+        if self.castleRights:
+            self.getCastleMoves(row, col, moves, mask)
 
+    def getCastleMoves(self, row, col, moves, mask=ALL_SQUARES):
+        '''
+        Method to get the castling moves of the current player.
+
+        Parameters:
+        row (int): The row index of the king on the chess board.
+        col (int): The column index of the king on the chess board.
+        moves (list): A list to store the castling moves.
+        mask (int): The bitboard of end squares the king may move to.
+
+        Returns:
+        None. The castling moves are appended to the 'moves' list.
+
+        Note:
+        - The king may castle if it has the castling right, the squares between the king and the rook are empty,
+          and neither the king square nor the squares the king passes through or ends on are attacked.
+        '''
+        allyColor = 'w' if self.whiteToMove else 'b'
+        occupied = self.occupancy['w'] | self.occupancy['b']
+        inCheck = None
+        for right, end, empty, passed in CASTLE_MOVES[allyColor]:
+            if not self.castleRights & right or occupied & empty or not mask & (1 << end):
+                continue
+            if inCheck is None:
+                inCheck = self.squareUnderAttack(row, col)
+                if inCheck:
+                    return
+            if not any(self.squareUnderAttack(square >> 3, square & 7) for square in passed):
+                moves.append(Move((row, col), (end >> 3, end & 7), self.board))
+
+    def getEnPassantMoves(self, moves, mask=ALL_SQUARES):
+        '''
+        Method to get the en passant captures of the current player.
+
+        Parameters:
+        moves (list): A list to store the en passant captures.
+        mask (int): The bitboard of end squares or captured pawns the capture is limited to.
+
+        Returns:
+        None. The en passant captures are appended to the 'moves' list.
+
+        Note:
+        - The captures are not checked for leaving the king in check.
+        '''
+        row, col = self.enPassantPossible
+        square = row * 8 + col
         if self.whiteToMove:
-            allyColor = 'w'
+            pawns = PAWN_ATTACKS['b'][square] & self.bitboards['wp']
+            captured = square + 8
         else:
-            allyColor = 'b'
-
-        for direction in directions:
-            endRow = row + direction[0]
-            endCol = col + direction[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endSquare = self.board[endRow][endCol]
-                if endSquare[0] != allyColor:
-                    moves.append(Move((row, col), (endRow, endCol), self.board))
+            pawns = PAWN_ATTACKS['w'][square] & self.bitboards['bp']
+            captured = square - 8
+        if not mask & (1 << square | 1 << captured):
+            return
+        while pawns:
+            lowest = pawns & -pawns
+            start = lowest.bit_length() - 1
+            moves.append(Move((start >> 3, start & 7), (row, col), self.board))
+            pawns ^= lowest
 
 
 class Move:
+    '''
+    This class represents a move. The move is packed into the integer 'moveID': bits 0-5 hold the start square
+    and bits 6-11 the end square, as row * 8 + col, bits 12-14 the promotion piece (see PROMOTION_PIECES) and
+    bit 15 is set for castling and en passant captures (see SPECIAL_MOVE).
+    '''
+    __slots__ = ('moveID', 'startSquare', 'endSquare')
+
     boardToRow = {'1': 7, '2': 6, '3': 5, '4': 4, '5': 3, '6': 2, '7': 1, '8': 0}
     rowToBoard = {value: key for key, value in boardToRow.items()}
     boardToCol = {'a': 0, 'b': 1, 'c': 2, 'd': 3, 'e': 4, 'f': 5, 'g': 6, 'h': 7}
     colToBoard = {value: key for key, value in boardToCol.items()}
 
-    def __init__(self, startMove, endMove, board):
+    def __init__(self, startMove, endMove, board, promotion=''):
         '''
         Initializes a new instance of the Move class with the specified start and end positions and board parameter.
 
@@ -401,37 +1180,113 @@ class Move:
         startMove (tuple): A tuple containing the row and column indices of the start position of the move.
         endMove (tuple): A tuple containing the row and column indices of the end position of the move.
         board (list): A list representing the current state of the chess board.
+        promotion (str): The piece a pawn is promoted to, 'q', 'r', 'b' or 'n', or '' if the move is not a promotion.
         
         Returns:
         None. A new instance of the Move class is initialized with the specified parameters.
+
+        Raises:
+        KeyError: If the promotion piece is not one of 'q', 'r', 'b' or 'n'.
         '''
-        self.startRow = startMove[0]
-        self.startCol = startMove[1]
-        self.endRow = endMove[0]
-        self.endCol = endMove[1]
-        self.startSquare = board[self.startRow][self.startCol]
-        self.endSquare = board[self.endRow][self.endCol]
-        
-        self.pawnPromotion = False
-        if (self.startSquare == 'wp' and self.endRow == 0) or (self.startSquare == 'bp' and self.endRow == 7):
-            self.pawnPromotion = True
+        self.startSquare = board[startMove[0]][startMove[1]]
+        self.endSquare = board[endMove[0]][endMove[1]]
+        self.moveID = startMove[0] * 8 + startMove[1] | (endMove[0] * 8 + endMove[1]) << 6 | PROMOTION_CODES[promotion] << 12
+        # A king moving two columns castles, a pawn moving diagonally to an empty square captures en passant.
+        if ((self.startSquare[1] == 'k' and abs(startMove[1] - endMove[1]) == 2)
+                or (self.startSquare[1] == 'p' and startMove[1] != endMove[1] and self.endSquare == '--')):
+            self.moveID |= SPECIAL_MOVE
+
+    @property
+    def startRow(self):
+        '''
+        The row index of the start position of the move.
+        '''
+        return (self.moveID & 63) >> 3
+
+    @property
+    def startCol(self):
+        '''
+        The column index of the start position of the move.
+        '''
+        return self.moveID & 7
+
+    @property
+    def endRow(self):
+        '''
+        The row index of the end position of the move.
+        '''
+        return (self.moveID >> 9) & 7
 
-        self.moveID = str(self.startRow) + str(self.startCol) + str(self.endRow) + str(self.endCol)
+    @property
+    def endCol(self):
+        '''
+        The column index of the end position of the move.
+        '''
+        return (self.moveID >> 6) & 7
+
+    @property
+    def pawnPromotion(self):
+        '''
+        True if the move takes a pawn to the last row.
+        '''
+        return (self.startSquare == 'wp' and self.moveID >> 9 & 7 == 0) or (self.startSquare == 'bp' and self.moveID >> 9 & 7 == 7)
+
+    @property
+    def promotion(self):
+        '''
+        The piece a pawn is promoted to, 'q', 'r', 'b' or 'n', or '' if the move is not a promotion.
+        '''
+        return PROMOTION_PIECES[self.moveID >> 12 & 7]
+
+    @property
+    def isCastleMove(self):
+        '''
+        True if the move is castling.
+        '''
+        return bool(self.moveID & SPECIAL_MOVE) and self.startSquare[1] == 'k'
+
+    @property
+    def isEnPassantMove(self):
+        '''
+        True if the move is an en passant capture.
+        '''
+        return bool(self.moveID & SPECIAL_MOVE) and self.startSquare[1] == 'p'
+
+    def isSameSquares(self, other):
+        '''
+        Compares the start and end positions of two moves, whatever their promotion pieces.
+
+        Parameters:
+        other (Move): Another instance of the Move class.
+
+        Returns:
+        bool: True if the two moves have the same start and end positions, and False otherwise.
+        '''
+        return self.moveID & 0xFFF == other.moveID & 0xFFF
 
     def __eq__(self, other):
         '''
-        Compares the current instance of the Move class with another instance of the Move class, returning True if the two instances have the same start and end positions, and False otherwise.
+        Compares the current instance of the Move class with another instance of the Move class, returning True if the two instances have the same start and end positions and promotion piece, and False otherwise.
 
         Parameters:
         other (Move): Another instance of the Move class to be compared with the current instance.
 
         Returns:
-        bool: True if the two instances have the same start and end positions, and False otherwise.
+        bool: True if the two instances have the same start and end positions and promotion piece, and False otherwise.
         '''
         if isinstance(other, Move):
             return self.moveID == other.moveID
         return False
 
+    def __hash__(self):
+        '''
+        Returns the hash of the move, its packed 'moveID'.
+
+        Returns:
+        int: The hash of the move.
+        '''
+        return self.moveID
+
     def getNotation(self, startMove, endMove):
         '''
         Returns a string representing the notation of the move, in the format 'startSquare_endSquare'.
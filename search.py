@@ -0,0 +1,535 @@
+'''
+This is a file that contains the search engine that chooses a move for the current player.
+
+The engine runs a negamax alpha-beta search (principal variation search) with iterative deepening inside a
+time or node budget. It uses a fixed-size transposition table, orders the moves by transposition table move,
+MVV-LVA, killer moves and history, and ends every line with a quiescence search over the captures. With a
+tablebase (see tablebase.py), the endings it knows are scored exactly and played from the tables at the root.
+
+Usage:
+result = search.findBestMove(gc, timeLimit=0.3)
+result.bestMove, result.score, result.pv
+'''
+import time
+
+from evaluation import PIECE_VALUES, evaluate
+from rules import SPECIAL_MOVE
+
+MAX_DEPTH = 64
+MATE_SCORE = 100000
+# Scores beyond this bound are mate scores, counted in plies from the root.
+MATE_BOUND = MATE_SCORE - 1000
+INFINITY = MATE_SCORE + 1
+
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# Move ordering scores, from the first move searched to the last.
+TT_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 20
+KILLER_SCORES = (1 << 19, (1 << 19) - 1)
+
+# The clock is read once per this many nodes.
+CHECK_INTERVAL = 1024
+
+
+class TranspositionTable:
+    '''
+    This class represents a fixed-size hash table of search results, indexed by the Zobrist key of the position.
+    '''
+    def __init__(self, size=1 << 18):
+        '''
+        Initialize the TranspositionTable object.
+
+        Parameters:
+        size (int): The number of entries, rounded down to a power of two.
+
+        Returns:
+        None
+        '''
+        self.size = 1 << (size.bit_length() - 1)
+        self.mask = self.size - 1
+        self.entries = [None] * self.size
+        self.age = 0
+
+    def probe(self, key):
+        '''
+        Returns the entry stored for a position.
+
+        Parameters:
+        key (int): The Zobrist key of the position.
+
+        Returns:
+        tuple: The entry (key, depth, score, flag, move, age), or None if the position is not stored.
+        '''
+        entry = self.entries[key & self.mask]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, score, flag, move):
+        '''
+        Stores a search result.
+
+        Parameters:
+        key (int): The Zobrist key of the position.
+        depth (int): The depth the position was searched to.
+        score (int): The score of the position.
+        flag (int): EXACT, LOWER_BOUND or UPPER_BOUND.
+        move (Move): The best move found, or None.
+
+        Returns:
+        None
+
+        Note:
+        - An entry of the same position, of an earlier search or of a shallower depth is replaced.
+          A deeper entry of another position from the current search is kept.
+        '''
+        index = key & self.mask
+        entry = self.entries[index]
+        if entry is None or entry[0] == key or entry[5] != self.age or depth >= entry[1]:
+            if move is None and entry is not None and entry[0] == key:
+                move = entry[4]
+            self.entries[index] = (key, depth, score, flag, move, self.age)
+
+    def clear(self):
+        '''
+        Removes all entries.
+
+        Returns:
+        None
+        '''
+        self.entries = [None] * self.size
+
+
+class SearchResult:
+    '''
+    This class represents the result of a search.
+    '''
+    def __init__(self, bestMove, score, pv, depth, nodes, seconds):
+        '''
+        Initialize the SearchResult object.
+
+        Parameters:
+        bestMove (Move): The best move found, or None if the player has no valid moves.
+        score (int): The score in centipawns from the point of view of the player to move.
+        pv (list): The principal variation, starting with the best move.
+        depth (int): The depth of the last completed iteration.
+        nodes (int): The number of nodes searched.
+        seconds (float): The time the search took.
+
+        Returns:
+        None
+        '''
+        self.bestMove = bestMove
+        self.score = score
+        self.pv = pv
+        self.depth = depth
+        self.nodes = nodes
+        self.seconds = seconds
+
+    def getMateDistance(self):
+        '''
+        Returns the number of moves to mate if the score is a mate score.
+
+        Returns:
+        int: The number of moves to mate, negative if the player to move is mated, or None if the score is not a mate score.
+        '''
+        if self.score > MATE_BOUND:
+            return (MATE_SCORE - self.score + 1) // 2
+        if self.score < -MATE_BOUND:
+            return -(MATE_SCORE + self.score) // 2
+        return None
+
+
+class Search:
+    '''
+    This class represents the search engine. It keeps the transposition table, killer moves and history
+    scores from one search to the next.
+    '''
+    def __init__(self, ttSize=1 << 18, tablebase=None):
+        '''
+        Initialize the Search object.
+
+        Parameters:
+        ttSize (int): The number of entries of the transposition table.
+        tablebase (Tablebase): The endgame tablebase, or None to search every position.
+
+        Returns:
+        None
+        '''
+        self.tablebase = tablebase
+        self.transpositionTable = TranspositionTable(ttSize)
+        self.killers = [[None, None] for ply in range(MAX_DEPTH + 1)]
+        self.history = {}
+        self.pvTable = [[] for ply in range(MAX_DEPTH + 1)]
+        self.nodes = 0
+        self.deadline = None
+        self.nodeLimit = None
+        self.stopped = False
+        self.canStop = False
+
+    def findBestMove(self, gc, maxDepth=MAX_DEPTH, timeLimit=None, nodeLimit=None, callback=None):
+        '''
+        Searches the current position with iterative deepening.
+
+        Parameters:
+        gc (GameCondition): The game condition. It is left unchanged.
+        maxDepth (int): The deepest iteration.
+        timeLimit (float): The time budget in seconds, or None for no limit.
+        nodeLimit (int): The node budget, or None for no limit.
+        callback (function): Called with a SearchResult after every completed iteration, or None.
+
+        Returns:
+        SearchResult: The result of the last completed iteration.
+
+        Note:
+        - The first iteration always runs to the end, so a move is returned even with a tiny budget.
+        - A position of the tablebase is not searched: its best move is returned at once, with depth 0.
+        '''
+        start = time.perf_counter()
+        if self.tablebase is not None:
+            found = self.tablebase.getBestMove(gc)
+            if found is not None:
+                move, outcome, plies = found
+                result = SearchResult(move, getTablebaseScore(outcome, plies, 0), [move], 0, 0, time.perf_counter() - start)
+                if callback is not None:
+                    callback(result)
+                return result
+        self.deadline = start + timeLimit if timeLimit is not None else None
+        self.nodeLimit = nodeLimit
+        self.nodes = 0
+        self.stopped = False
+        self.canStop = False
+        self.transpositionTable.age += 1
+        self.killers = [[None, None] for ply in range(MAX_DEPTH + 1)]
+        self.history = {key: value // 8 for key, value in self.history.items()}
+
+        result = SearchResult(None, 0, [], 0, 0, 0.0)
+        for depth in range(1, min(maxDepth, MAX_DEPTH) + 1):
+            score = self.negamax(gc, depth, -INFINITY, INFINITY, 0)
+            if self.stopped:
+                break
+            result = SearchResult(self.pvTable[0][0] if self.pvTable[0] else None, score, list(self.pvTable[0]),
+                                  depth, self.nodes, time.perf_counter() - start)
+            if callback is not None:
+                callback(result)
+            self.canStop = True
+            if result.bestMove is None or abs(score) > MATE_BOUND:
+                break
+            # The next iteration takes several times longer, so do not start one that cannot finish.
+            if self.deadline is not None and time.perf_counter() + 2 * (time.perf_counter() - start) > self.deadline:
+                break
+        result.nodes = self.nodes
+        result.seconds = time.perf_counter() - start
+        return result
+
+    def checkLimits(self):
+        '''
+        Sets the 'stopped' flag when the time or node budget is used up.
+
+        Returns:
+        None
+        '''
+        if not self.canStop:
+            return
+        if self.nodeLimit is not None and self.nodes >= self.nodeLimit:
+            self.stopped = True
+        elif self.deadline is not None and time.perf_counter() >= self.deadline:
+            self.stopped = True
+
+    def negamax(self, gc, depth, alpha, beta, ply):
+        '''
+        Searches a position with alpha-beta pruning.
+
+        Parameters:
+        gc (GameCondition): The game condition. It is left unchanged.
+        depth (int): The remaining depth in plies.
+        alpha (int): The score the player to move is already assured of.
+        beta (int): The score the opponent is already assured of.
+        ply (int): The distance from the root.
+
+        Returns:
+        int: The score of the position from the point of view of the player to move.
+        '''
+        self.nodes += 1
+        if self.nodes % CHECK_INTERVAL == 0:
+            self.checkLimits()
+        if self.stopped:
+            return 0
+        self.pvTable[ply] = []
+
+        if ply > 0 and gc.isRepetition(2):
+            return 0
+        if ply > 0 and self.tablebase is not None:
+            entry = self.tablebase.probe(gc)
+            if entry is not None:
+                return getTablebaseScore(entry[0], entry[1], ply)
+        inCheck = gc.threatOfCheck()
+        if inCheck:
+            depth += 1
+        if depth <= 0 or ply >= MAX_DEPTH:
+            return self.quiescence(gc, alpha, beta, ply)
+
+        key = gc.zobristKey
+        ttMove = None
+        entry = self.transpositionTable.probe(key)
+        if entry is not None:
+            ttMove = entry[4]
+            # Principal variation nodes are searched again so that the whole variation is collected.
+            if ply > 0 and entry[1] >= depth and beta - alpha == 1:
+                score = fromTableScore(entry[2], ply)
+                if entry[3] == EXACT or (entry[3] == LOWER_BOUND and score >= beta) or (entry[3] == UPPER_BOUND and score <= alpha):
+                    if ttMove is not None:
+                        self.pvTable[ply] = [ttMove]
+                    return score
+
+        originalAlpha = alpha
+        bestScore = -INFINITY
+        bestMove = None
+        for index, move in enumerate(self.iterMoves(gc, ttMove, ply)):
+            gc.makeMove(move)
+            if index == 0:
+                score = -self.negamax(gc, depth - 1, -beta, -alpha, ply + 1)
+            else:
+                # The later moves are expected to fail low, which a null window proves cheaply. Only a move that
+                # beats alpha is searched again with the full window.
+                score = -self.negamax(gc, depth - 1, -alpha - 1, -alpha, ply + 1)
+                if alpha < score < beta:
+                    score = -self.negamax(gc, depth - 1, -beta, -alpha, ply + 1)
+            gc.undoMove()
+            if self.stopped:
+                return 0
+            if score > bestScore:
+                bestScore = score
+                bestMove = move
+                if score > alpha:
+                    alpha = score
+                    self.pvTable[ply] = [move] + self.pvTable[ply + 1]
+                    if alpha >= beta:
+                        if move.endSquare == '--':
+                            self.addKiller(move, ply)
+                            historyKey = (move.startSquare, move.moveID >> 6 & 63)
+                            self.history[historyKey] = self.history.get(historyKey, 0) + depth * depth
+                        break
+
+        if bestMove is None:
+            return -MATE_SCORE + ply if inCheck else 0
+        if bestScore >= beta:
+            flag = LOWER_BOUND
+        elif bestScore > originalAlpha:
+            flag = EXACT
+        else:
+            flag = UPPER_BOUND
+        self.transpositionTable.store(key, depth, toTableScore(bestScore, ply), flag, bestMove if flag != UPPER_BOUND else None)
+        return bestScore
+
+    def quiescence(self, gc, alpha, beta, ply):
+        '''
+        Searches the captures of a position until it is quiet, so that the static evaluation is not taken in the middle of an exchange.
+
+        Parameters:
+        gc (GameCondition): The game condition. It is left unchanged.
+        alpha (int): The score the player to move is already assured of.
+        beta (int): The score the opponent is already assured of.
+        ply (int): The distance from the root.
+
+        Returns:
+        int: The score of the position from the point of view of the player to move.
+        '''
+        self.nodes += 1
+        if self.nodes % CHECK_INTERVAL == 0:
+            self.checkLimits()
+        if self.stopped:
+            return 0
+        self.pvTable[ply] = []
+        if ply >= MAX_DEPTH:
+            # The tables of the search end here, also for a line of evasions.
+            return evaluate(gc)
+
+        if self.tablebase is not None:
+            # Captures are what lead into the endings of the tablebase.
+            entry = self.tablebase.probe(gc)
+            if entry is not None:
+                return getTablebaseScore(entry[0], entry[1], ply)
+        inCheck = gc.threatOfCheck()
+        if inCheck:
+            # Every evasion is searched, a player in check cannot choose to stand still.
+            moves = gc.validMoveFunctions[gc.moveGenerator]()
+            if not moves:
+                return -MATE_SCORE + ply
+            bestScore = -INFINITY
+        else:
+            bestScore = evaluate(gc)
+            if bestScore >= beta:
+                return bestScore
+            if bestScore > alpha:
+                alpha = bestScore
+            moves = gc.getLegalMoves(gc.occupancy['b' if gc.whiteToMove else 'w'])
+        self.orderMoves(moves, None, ply)
+
+        for move in moves:
+            gc.makeMove(move)
+            score = -self.quiescence(gc, -beta, -alpha, ply + 1)
+            gc.undoMove()
+            if self.stopped:
+                return 0
+            if score > bestScore:
+                bestScore = score
+                if score > alpha:
+                    alpha = score
+                    self.pvTable[ply] = [move] + self.pvTable[ply + 1]
+                    if alpha >= beta:
+                        break
+        return bestScore
+
+    def iterMoves(self, gc, ttMove, ply):
+        '''
+        Yields the moves of a position in the order they are searched.
+
+        Parameters:
+        gc (GameCondition): The game condition. It must be in the same position every time the generator is resumed.
+        ttMove (Move): The best move stored in the transposition table, or None.
+        ply (int): The distance from the root.
+
+        Yields:
+        Move: The transposition table move first, then the other valid moves sorted by 'orderMoves'.
+
+        Note:
+        - The transposition table move is checked on its own (see 'GameCondition.getValidMove'), so when it causes
+          a cutoff, which it mostly does, the other moves are never generated.
+        '''
+        if ttMove is not None:
+            ttMove = gc.getValidMove(ttMove.moveID)
+            if ttMove is not None:
+                yield ttMove
+        moves = gc.validMoveFunctions[gc.moveGenerator]()
+        self.orderMoves(moves, None, ply)
+        for move in moves:
+            if move != ttMove:
+                yield move
+
+    def orderMoves(self, moves, ttMove, ply):
+        '''
+        Sorts moves so that the most promising ones are searched first.
+
+        Parameters:
+        moves (list): The moves to be sorted in place.
+        ttMove (Move): The best move stored in the transposition table, or None.
+        ply (int): The distance from the root.
+
+        Returns:
+        None
+
+        Note:
+        - The order is the transposition table move, captures by MVV-LVA (most valuable victim, least valuable
+          attacker) and promotions, the killer moves of the ply, and the other quiet moves by their history score.
+        '''
+        killers = self.killers[ply]
+        history = self.history
+
+        def score(move):
+            if ttMove is not None and move == ttMove:
+                return TT_MOVE_SCORE
+            if move.endSquare != '--':
+                return CAPTURE_SCORE + 10 * PIECE_VALUES[move.endSquare[1]] - PIECE_VALUES[move.startSquare[1]] // 10 + PIECE_VALUES[move.promotion or 'k']
+            if move.moveID >> 12 & 7:
+                return CAPTURE_SCORE + PIECE_VALUES[move.promotion]
+            if move.moveID & SPECIAL_MOVE and move.startSquare[1] == 'p':
+                # En passant ends on an empty square but captures a pawn.
+                return CAPTURE_SCORE + 9 * PIECE_VALUES['p']
+            if move == killers[0]:
+                return KILLER_SCORES[0]
+            if move == killers[1]:
+                return KILLER_SCORES[1]
+            return history.get((move.startSquare, move.moveID >> 6 & 63), 0)
+
+        moves.sort(key=score, reverse=True)
+
+    def addKiller(self, move, ply):
+        '''
+        Remembers a quiet move that caused a beta cutoff, to try it early in sibling positions.
+
+        Parameters:
+        move (Move): The move.
+        ply (int): The distance from the root.
+
+        Returns:
+        None
+        '''
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+
+
+def toTableScore(score, ply):
+    '''
+    Converts a mate score counted from the root into one counted from the current position.
+
+    Parameters:
+    score (int): The score.
+    ply (int): The distance from the root.
+
+    Returns:
+    int: The score to be stored in the transposition table.
+    '''
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def fromTableScore(score, ply):
+    '''
+    Converts a mate score stored in the transposition table back into one counted from the root.
+
+    Parameters:
+    score (int): The stored score.
+    ply (int): The distance from the root.
+
+    Returns:
+    int: The score.
+    '''
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
+
+def getTablebaseScore(outcome, plies, ply):
+    '''
+    Converts a tablebase result into a search score.
+
+    Parameters:
+    outcome (int): The result for the player to move: 1 for a win, 0 for a draw and -1 for a loss.
+    plies (int): The number of plies to mate.
+    ply (int): The distance from the root.
+
+    Returns:
+    int: The mate score counted from the root, or 0 for a draw.
+    '''
+    if outcome > 0:
+        return MATE_SCORE - ply - plies
+    if outcome < 0:
+        return -MATE_SCORE + ply + plies
+    return 0
+
+
+def findBestMove(gc, maxDepth=MAX_DEPTH, timeLimit=None, nodeLimit=None):
+    '''
+    Searches the current position with a new engine.
+
+    Parameters:
+    gc (GameCondition): The game condition. It is left unchanged.
+    maxDepth (int): The deepest iteration.
+    timeLimit (float): The time budget in seconds, or None for no limit.
+    nodeLimit (int): The node budget, or None for no limit.
+
+    Returns:
+    SearchResult: The result of the search.
+    '''
+    return Search().findBestMove(gc, maxDepth, timeLimit, nodeLimit)
@@ -0,0 +1,588 @@
+'''
+This is a file that contains the game server, which hosts many games at once in one process.
+
+A game is not kept as a GameCondition. A session only holds its start position and current position packed into
+70 bytes each (see 'packPosition'), its moves packed as 'Move.moveID' in an array of 16 bit integers, and the
+Zobrist keys of the positions since the last capture or pawn move for the repetition rule. One GameCondition of
+the server is loaded with a position whenever a move has to be made. The valid moves of a position are kept in a
+shared cache of limited size, keyed by the packed position without the move clocks, so the positions every game
+goes through, such as the openings, and positions visited again after an undo are not generated again.
+
+The server speaks JSON lines over TCP: every request is a JSON object on its own line, answered by one line.
+Requests: {"command": "new", "fen": <optional FEN>}, {"command": "move", "game": <id>, "move": <SAN or e2e4>},
+{"command": "moves", "game": <id>}, {"command": "undo", "game": <id>}, {"command": "state", "game": <id>},
+{"command": "close", "game": <id>} and {"command": "stats"}. An "id" in a request is copied into its answer.
+
+Usage:
+python server.py --port 8765 --cache-size 65536 --max-sessions 10000
+'''
+import argparse
+import asyncio
+import json
+import struct
+import sys
+import time
+from array import array
+from collections import OrderedDict
+
+import rules
+from match import isInsufficientMaterial
+from notation import COORDINATE_PATTERN, getSan, parseMove
+
+# The board as 64 snapshot letters, whiteToMove | castleRights << 1, the en passant square (64 for none),
+# the halfmove clock and the fullmove number.
+POSITION = struct.Struct('>64sBBHH')
+# The valid moves only depend on the first 66 bytes of a packed position, the move clocks do not matter.
+KEY_SIZE = 66
+NO_EN_PASSANT = 64
+DEFAULT_CACHE_SIZE = 1 << 16
+DEFAULT_MAX_SESSIONS = 10000
+# The longest game a session may hold, which bounds its memory.
+DEFAULT_MAX_PLIES = 1000
+
+
+def packPosition(gc):
+    '''
+    Packs the position of a game condition into bytes.
+
+    Parameters:
+    gc (GameCondition): The game condition.
+
+    Returns:
+    bytes: The packed position (see POSITION).
+    '''
+    letters = ''.join([rules.SNAPSHOT_LETTERS[piece] for row in gc.board for piece in row])
+    enPassant = gc.enPassantPossible[0] * 8 + gc.enPassantPossible[1] if gc.enPassantPossible else NO_EN_PASSANT
+    return POSITION.pack(letters.encode('ascii'), gc.whiteToMove | gc.castleRights << 1, enPassant,
+                         min(gc.halfmoveClock, 0xFFFF), min(gc.fullmoveNumber, 0xFFFF))
+
+
+def getBoard(packed):
+    '''
+    Unpacks the board of a packed position.
+
+    Parameters:
+    packed (bytes): The packed position.
+
+    Returns:
+    list: The board, 8 lists of 8 pieces.
+    '''
+    letters = packed[:64].decode('ascii')
+    return [[rules.SNAPSHOT_PIECES[letter] for letter in letters[row * 8:row * 8 + 8]] for row in range(8)]
+
+
+def unpackPosition(gc, packed):
+    '''
+    Sets up a packed position on a game condition.
+
+    Parameters:
+    gc (GameCondition): The game condition. Its move history is cleared.
+    packed (bytes): The packed position.
+
+    Returns:
+    None
+    '''
+    letters, flags, enPassant, halfmoveClock, fullmoveNumber = POSITION.unpack(packed)
+    gc.loadPosition(getBoard(packed), bool(flags & 1), flags >> 1, divmod(enPassant, 8) if enPassant != NO_EN_PASSANT else (),
+                    halfmoveClock, fullmoveNumber)
+
+
+def getMoveText(moveID):
+    '''
+    Writes a packed move in coordinate notation.
+
+    Parameters:
+    moveID (int): The move, packed as 'Move.moveID'.
+
+    Returns:
+    str: The move in coordinate notation, for example 'e2e4' or 'e7e8q'.
+    '''
+    notation = rules.Move.colToBoard[moveID & 7] + rules.Move.rowToBoard[moveID >> 3 & 7]
+    notation += rules.Move.colToBoard[moveID >> 6 & 7] + rules.Move.rowToBoard[moveID >> 9 & 7]
+    return notation + rules.PROMOTION_PIECES[moveID >> 12 & 7]
+
+
+class MoveCache:
+    '''
+    This class represents a cache of the valid moves of positions, which forgets the least recently used position
+    when it is full.
+    '''
+    def __init__(self, size=DEFAULT_CACHE_SIZE):
+        '''
+        Initialize the MoveCache object.
+
+        Parameters:
+        size (int): The number of positions kept.
+
+        Returns:
+        None
+        '''
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        '''
+        Returns the entry of a position and marks it as the most recently used.
+
+        Parameters:
+        key (bytes): The packed position without the move clocks.
+
+        Returns:
+        tuple: The entry (see 'put'), or None if the position is not in the cache.
+        '''
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        '''
+        Stores the entry of a position, forgetting the least recently used position if the cache is full.
+
+        Parameters:
+        key (bytes): The packed position without the move clocks.
+        entry (tuple): The valid moves packed as 'Move.moveID' in an array of 16 bit integers, and the state of the
+        position: None, 'checkmate' or 'stalemate'.
+
+        Returns:
+        None
+        '''
+        self.entries[key] = entry
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def getStats(self):
+        '''
+        Returns the counters of the cache.
+
+        Returns:
+        dict: The counters with the keys 'entries', 'size', 'hits', 'misses' and 'hitRate'.
+        '''
+        lookups = self.hits + self.misses
+        return {'entries': len(self.entries), 'size': self.size, 'hits': self.hits, 'misses': self.misses,
+                'hitRate': self.hits / lookups if lookups else 0.0}
+
+
+class Session:
+    '''
+    This class represents a game hosted by the server, in packed form.
+    '''
+    __slots__ = ('start', 'position', 'moves', 'keys', 'result')
+
+    def __init__(self, start, key):
+        '''
+        Initialize the Session object.
+
+        Parameters:
+        start (bytes): The packed start position.
+        key (int): The Zobrist key of the start position.
+
+        Returns:
+        None
+        '''
+        self.start = start
+        self.position = start
+        self.moves = array('H')
+        # The keys of the positions since the last capture or pawn move, the only ones that can repeat.
+        self.keys = array('Q', [key])
+        self.result = None
+
+    def getMemory(self):
+        '''
+        Returns the memory held by the session.
+
+        Returns:
+        int: The size of the session and the objects only it refers to, in bytes.
+        '''
+        size = sys.getsizeof(self) + sys.getsizeof(self.moves) + sys.getsizeof(self.keys)
+        size += sys.getsizeof(self.start)
+        if self.position is not self.start:
+            size += sys.getsizeof(self.position)
+        return size
+
+
+class SessionManager:
+    '''
+    This class represents the games of the server and the shared cache of valid moves.
+    '''
+    def __init__(self, cacheSize=DEFAULT_CACHE_SIZE, maxSessions=DEFAULT_MAX_SESSIONS, maxPlies=DEFAULT_MAX_PLIES):
+        '''
+        Initialize the SessionManager object.
+
+        Parameters:
+        cacheSize (int): The number of positions kept in the cache of valid moves.
+        maxSessions (int): The number of games hosted at once.
+        maxPlies (int): The number of plies a game may last.
+
+        Returns:
+        None
+        '''
+        self.sessions = {}
+        self.nextId = 1
+        self.cache = MoveCache(cacheSize)
+        self.maxSessions = maxSessions
+        self.maxPlies = maxPlies
+        self.gc = rules.GameCondition()
+        self.moveCount = 0
+        self.moveSeconds = 0.0
+        self.maxMoveSeconds = 0.0
+        self.commands = {
+            'new': self.newGame,
+            'move': self.makeMove,
+            'moves': self.getMoves,
+            'undo': self.undoMove,
+            'state': self.getState,
+            'close': self.closeGame,
+            'stats': self.getStats,
+        }
+
+    def handle(self, request):
+        '''
+        Answers a request.
+
+        Parameters:
+        request (dict): The request, with the command in 'command' (see the top of the file).
+
+        Returns:
+        dict: The answer, with 'ok' False and the reason in 'error' if the request failed.
+        '''
+        name = request.get('command')
+        command = self.commands.get(name) if isinstance(name, str) else None
+        try:
+            if command is None:
+                raise ValueError('Unknown command: %s' % name)
+            response = command(request)
+            response['ok'] = True
+        except (ValueError, TypeError, KeyError, AttributeError, IndexError) as error:
+            # The fields of a request are checked, the other errors are only caught so that no request can end the connection.
+            response = {'ok': False, 'error': str(error) or type(error).__name__}
+        if 'id' in request:
+            response['id'] = request['id']
+        return response
+
+    def getSession(self, request):
+        '''
+        Returns the session of a request.
+
+        Parameters:
+        request (dict): The request, with the id of the game in 'game'.
+
+        Returns:
+        Session: The session.
+
+        Raises:
+        ValueError: If the id is not an int or a str, or there is no such game.
+        '''
+        gameId = request.get('game')
+        if not isinstance(gameId, (int, str)):
+            raise ValueError('Invalid game: %s' % json.dumps(gameId))
+        session = self.sessions.get(gameId)
+        if session is None:
+            raise ValueError('Unknown game: %s' % request.get('game'))
+        return session
+
+    def getEntry(self, position, loaded=False):
+        '''
+        Returns the valid moves of a position from the cache, generating them on a miss.
+
+        Parameters:
+        position (bytes): The packed position.
+        loaded (bool): True if the game condition of the server is already in the position.
+
+        Returns:
+        tuple: The entry of the position (see 'MoveCache.put').
+        '''
+        key = position[:KEY_SIZE]
+        entry = self.cache.get(key)
+        if entry is None:
+            gc = self.gc
+            if not loaded:
+                unpackPosition(gc, position)
+            moves = gc.getValidMoves()
+            entry = (array('H', [move.moveID for move in moves]), 'checkmate' if gc.checkMate else 'stalemate' if gc.staleMate else None)
+            self.cache.put(key, entry)
+        return entry
+
+    def newGame(self, request):
+        '''
+        Starts a game: {"command": "new", "fen": <optional FEN>}.
+
+        Parameters:
+        request (dict): The request.
+
+        Returns:
+        dict: The id of the game in 'game' and its position in 'fen'.
+
+        Raises:
+        ValueError: If the server is full or the FEN string is not valid.
+        '''
+        if len(self.sessions) >= self.maxSessions:
+            raise ValueError('Too many games')
+        gc = self.gc
+        fen = request.get('fen') or rules.START_FEN
+        if not isinstance(fen, str):
+            raise ValueError('Invalid FEN: %s' % json.dumps(fen))
+        gc.loadFen(fen)
+        session = Session(packPosition(gc), gc.zobristKey)
+        gameId = self.nextId
+        self.nextId += 1
+        self.sessions[gameId] = session
+        self.setResult(session, self.getEntry(session.position, loaded=True)[1])
+        return {'game': gameId, 'fen': gc.getFen(), 'result': session.result}
+
+    def makeMove(self, request):
+        '''
+        Makes a move: {"command": "move", "game": <id>, "move": <SAN or coordinate notation>}.
+
+        Parameters:
+        request (dict): The request.
+
+        Returns:
+        dict: The move in SAN in 'san', the new position in 'fen' and the result of the game in 'result',
+        None while it goes on.
+
+        Raises:
+        ValueError: If the game is over or too long, or the move is not valid.
+        '''
+        session = self.getSession(request)
+        if session.result is not None:
+            raise ValueError('The game is over: ' + session.result)
+        if len(session.moves) >= self.maxPlies:
+            raise ValueError('The game is too long')
+        start = time.perf_counter()
+        text = str(request.get('move', ''))
+        moveIDs, state = self.getEntry(session.position)
+        if COORDINATE_PATTERN.match(text):
+            # Coordinate notation is checked against the packed moves, without making Move objects.
+            wanted = (rules.Move.boardToRow[text[1]] * 8 + rules.Move.boardToCol[text[0]]
+                      | (rules.Move.boardToRow[text[3]] * 8 + rules.Move.boardToCol[text[2]]) << 6
+                      | rules.PROMOTION_CODES[text[4:]] << 12)
+            moveID = next((moveID for moveID in moveIDs if moveID & 0x7FFF == wanted), None)
+            if moveID is None:
+                raise ValueError('Invalid move: ' + text)
+        else:
+            board = getBoard(session.position)
+            moves = [rules.Move((moveID >> 3 & 7, moveID & 7), (moveID >> 9 & 7, moveID >> 6 & 7), board,
+                                rules.PROMOTION_PIECES[moveID >> 12 & 7]) for moveID in moveIDs]
+            moveID = parseMove(text, moves).moveID
+
+        gc = self.gc
+        unpackPosition(gc, session.position)
+        move = gc.getValidMove(moveID)
+        san = getSan(gc, move)
+        gc.makeMove(move)
+        session.position = packPosition(gc)
+        session.moves.append(moveID)
+        if gc.halfmoveClock == 0:
+            session.keys = array('Q')
+        session.keys.append(gc.zobristKey)
+        self.setResult(session, self.getEntry(session.position, loaded=True)[1])
+
+        seconds = time.perf_counter() - start
+        self.moveCount += 1
+        self.moveSeconds += seconds
+        self.maxMoveSeconds = max(self.maxMoveSeconds, seconds)
+        return {'san': san, 'fen': gc.getFen(), 'result': session.result}
+
+    def setResult(self, session, state):
+        '''
+        Ends the game of a session if its current position is the end of the game. The server's game condition must
+        be in the position.
+
+        Parameters:
+        session (Session): The session.
+        state (str): The state of the position from the cache: None, 'checkmate' or 'stalemate'.
+
+        Returns:
+        None
+        '''
+        gc = self.gc
+        if state == 'checkmate':
+            session.result = '0-1' if gc.whiteToMove else '1-0'
+        elif (state == 'stalemate' or gc.halfmoveClock >= 100 or session.keys.count(gc.zobristKey) >= 3
+              or isInsufficientMaterial(gc)):
+            session.result = '1/2-1/2'
+        else:
+            session.result = None
+
+    def getMoves(self, request):
+        '''
+        Lists the valid moves: {"command": "moves", "game": <id>}.
+
+        Parameters:
+        request (dict): The request.
+
+        Returns:
+        dict: The valid moves in coordinate notation in 'moves', and the state of the position in 'state'.
+        '''
+        session = self.getSession(request)
+        moveIDs, state = self.getEntry(session.position)
+        return {'moves': [getMoveText(moveID) for moveID in moveIDs], 'state': state}
+
+    def undoMove(self, request):
+        '''
+        Takes back the last move: {"command": "undo", "game": <id>}.
+
+        Parameters:
+        request (dict): The request.
+
+        Returns:
+        dict: The position in 'fen' and the result of the game in 'result'.
+
+        Raises:
+        ValueError: If there is no move to take back.
+
+        Note:
+        - The game is replayed from its start position, which only stores the packed moves, and is cheap since
+          every move is checked on its own (see 'GameCondition.getValidMove').
+        '''
+        session = self.getSession(request)
+        if not session.moves:
+            raise ValueError('No move to undo')
+        session.moves.pop()
+        gc = self.gc
+        unpackPosition(gc, session.start)
+        keys = array('Q', [gc.zobristKey])
+        for moveID in session.moves:
+            gc.makeMove(gc.getValidMove(moveID))
+            if gc.halfmoveClock == 0:
+                keys = array('Q')
+            keys.append(gc.zobristKey)
+        session.position = packPosition(gc)
+        session.keys = keys
+        self.setResult(session, self.getEntry(session.position, loaded=True)[1])
+        return {'fen': gc.getFen(), 'result': session.result}
+
+    def getState(self, request):
+        '''
+        Describes a game: {"command": "state", "game": <id>}.
+
+        Parameters:
+        request (dict): The request.
+
+        Returns:
+        dict: The start position in 'start', the moves in coordinate notation in 'moves', the position in 'fen',
+        the result in 'result' and the memory held by the session in 'bytes'.
+        '''
+        session = self.getSession(request)
+        gc = self.gc
+        unpackPosition(gc, session.start)
+        start = gc.getFen()
+        unpackPosition(gc, session.position)
+        moves = [getMoveText(moveID) for moveID in session.moves]
+        return {'start': start, 'moves': moves, 'fen': gc.getFen(), 'result': session.result, 'bytes': session.getMemory()}
+
+    def closeGame(self, request):
+        '''
+        Ends a game and forgets it: {"command": "close", "game": <id>}.
+
+        Parameters:
+        request (dict): The request.
+
+        Returns:
+        dict: An empty answer.
+        '''
+        self.getSession(request)
+        del self.sessions[request['game']]
+        return {}
+
+    def getStats(self, request):
+        '''
+        Reports the load of the server: {"command": "stats"}.
+
+        Parameters:
+        request (dict): The request.
+
+        Returns:
+        dict: The number of games in 'sessions', their memory in 'sessionBytes', the counters of the cache in
+        'cache', and the number of moves made and the mean and longest time to check and make one, in
+        'moves', 'meanMoveMicroseconds' and 'maxMoveMicroseconds'.
+        '''
+        sessionBytes = sum(session.getMemory() for session in self.sessions.values())
+        return {
+            'sessions': len(self.sessions),
+            'sessionBytes': sessionBytes,
+            'cache': self.cache.getStats(),
+            'moves': self.moveCount,
+            'meanMoveMicroseconds': 1e6 * self.moveSeconds / self.moveCount if self.moveCount else 0.0,
+            'maxMoveMicroseconds': 1e6 * self.maxMoveSeconds,
+        }
+
+
+async def handleClient(manager, reader, writer):
+    '''
+    Answers the requests of one client until it disconnects.
+
+    Parameters:
+    manager (SessionManager): The games of the server.
+    reader (asyncio.StreamReader): The requests.
+    writer (asyncio.StreamWriter): The answers.
+
+    Returns:
+    None
+    '''
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError('A request must be a JSON object')
+            except ValueError as error:
+                response = {'ok': False, 'error': str(error)}
+            else:
+                response = manager.handle(request)
+            writer.write((json.dumps(response) + '\n').encode('utf-8'))
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(manager, host, port):
+    '''
+    Runs the server until it is cancelled.
+
+    Parameters:
+    manager (SessionManager): The games of the server.
+    host (str): The address to listen on.
+    port (int): The port to listen on.
+
+    Returns:
+    None
+    '''
+    server = await asyncio.start_server(lambda reader, writer: handleClient(manager, reader, writer), host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    '''
+    Main function of the game server.
+    '''
+    parser = argparse.ArgumentParser(description='Game server hosting many games over JSON lines.')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=8765, help='port to listen on')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE, help='number of positions kept in the cache of valid moves')
+    parser.add_argument('--max-sessions', type=int, default=DEFAULT_MAX_SESSIONS, help='number of games hosted at once')
+    parser.add_argument('--max-plies', type=int, default=DEFAULT_MAX_PLIES, help='number of plies a game may last')
+    args = parser.parse_args()
+
+    manager = SessionManager(args.cache_size, args.max_sessions, args.max_plies)
+    try:
+        asyncio.run(serve(manager, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
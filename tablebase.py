@@ -0,0 +1,466 @@
+'''
+This is a file that contains the endgame tablebases of the endings with one piece besides the kings: KQK, KRK,
+KBK, KNK and KPK.
+
+A tablebase is generated by retrograde analysis: the mated positions are found first, and the results are
+spread backwards through the moves that lead to them, one ply at a time, so every position gets the exact
+distance to mate. A table is a file of one byte per position, 2 * 64 * 64 * 64 positions indexed by the player
+to move and the squares of the kings and the piece, with the piece always white (see 'getIndex'). A byte holds
+the number of plies to mate plus 1, or 0 for a draw: an odd number of plies is a win for the player to move,
+an even number a loss. The files are read through mmap, so a probe is a single read and every process that
+opens them shares the same pages of the operating system cache.
+
+Usage:
+python tablebase.py build KQK KRK KPK --directory tablebases
+python tablebase.py probe --fen '8/8/8/4k3/8/8/8/KQ6 w - - 0 1'
+'''
+import argparse
+import mmap
+import os
+import sys
+import time
+
+import rules
+from bitboard import KING_ATTACKS, KNIGHT_ATTACKS, PAWN_ATTACKS, bishopAttacks, queenAttacks, rookAttacks, squares
+from notation import getSan
+
+SIGNATURES = ('KQK', 'KRK', 'KBK', 'KNK', 'KPK')
+# The tables a table is generated from: a pawn promotes into the other endings.
+DEPENDENCIES = {'KPK': ('KQK', 'KRK', 'KBK', 'KNK')}
+TABLE_SIZE = 2 * 64 * 64 * 64
+FILE_EXTENSION = '.tb'
+DEFAULT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tablebases')
+# The tablebases opened by this process, keyed by their directory.
+_openTablebases = {}
+
+
+def getIndex(blackToMove, whiteKing, blackKing, square):
+    '''
+    Returns the index of a position in its table.
+
+    Parameters:
+    blackToMove (int): 1 if black is to move, 0 if white is.
+    whiteKing (int): The square of the white king, as row * 8 + col.
+    blackKing (int): The square of the black king.
+    square (int): The square of the white piece.
+
+    Returns:
+    int: The index of the position.
+    '''
+    return blackToMove << 18 | whiteKing << 12 | blackKing << 6 | square
+
+
+def _getAttacks(piece, square, occupied):
+    '''
+    Returns the squares attacked by the white piece.
+
+    Parameters:
+    piece (str): The type of the piece: 'q', 'r', 'b', 'n' or 'p'.
+    square (int): The square of the piece.
+    occupied (int): The bitboard of the occupied squares.
+
+    Returns:
+    int: The bitboard of the attacked squares.
+    '''
+    if piece == 'q':
+        return queenAttacks(square, occupied)
+    if piece == 'r':
+        return rookAttacks(square, occupied)
+    if piece == 'b':
+        return bishopAttacks(square, occupied)
+    if piece == 'n':
+        return KNIGHT_ATTACKS[square]
+    return PAWN_ATTACKS['w'][square]
+
+
+def _isValid(piece, blackToMove, whiteKing, blackKing, square):
+    '''
+    Checks if a position can occur in a game.
+
+    Parameters:
+    piece (str): The type of the white piece.
+    blackToMove (int): 1 if black is to move, 0 if white is.
+    whiteKing (int): The square of the white king.
+    blackKing (int): The square of the black king.
+    square (int): The square of the white piece.
+
+    Returns:
+    bool: False if two pieces share a square, the kings touch, a pawn stands on the first or last row, or the
+    black king is in check with white to move.
+    '''
+    if whiteKing == blackKing or square == whiteKing or square == blackKing:
+        return False
+    if KING_ATTACKS[whiteKing] >> blackKing & 1:
+        return False
+    if piece == 'p' and not 8 <= square < 56:
+        return False
+    if not blackToMove and _getAttacks(piece, square, 1 << whiteKing | 1 << blackKing) >> blackKing & 1:
+        return False
+    return True
+
+
+def _getChildren(piece, blackToMove, whiteKing, blackKing, square, tables):
+    '''
+    Returns the positions after every legal move of a position.
+
+    Parameters:
+    piece (str): The type of the white piece.
+    blackToMove (int): 1 if black is to move, 0 if white is.
+    whiteKing (int): The square of the white king.
+    blackKing (int): The square of the black king.
+    square (int): The square of the white piece.
+    tables (dict): The tables of the endings a pawn promotes into, keyed by their signature.
+
+    Returns:
+    tuple: The indexes of the positions in the same table, and the values of the positions in other endings:
+    0 for a capture of the piece, or the value in the table of a promotion.
+    '''
+    whiteKingBit, blackKingBit, squareBit = 1 << whiteKing, 1 << blackKing, 1 << square
+    children = []
+    others = []
+    if blackToMove:
+        attacked = KING_ATTACKS[whiteKing] | _getAttacks(piece, square, whiteKingBit)
+        for end in squares(KING_ATTACKS[blackKing] & ~attacked):
+            if end == square:
+                others.append(0)
+            else:
+                children.append(getIndex(0, whiteKing, end, square))
+        return children, others
+
+    for end in squares(KING_ATTACKS[whiteKing] & ~KING_ATTACKS[blackKing] & ~squareBit):
+        children.append(getIndex(1, end, blackKing, square))
+    occupied = whiteKingBit | blackKingBit
+    if piece != 'p':
+        for end in squares(_getAttacks(piece, square, occupied) & ~occupied):
+            children.append(getIndex(1, whiteKing, blackKing, end))
+    elif not occupied >> (square - 8) & 1:
+        if square < 16:
+            for promotion in 'QRBN':
+                others.append(tables['K' + promotion + 'K'][getIndex(1, whiteKing, blackKing, square - 8)])
+        else:
+            children.append(getIndex(1, whiteKing, blackKing, square - 8))
+            if square >= 48 and not occupied >> (square - 16) & 1:
+                children.append(getIndex(1, whiteKing, blackKing, square - 16))
+    return children, others
+
+
+def _getParents(piece, index):
+    '''
+    Returns the positions of the same table that have a legal move to a position.
+
+    Parameters:
+    piece (str): The type of the white piece.
+    index (int): The index of the position.
+
+    Returns:
+    list: The indexes of the positions.
+    '''
+    blackToMove, whiteKing, blackKing, square = index >> 18, index >> 12 & 63, index >> 6 & 63, index & 63
+    whiteKingBit, blackKingBit, squareBit = 1 << whiteKing, 1 << blackKing, 1 << square
+    parents = []
+    if not blackToMove:
+        for start in squares(KING_ATTACKS[blackKing] & ~whiteKingBit & ~squareBit):
+            if _isValid(piece, 1, whiteKing, start, square):
+                parents.append(getIndex(1, whiteKing, start, square))
+        return parents
+
+    for start in squares(KING_ATTACKS[whiteKing] & ~KING_ATTACKS[blackKing] & ~squareBit & ~blackKingBit):
+        if _isValid(piece, 0, start, blackKing, square):
+            parents.append(getIndex(0, start, blackKing, square))
+    occupied = whiteKingBit | blackKingBit
+    if piece != 'p':
+        starts = squares(_getAttacks(piece, square, occupied) & ~occupied)
+    elif square < 48 and not occupied >> (square + 8) & 1:
+        starts = [square + 8]
+        if 32 <= square < 40 and not occupied >> (square + 16) & 1:
+            starts.append(square + 16)
+    else:
+        starts = []
+    for start in starts:
+        if _isValid(piece, 0, whiteKing, blackKing, start):
+            parents.append(getIndex(0, whiteKing, blackKing, start))
+    return parents
+
+
+def generateTable(signature, tables):
+    '''
+    Generates the table of an ending by retrograde analysis.
+
+    Parameters:
+    signature (str): The signature of the ending, one of SIGNATURES.
+    tables (dict): The tables of the endings a pawn promotes into (see DEPENDENCIES), keyed by their signature.
+
+    Returns:
+    bytearray: The table, one byte per position (see the top of the file).
+
+    Note:
+    - The positions are resolved in the order of their distance to mate. A position is won as soon as one of
+      its moves leads to a lost position, and lost once all of its moves lead to won positions, so the first
+      win found is the shortest and the last move resolved gives the longest defence.
+    '''
+    piece = signature[1].lower()
+    values = bytearray(TABLE_SIZE)
+    # The number of moves of every position that do not lead to a position won by the opponent yet.
+    remaining = bytearray(TABLE_SIZE)
+    # The positions resolved at every distance, and the positions with a move into another ending at that distance.
+    resolved = [[]]
+    others = []
+    for index in range(TABLE_SIZE):
+        blackToMove, whiteKing, blackKing, square = index >> 18, index >> 12 & 63, index >> 6 & 63, index & 63
+        if not _isValid(piece, blackToMove, whiteKing, blackKing, square):
+            continue
+        children, otherValues = _getChildren(piece, blackToMove, whiteKing, blackKing, square, tables)
+        remaining[index] = len(children) + len(otherValues)
+        if not remaining[index]:
+            # Mate, if the black king is in check, and stalemate otherwise, which stays a draw.
+            if blackToMove and _getAttacks(piece, square, 1 << whiteKing | 1 << blackKing) >> blackKing & 1:
+                values[index] = 1
+                resolved[0].append(index)
+            continue
+        for value in otherValues:
+            if value:
+                while len(others) < value:
+                    others.append([])
+                others[value - 1].append(index)
+
+    plies = 0
+    while plies < len(resolved):
+        parents = [parent for index in resolved[plies] for parent in _getParents(piece, index)]
+        if plies < len(others):
+            parents += others[plies]
+        found = []
+        for parent in parents:
+            if values[parent]:
+                continue
+            if plies & 1:
+                # A move to a position won by the opponent.
+                remaining[parent] -= 1
+                if remaining[parent]:
+                    continue
+            values[parent] = plies + 2
+            found.append(parent)
+        if found or plies + 1 < len(others):
+            resolved.append(found)
+        plies += 1
+    return values
+
+
+def buildTablebases(signatures, directory=DEFAULT_DIRECTORY, output=sys.stdout):
+    '''
+    Generates the tables of endings, and the tables they depend on, and writes them to a directory.
+
+    Parameters:
+    signatures (list): The signatures of the endings.
+    directory (str): The directory the '<signature>.tb' files are written to.
+    output (file): The file the progress is printed to, or None.
+
+    Returns:
+    dict: The tables, keyed by their signature.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    tables = {}
+    order = []
+    for signature in signatures:
+        for dependency in DEPENDENCIES.get(signature, ()) + (signature,):
+            if dependency not in order:
+                order.append(dependency)
+    for signature in order:
+        start = time.perf_counter()
+        tables[signature] = generateTable(signature, tables)
+        with open(os.path.join(directory, signature + FILE_EXTENSION), 'wb') as file:
+            file.write(tables[signature])
+        if output is not None:
+            # A position won by the player to move stores an odd number of plies plus one.
+            wonValues = [value for value in tables[signature] if value and value & 1 == 0]
+            line = '%s: %d won positions' % (signature, len(wonValues))
+            if wonValues:
+                line += ', longest mate %d plies' % (max(wonValues) - 1)
+            print('%s, %.1f s' % (line, time.perf_counter() - start), file=output)
+    return tables
+
+
+class Tablebase:
+    '''
+    This class represents the tablebase files of a directory, read through mmap.
+    '''
+    def __init__(self, directory=DEFAULT_DIRECTORY):
+        '''
+        Initialize the Tablebase object.
+
+        Parameters:
+        directory (str): The directory of the '<signature>.tb' files. Endings without a file are not probed.
+
+        Returns:
+        None
+
+        Raises:
+        ValueError: If the size of a file is not the size of a table.
+        '''
+        self.directory = directory
+        self.tables = {}
+        for signature in SIGNATURES:
+            path = os.path.join(directory, signature + FILE_EXTENSION)
+            if not os.path.isfile(path):
+                continue
+            with open(path, 'rb') as file:
+                if file.seek(0, 2) != TABLE_SIZE:
+                    raise ValueError('Invalid tablebase file: ' + path)
+                self.tables[signature] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __getstate__(self):
+        '''
+        Returns the state pickled when the tablebase is sent to another process: only its directory.
+
+        Returns:
+        dict: The state of the tablebase.
+        '''
+        return {'directory': self.directory}
+
+    def __setstate__(self, state):
+        '''
+        Maps the tablebase files again in the process the tablebase was sent to.
+
+        Parameters:
+        state (dict): The state made by '__getstate__'.
+
+        Returns:
+        None
+        '''
+        self.__init__(state['directory'])
+
+    def close(self):
+        '''
+        Unmaps the tablebase files.
+
+        Returns:
+        None
+        '''
+        for table in self.tables.values():
+            table.close()
+        self.tables = {}
+
+    def probe(self, gc):
+        '''
+        Looks up the current position.
+
+        Parameters:
+        gc (GameCondition): The game condition.
+
+        Returns:
+        tuple: The result for the player to move, 1 for a win, 0 for a draw and -1 for a loss, and the number of
+        plies to mate, 0 for a draw. None if the position is not in the tablebase.
+
+        Note:
+        - A position with castling rights is not in the tablebase, the tables do not know about castling.
+        '''
+        occupancy = gc.occupancy
+        pieces = (occupancy['w'] | occupancy['b']).bit_count()
+        if pieces > 3 or gc.castleRights:
+            return None
+        if pieces == 2:
+            return (0, 0)
+        bitboards = gc.bitboards
+        color = 'w' if occupancy['w'].bit_count() == 2 else 'b'
+        for piece in 'qrbnp':
+            if bitboards[color + piece]:
+                break
+        table = self.tables.get('K' + piece.upper() + 'K')
+        if table is None:
+            return None
+        whiteKing = bitboards['wk'].bit_length() - 1
+        blackKing = bitboards['bk'].bit_length() - 1
+        square = bitboards[color + piece].bit_length() - 1
+        if color == 'w':
+            value = table[getIndex(0 if gc.whiteToMove else 1, whiteKing, blackKing, square)]
+        else:
+            # The colors are swapped and the board is mirrored, so the piece is white again.
+            value = table[getIndex(1 if gc.whiteToMove else 0, blackKing ^ 56, whiteKing ^ 56, square ^ 56)]
+        if not value:
+            return (0, 0)
+        return (1 if value & 1 == 0 else -1, value - 1)
+
+    def getBestMove(self, gc):
+        '''
+        Chooses the best move of the current position: the fastest mate when the position is won, a move that
+        keeps the draw when it is drawn, and the longest defence when it is lost.
+
+        Parameters:
+        gc (GameCondition): The game condition. It is left unchanged.
+
+        Returns:
+        tuple: The move, the result for the player to move and the number of plies to mate (see 'probe'), or None
+        if the position is not in the tablebase or there are no valid moves.
+        '''
+        if self.probe(gc) is None:
+            return None
+        best = None
+        bestRank = None
+        for move in gc.validMoveFunctions[gc.moveGenerator]():
+            gc.makeMove(move)
+            entry = self.probe(gc)
+            gc.undoMove()
+            # A promotion into an ending without a file.
+            if entry is None:
+                continue
+            result = -entry[0]
+            plies = entry[1] + 1 if result else 0
+            rank = (result, -plies if result > 0 else plies)
+            if bestRank is None or rank > bestRank:
+                best = (move, result, plies)
+                bestRank = rank
+        return best
+
+
+def openTablebase(directory=DEFAULT_DIRECTORY):
+    '''
+    Opens the tablebase files of a directory once per process.
+
+    Parameters:
+    directory (str): The directory of the files.
+
+    Returns:
+    Tablebase: The tablebase.
+    '''
+    if directory not in _openTablebases:
+        _openTablebases[directory] = Tablebase(directory)
+    return _openTablebases[directory]
+
+
+def main():
+    '''
+    Main function of the tablebase tool.
+    '''
+    parser = argparse.ArgumentParser(description='Endgame tablebase generator and prober.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='generate the tables of endings')
+    build.add_argument('signatures', nargs='*', default=['KQK', 'KRK', 'KPK'], choices=SIGNATURES, help='endings, by default KQK, KRK and KPK')
+    build.add_argument('--directory', default=DEFAULT_DIRECTORY, help='directory the tables are written to')
+    probe = commands.add_parser('probe', help='show the result of every move of a position')
+    probe.add_argument('--fen', required=True, help='FEN string of the position')
+    probe.add_argument('--directory', default=DEFAULT_DIRECTORY, help='directory of the tables')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        buildTablebases(args.signatures, args.directory)
+        return 0
+
+    tablebase = Tablebase(args.directory)
+    gc = rules.GameCondition.fromFen(args.fen)
+    entry = tablebase.probe(gc)
+    if entry is None:
+        print('Not in the tablebase')
+        return 1
+    names = {1: 'win', 0: 'draw', -1: 'loss'}
+    print('%s in %d plies' % (names[entry[0]], entry[1]) if entry[0] else 'draw')
+    for move in gc.validMoveFunctions[gc.moveGenerator]():
+        san = getSan(gc, move)
+        gc.makeMove(move)
+        child = tablebase.probe(gc)
+        gc.undoMove()
+        if child is not None:
+            print('%-8s %s' % (san, '%s in %d plies' % (names[-child[0]], child[1] + 1) if child[0] else 'draw'))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,382 @@
+'''
+This is a file that contains the UCI (Universal Chess Interface) front end of the engine.
+
+The engine reads commands from the standard input and answers on the standard output, so that it can be run
+without the window by tournament managers and other UCI programs. The search runs on its own thread, so
+that 'stop' and 'isready' are answered while it thinks.
+
+Supported commands: uci, isready, ucinewgame, setoption name [Hash | Book | Tablebase] value <MB | path>, position [startpos | fen <fen>]
+[moves <moves>], go [wtime btime winc binc movestogo depth nodes movetime infinite | perft <depth>], stop, quit.
+
+Usage:
+python uci.py
+'''
+import sys
+import threading
+import time
+
+import rules
+from book import openBook
+from notation import findMove, getMoveNotation
+from perft import divide
+from search import MAX_DEPTH, Search
+from tablebase import openTablebase
+
+ENGINE_NAME = 'Chess'
+ENGINE_AUTHOR = 'aleheo'
+# The size of the transposition table in megabytes, and the memory one entry is taken to use.
+DEFAULT_HASH = 32
+ENTRY_BYTES = 128
+# The time kept back from every move for the answer to reach the tournament manager, in seconds.
+MOVE_OVERHEAD = 0.05
+# The number of moves the remaining time is shared by when 'movestogo' is not given.
+MOVES_TO_GO = 30
+
+
+class UciSearch(Search):
+    '''
+    This class represents a search engine that also stops when the 'stop' command is received.
+    '''
+    def __init__(self, ttSize=1 << 18, tablebase=None):
+        '''
+        Initialize the UciSearch object.
+
+        Parameters:
+        ttSize (int): The number of entries of the transposition table.
+        tablebase (Tablebase): The endgame tablebase, or None to search every position.
+
+        Returns:
+        None
+        '''
+        super().__init__(ttSize, tablebase)
+        self.stopRequested = False
+
+    def checkLimits(self):
+        '''
+        Sets the 'stopped' flag when 'stop' was received or the time or node budget is used up.
+
+        Returns:
+        None
+        '''
+        if self.stopRequested:
+            self.stopped = True
+        else:
+            super().checkLimits()
+
+
+class UciEngine:
+    '''
+    This class represents the UCI front end. It keeps the current position and the search thread.
+    '''
+    def __init__(self, output=sys.stdout):
+        '''
+        Initialize the UciEngine object.
+
+        Parameters:
+        output (file): The file the answers are written to.
+
+        Returns:
+        None
+        '''
+        self.output = output
+        self.outputLock = threading.Lock()
+        self.engine = UciSearch(DEFAULT_HASH * 1024 * 1024 // ENTRY_BYTES)
+        self.gc = rules.GameCondition()
+        self.positionFen = rules.START_FEN
+        self.positionMoves = []
+        self.searchThread = None
+        self.infinite = False
+        self.book = None
+        self.commands = {
+            'uci': self.uci,
+            'isready': self.isReady,
+            'ucinewgame': self.newGame,
+            'setoption': self.setOption,
+            'position': self.position,
+            'go': self.go,
+            'stop': self.stop,
+        }
+
+    def send(self, line):
+        '''
+        Writes an answer line.
+
+        Parameters:
+        line (str): The answer, without the line ending.
+
+        Returns:
+        None
+        '''
+        with self.outputLock:
+            self.output.write(line + '\n')
+            self.output.flush()
+
+    def run(self, lines):
+        '''
+        Handles commands until 'quit' or the end of the input.
+
+        Parameters:
+        lines (iterable): The command lines, for example the standard input.
+
+        Returns:
+        None
+        '''
+        for line in lines:
+            tokens = line.split()
+            if not tokens:
+                continue
+            if tokens[0] == 'quit':
+                break
+            command = self.commands.get(tokens[0])
+            if command is not None:
+                try:
+                    command(tokens[1:])
+                except ValueError as error:
+                    self.send('info string ' + str(error))
+            else:
+                self.send('info string Unknown command: ' + tokens[0])
+        self.stop([])
+
+    def uci(self, tokens):
+        '''
+        Answers 'uci' with the name of the engine and its options.
+
+        Parameters:
+        tokens (list): The arguments of the command.
+
+        Returns:
+        None
+        '''
+        self.send('id name ' + ENGINE_NAME)
+        self.send('id author ' + ENGINE_AUTHOR)
+        self.send('option name Hash type spin default %d min 1 max 4096' % DEFAULT_HASH)
+        self.send('option name Book type string default <empty>')
+        self.send('option name Tablebase type string default <empty>')
+        self.send('uciok')
+
+    def isReady(self, tokens):
+        '''
+        Answers 'isready'.
+
+        Parameters:
+        tokens (list): The arguments of the command.
+
+        Returns:
+        None
+        '''
+        self.send('readyok')
+
+    def newGame(self, tokens):
+        '''
+        Forgets what the search learnt in the previous game.
+
+        Parameters:
+        tokens (list): The arguments of the command.
+
+        Returns:
+        None
+        '''
+        self.stop([])
+        self.engine.transpositionTable.clear()
+        self.engine.history = {}
+
+    def setOption(self, tokens):
+        '''
+        Sets an option: 'setoption name Hash value <MB>', 'setoption name Book value <path>' or 'setoption name
+        Tablebase value <directory>', an empty value or '<empty>' to play without a book or tablebase.
+
+        Parameters:
+        tokens (list): The arguments of the command.
+
+        Returns:
+        None
+
+        Raises:
+        ValueError: If the option is not known or its value is not valid.
+        '''
+        if 'name' not in tokens or 'value' not in tokens:
+            raise ValueError('Invalid setoption: ' + ' '.join(tokens))
+        name = ' '.join(tokens[tokens.index('name') + 1:tokens.index('value')])
+        value = ' '.join(tokens[tokens.index('value') + 1:])
+        self.stop([])
+        if name.lower() == 'hash':
+            self.engine = UciSearch(max(1, int(value)) * 1024 * 1024 // ENTRY_BYTES, self.engine.tablebase)
+        elif name.lower() == 'book':
+            try:
+                self.book = openBook(value) if value and value != '<empty>' else None
+            except OSError as error:
+                raise ValueError('Cannot open the book: ' + str(error))
+        elif name.lower() == 'tablebase':
+            try:
+                tablebase = openTablebase(value) if value and value != '<empty>' else None
+            except (OSError, ValueError) as error:
+                raise ValueError('Cannot open the tablebase: ' + str(error))
+            if tablebase is not None and not tablebase.tables:
+                raise ValueError('No tablebase files in ' + value)
+            self.engine.tablebase = tablebase
+        else:
+            raise ValueError('Unknown option: ' + name)
+
+    def position(self, tokens):
+        '''
+        Sets up the position: 'position [startpos | fen <fen>] [moves <moves>]'.
+
+        Parameters:
+        tokens (list): The arguments of the command.
+
+        Returns:
+        None
+
+        Raises:
+        ValueError: If the FEN string or one of the moves is not valid.
+
+        Note:
+        - Tournament managers send the whole game with every move. When the game only got longer, only the new
+          moves are made, which also keeps the positions of the game for the repetition check of the search.
+        '''
+        self.stop([])
+        movesIndex = tokens.index('moves') if 'moves' in tokens else len(tokens)
+        if tokens and tokens[0] == 'fen':
+            fen = ' '.join(tokens[1:movesIndex])
+        else:
+            fen = rules.START_FEN
+        moves = tokens[movesIndex + 1:]
+
+        if fen != self.positionFen or moves[:len(self.positionMoves)] != self.positionMoves:
+            gc = rules.GameCondition.fromFen(fen)
+            self.gc = gc
+            self.positionFen = fen
+            self.positionMoves = []
+        for notation in moves[len(self.positionMoves):]:
+            try:
+                self.gc.makeMove(findMove(self.gc, notation))
+            except ValueError:
+                # The position is left where the game stopped making sense, and set up again next time.
+                self.positionFen = None
+                raise
+            self.positionMoves.append(notation)
+
+    def go(self, tokens):
+        '''
+        Starts a search: 'go [wtime <ms>] [btime <ms>] [winc <ms>] [binc <ms>] [movestogo <n>] [depth <n>]
+        [nodes <n>] [movetime <ms>] [infinite]', or counts the leaf nodes: 'go perft <depth>'.
+
+        Parameters:
+        tokens (list): The arguments of the command.
+
+        Returns:
+        None
+
+        Raises:
+        ValueError: If a limit is not a number.
+        '''
+        self.stop([])
+        limits = {}
+        for index, token in enumerate(tokens):
+            if token in ('wtime', 'btime', 'winc', 'binc', 'movestogo', 'depth', 'nodes', 'movetime', 'perft') and index + 1 < len(tokens):
+                limits[token] = int(tokens[index + 1])
+
+        if 'perft' in limits:
+            start = time.perf_counter()
+            counts = divide(self.gc, max(1, limits['perft']))
+            seconds = time.perf_counter() - start
+            for notation in sorted(counts):
+                self.send('%s: %d' % (notation, counts[notation]))
+            nodes = sum(counts.values())
+            self.send('')
+            self.send('Nodes searched: %d' % nodes)
+            self.send('info nodes %d time %d nps %d' % (nodes, seconds * 1000, nodes / seconds if seconds else 0))
+            return
+
+        self.infinite = 'infinite' in tokens
+        if self.book is not None and not self.infinite:
+            move = self.book.chooseMove(self.gc)
+            if move is not None:
+                self.send('info string book move')
+                self.send('bestmove ' + getMoveNotation(move))
+                return
+
+        timeLimit = None
+        if 'movetime' in limits:
+            timeLimit = limits['movetime'] / 1000
+        elif not self.infinite:
+            remaining = limits.get('wtime' if self.gc.whiteToMove else 'btime')
+            if remaining is not None:
+                increment = limits.get('winc' if self.gc.whiteToMove else 'binc', 0)
+                timeLimit = min(remaining / 1000 / limits.get('movestogo', MOVES_TO_GO) + increment / 1000, remaining / 1000 / 2)
+        if timeLimit is not None:
+            timeLimit = max(0.01, timeLimit - MOVE_OVERHEAD)
+
+        self.engine.stopRequested = False
+        self.searchThread = threading.Thread(target=self.search, args=(limits.get('depth', MAX_DEPTH), timeLimit, limits.get('nodes')), daemon=True)
+        self.searchThread.start()
+
+    def search(self, maxDepth, timeLimit, nodeLimit):
+        '''
+        Searches the current position on the search thread and answers with the best move.
+
+        Parameters:
+        maxDepth (int): The deepest iteration.
+        timeLimit (float): The time budget in seconds, or None for no limit.
+        nodeLimit (int): The node budget, or None for no limit.
+
+        Returns:
+        None
+        '''
+        result = self.engine.findBestMove(self.gc, maxDepth, timeLimit, nodeLimit, callback=self.sendInfo)
+        # In infinite mode the best move may only be sent after 'stop'.
+        while self.infinite and not self.engine.stopRequested:
+            time.sleep(0.001)
+        move = result.bestMove
+        if move is None:
+            # Stopped before the first iteration finished.
+            moves = self.gc.validMoveFunctions[self.gc.moveGenerator]()
+            move = moves[0] if moves else None
+        self.send('bestmove ' + (getMoveNotation(move) if move is not None else '0000'))
+
+    def sendInfo(self, result):
+        '''
+        Reports a completed search iteration.
+
+        Parameters:
+        result (SearchResult): The result of the iteration.
+
+        Returns:
+        None
+        '''
+        mate = result.getMateDistance()
+        score = 'mate %d' % mate if mate is not None else 'cp %d' % result.score
+        milliseconds = int(result.seconds * 1000)
+        nps = int(result.nodes / result.seconds) if result.seconds else 0
+        line = 'info depth %d score %s nodes %d nps %d time %d' % (result.depth, score, result.nodes, nps, milliseconds)
+        # A mate or stalemate at the root, or a tablebase result without a move, has no principal variation.
+        if result.pv:
+            line += ' pv ' + ' '.join(getMoveNotation(move) for move in result.pv)
+        self.send(line)
+
+    def stop(self, tokens):
+        '''
+        Stops the search and waits for its best move to be sent.
+
+        Parameters:
+        tokens (list): The arguments of the command.
+
+        Returns:
+        None
+        '''
+        if self.searchThread is not None:
+            self.engine.stopRequested = True
+            self.searchThread.join()
+            self.searchThread = None
+
+
+def main():
+    '''
+    Main function of the UCI front end.
+    '''
+    UciEngine().run(sys.stdin)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,43 @@
+'''
+This is a file that contains the Zobrist keys used to identify chess positions.
+
+The key of a position is the XOR of one random 64-bit number for every piece on its square, one for black to
+move, one for the castling rights and one for the file of the en passant square. A move changes only a few of
+these numbers, so 'GameCondition.makeMove' updates the key incrementally.
+'''
+import random
+
+# A fixed seed keeps the keys, and so the keys stored in files, the same from one run to the next.
+_random = random.Random(0x5A0B1257)
+
+PIECE_KEYS = {color + piece: [_random.getrandbits(64) for square in range(64)] for color in 'wb' for piece in 'pnbrqk'}
+SIDE_KEY = _random.getrandbits(64)
+CASTLE_KEYS = [_random.getrandbits(64) for rights in range(16)]
+EN_PASSANT_KEYS = [_random.getrandbits(64) for col in range(8)]
+
+
+def computeKey(board, whiteToMove, castleRights, enPassantPossible):
+    '''
+    Computes the Zobrist key of a position from scratch.
+
+    Parameters:
+    board (list): A list representing the chess board, as 'GameCondition.board'.
+    whiteToMove (bool): True if white is to move.
+    castleRights (int): The castling rights, as 'GameCondition.castleRights'.
+    enPassantPossible (tuple): The (row, col) square a pawn may capture en passant on, or () if there is none.
+
+    Returns:
+    int: The 64-bit key of the position.
+    '''
+    key = 0
+    for row in range(8):
+        for col in range(8):
+            piece = board[row][col]
+            if piece != '--':
+                key ^= PIECE_KEYS[piece][row * 8 + col]
+    if not whiteToMove:
+        key ^= SIDE_KEY
+    key ^= CASTLE_KEYS[castleRights]
+    if enPassantPossible:
+        key ^= EN_PASSANT_KEYS[enPassantPossible[1]]
+    return key